@@ -0,0 +1,311 @@
+import argparse
+import os
+import time
+from threading import Lock
+
+import numpy as np
+
+from init_db import DB_PATH
+from vector_codec import CodeView
+from vector_index import VectorIndex, normalize_query, vector_index
+from vector_shards import SHARDS_ENABLED, shard_store
+
+
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "exact").strip().lower()
+IVF_PATH = os.getenv("RAG_IVF_PATH", os.path.splitext(DB_PATH)[0] + ".ivf.npz")
+IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))  # 0 = auto (~4 * sqrt(N))
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "8"))
+IVF_TRAIN_ITERATIONS = 12
+IVF_SAMPLE_PER_LIST = 64
+ASSIGN_BATCH_ROWS = 65536
+
+
+def _auto_nlist(size: int) -> int:
+    return int(max(1, min(size, round(4 * np.sqrt(max(size, 1))))))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BATCH_ROWS):
+        block = vectors[start:start + ASSIGN_BATCH_ROWS]
+        labels[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def _assign_codes(codes: CodeView, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Like _assign, decoding index codes block by block."""
+    labels = np.empty(rows.shape[0], dtype=np.int32)
+    for start in range(0, rows.shape[0], ASSIGN_BATCH_ROWS):
+        block = codes.decode(rows[start:start + ASSIGN_BATCH_ROWS])
+        labels[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(codes: CodeView, nlist: int, seed: int = 42) -> np.ndarray:
+    """Spherical k-means on a sample of the (decoded) L2-normalized vectors."""
+    rng = np.random.default_rng(seed)
+    size = len(codes)
+    nlist = max(1, min(nlist, size))
+    sample_size = min(size, nlist * IVF_SAMPLE_PER_LIST)
+    sample = codes.decode(np.sort(rng.choice(size, sample_size, replace=False)))
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(IVF_TRAIN_ITERATIONS):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists so every centroid stays useful.
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IvfIndex:
+    """Inverted-file index over the rows of a VectorIndex.
+
+    Only centroids and per-list row assignments are kept here; vectors stay in
+    the resident index codes, so the persisted file is small and memory is not duplicated.
+    """
+
+    def __init__(self, base: VectorIndex, path: str = IVF_PATH, nprobe: int = IVF_NPROBE) -> None:
+        self.base = base
+        self.path = path
+        self.nprobe = max(1, nprobe)
+        self._lock = Lock()
+        self._centroids: np.ndarray | None = None
+        self._lists: list[list[np.ndarray]] = []
+        self._dirty = False
+        base.subscribe(self._on_base_change)
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self._centroids is None else int(self._centroids.shape[0])
+
+    def build(self, nlist: int = IVF_NLIST) -> None:
+        codes, _, _ = self.base.snapshot()
+        with self._lock:
+            if len(codes) == 0:
+                self._centroids = None
+                self._lists = []
+                return
+            centroids = train_centroids(codes, nlist or _auto_nlist(len(codes)))
+            rows = np.arange(len(codes))
+            self._set_assignments(centroids, rows, _assign_codes(codes, rows, centroids))
+
+    def save(self) -> None:
+        _, chunk_ids, _ = self.base.snapshot()
+        with self._lock:
+            if self._centroids is None:
+                return
+            rows, labels = self._flatten()
+            tmp_path = f"{self.path}.tmp.npz"
+            np.savez(tmp_path, centroids=self._centroids, chunk_ids=chunk_ids[rows], labels=labels)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def save_if_dirty(self) -> None:
+        if self._dirty:
+            self.save()
+
+    def load(self) -> bool:
+        """Loads centroids/assignments saved by save(); rows unknown to the file are assigned on the fly."""
+        if not os.path.exists(self.path):
+            return False
+        codes, chunk_ids, _ = self.base.snapshot()
+        with np.load(self.path) as data:
+            centroids = data["centroids"].astype(np.float32)
+            saved_ids = data["chunk_ids"].astype(np.int64)
+            saved_labels = data["labels"].astype(np.int32)
+        if len(codes) and centroids.shape[1] != codes.dim:
+            return False
+
+        with self._lock:
+            labels = np.full(len(codes), -1, dtype=np.int32)
+            if saved_ids.size and chunk_ids.size:
+                positions = np.searchsorted(chunk_ids, saved_ids)
+                positions[positions >= chunk_ids.size] = 0
+                known = chunk_ids[positions] == saved_ids
+                labels[positions[known]] = saved_labels[known]
+            missing = np.flatnonzero(labels < 0)
+            if missing.size:
+                labels[missing] = _assign_codes(codes, missing, centroids)
+            self._set_assignments(centroids, np.arange(len(codes)), labels)
+        return True
+
+    def load_or_build(self) -> None:
+        if not self.load():
+            self.build()
+            self.save()
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        document_ids: list[int] | None = None,
+        top_k: int = 5,
+        nprobe: int | None = None,
+    ) -> list[tuple[int, int, float]]:
+        if not self.ready:
+            return self.base.search(query_vector, document_ids, top_k)
+
+        query = normalize_query(query_vector)
+        k = max(1, int(top_k))
+        probes = max(1, nprobe or self.nprobe)
+        wanted_docs = np.asarray(document_ids, dtype=np.int64) if document_ids else None
+
+        with self._lock:
+            order = np.argsort(-(self._centroids @ query))
+            lists = [self._compact(int(i)) for i in order]
+        codes, chunk_ids, doc_ids = self.base.snapshot()
+
+        # Widen the probe when the documentIds filter leaves too few candidates.
+        while True:
+            rows = np.concatenate(lists[:probes]) if lists else np.empty(0, dtype=np.int64)
+            if wanted_docs is not None and rows.size:
+                rows = rows[np.isin(doc_ids[rows], wanted_docs)]
+            if rows.size >= k or probes >= len(lists):
+                break
+            probes = min(len(lists), probes * 2)
+
+        if rows.size == 0:
+            return []
+        scores = codes.score(query, rows)
+        return self.base.select(query, rows, scores, chunk_ids, doc_ids, k, codes.exact)
+
+    def _on_base_change(self, event: str, start: int, vectors: np.ndarray, chunk_ids: np.ndarray) -> None:
+        with self._lock:
+            if event == "load":
+                # Row numbers changed; callers rebuild with load_or_build().
+                self._centroids = None
+                self._lists = []
+                return
+            if event == "remove":
+                if self._centroids is not None:
+                    self._remove_rows(chunk_ids)
+                return
+            if self._centroids is None or vectors.shape[0] == 0:
+                return
+            labels = _assign(vectors, self._centroids)
+            rows = np.arange(start, start + vectors.shape[0], dtype=np.int64)
+            for label in np.unique(labels):
+                self._lists[int(label)].append(rows[labels == label])
+            self._dirty = True
+
+    def _remove_rows(self, removed: np.ndarray) -> None:
+        for list_id in range(len(self._lists)):
+            rows = self._compact(list_id)
+            rows = rows[~np.isin(rows, removed)]
+            self._lists[list_id] = [rows - np.searchsorted(removed, rows)]
+        self._dirty = True
+
+    def _set_assignments(self, centroids: np.ndarray, rows: np.ndarray, labels: np.ndarray) -> None:
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(centroids.shape[0] + 1))
+        sorted_rows = rows[order].astype(np.int64)
+        self._centroids = centroids
+        self._lists = [[sorted_rows[bounds[i]:bounds[i + 1]]] for i in range(centroids.shape[0])]
+
+    def _compact(self, list_id: int) -> np.ndarray:
+        segments = self._lists[list_id]
+        if len(segments) > 1:
+            segments[:] = [np.concatenate(segments)]
+        return segments[0]
+
+    def _flatten(self) -> tuple[np.ndarray, np.ndarray]:
+        rows = [self._compact(i) for i in range(len(self._lists))]
+        labels = [np.full(r.size, i, dtype=np.int32) for i, r in enumerate(rows)]
+        return np.concatenate(rows), np.concatenate(labels)
+
+
+ivf_index = IvfIndex(vector_index)
+
+
+def retrieve(query_vector: np.ndarray, document_ids: list[int] | None = None, top_k: int = 5) -> list[tuple[int, int, float]]:
+    """Routes a query to the document shards, or to the exact or IVF index depending on RAG_RETRIEVAL_MODE."""
+    if document_ids and SHARDS_ENABLED:
+        return shard_store.search(query_vector, document_ids, top_k)
+    if RETRIEVAL_MODE == "ivf":
+        return ivf_index.search(query_vector, document_ids, top_k)
+    return vector_index.search(query_vector, document_ids, top_k)
+
+
+def startup() -> None:
+    shard_store.cleanup_parts()
+    # With shards, document-filtered searches never need the resident index, so it is
+    # only loaded up front when IVF needs it (or lazily by the first unfiltered search).
+    if RETRIEVAL_MODE == "ivf" or not SHARDS_ENABLED:
+        vector_index.load()
+    if RETRIEVAL_MODE == "ivf":
+        ivf_index.load_or_build()
+
+
+def shutdown() -> None:
+    if RETRIEVAL_MODE == "ivf":
+        ivf_index.save_if_dirty()
+
+
+def recall_report(queries: int = 200, top_k: int = 5, nprobes: list[int] | None = None, seed: int = 7) -> list[dict]:
+    """Measures recall@k and latency of IVF against exact search, using stored vectors as queries."""
+    codes, _, _ = vector_index.snapshot()
+    if len(codes) == 0:
+        return []
+    if not ivf_index.ready:
+        ivf_index.load_or_build()
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(codes), min(queries, len(codes)), replace=False)
+    noise = rng.normal(scale=0.05, size=(picks.size, codes.dim)).astype(np.float32)
+    sample = codes.decode(np.sort(picks)) + noise
+
+    started = time.perf_counter()
+    truth = [{cid for cid, _, _ in vector_index.search(q, None, top_k)} for q in sample]
+    exact_ms = (time.perf_counter() - started) * 1000 / picks.size
+    report = [{"mode": "exact", "nprobe": None, "recall": 1.0, "avg_ms": round(exact_ms, 3)}]
+
+    for nprobe in nprobes or [1, 2, 4, 8, 16, 32]:
+        if nprobe > ivf_index.nlist:
+            break
+        hits = 0
+        started = time.perf_counter()
+        results = [ivf_index.search(q, None, top_k, nprobe=nprobe) for q in sample]
+        ivf_ms = (time.perf_counter() - started) * 1000 / picks.size
+        for expected, found in zip(truth, results):
+            hits += len(expected & {cid for cid, _, _ in found})
+        report.append({
+            "mode": "ivf",
+            "nprobe": nprobe,
+            "recall": round(hits / max(1, sum(len(t) for t in truth)), 4),
+            "avg_ms": round(ivf_ms, 3),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the IVF index or compare it with exact search.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32", help="Comma-separated nprobe values for the report.")
+    args = parser.parse_args()
+
+    vector_index.load()
+    if args.command == "build":
+        ivf_index.build(args.nlist)
+        ivf_index.save()
+        print(f"IVF index: {len(vector_index)} vectors, {ivf_index.nlist} lists -> {ivf_index.path}")
+    else:
+        if args.nlist:
+            ivf_index.build(args.nlist)
+        print(f"{len(vector_index)} vectors, {ivf_index.nlist or 'auto'} lists, recall@{args.top_k}")
+        for row in recall_report(args.queries, args.top_k, [int(n) for n in args.nprobe.split(",") if n]):
+            label = "exact" if row["mode"] == "exact" else f"ivf nprobe={row['nprobe']}"
+            print(f"  {label:<16} recall={row['recall']:.4f}  avg={row['avg_ms']:.3f} ms/query")
@@ -0,0 +1,144 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+from vector_index import normalize_query
+
+
+ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE", "off").strip().lower() in ("1", "on", "true")
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_S = float(os.getenv("RAG_ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    model_path: str
+    model_mtime_ns: int
+    chunk_ids: frozenset[int]
+    document_ids: frozenset[int]
+    corpus_generation: int = 0
+
+
+@dataclass
+class _Entry:
+    key: AnswerKey
+    query: np.ndarray
+    answer: str
+    created_at: float
+    generations: dict[int, int]
+
+
+class SemanticAnswerCache:
+    """Reuses answers for near-identical questions over the same retrieved context.
+
+    A lookup only matches entries for the same model file (path and mtime) and the same
+    set of retrieved chunks, then compares query embeddings by cosine similarity. Entries
+    expire after a TTL, are evicted LRU beyond the size limit, and are dropped when one of
+    their documents is deleted or when any document is ingested: a new or changed document
+    gets a new id, so only a corpus-wide generation catches answers it would change.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+        capacity: int = ANSWER_CACHE_SIZE,
+        ttl_s: float = ANSWER_CACHE_TTL_S,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+    ) -> None:
+        self.enabled = enabled
+        self.capacity = max(1, capacity)
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self._lock = Lock()
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._next_id = 0
+        self._generations: dict[int, int] = {}
+        self._corpus_generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, model_path: Path, ranked_chunks: list[dict]) -> AnswerKey:
+        return AnswerKey(
+            model_path=str(model_path),
+            model_mtime_ns=model_path.stat().st_mtime_ns,
+            chunk_ids=frozenset(int(c["chunk_id"]) for c in ranked_chunks),
+            document_ids=frozenset(int(c["document_id"]) for c in ranked_chunks),
+            corpus_generation=self._corpus_generation,
+        )
+
+    def get(self, key: AnswerKey, query_vector: np.ndarray) -> str | None:
+        if not self.enabled:
+            return None
+        query = normalize_query(query_vector)
+        now = time.time()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if not self._valid(entry, key, now):
+                    del self._entries[entry_id]
+                    continue
+                if entry.key != key:
+                    continue
+                score = float(entry.query @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].answer
+
+    def put(self, key: AnswerKey, query_vector: np.ndarray, answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        with self._lock:
+            generations = {doc_id: self._generations.get(doc_id, 0) for doc_id in key.document_ids}
+            self._entries[self._next_id] = _Entry(key, normalize_query(query_vector), answer, time.time(), generations)
+            self._next_id += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate_corpus(self) -> None:
+        """Called after every successful ingest; drops every cached answer."""
+        with self._lock:
+            self._corpus_generation += 1
+
+    def invalidate_documents(self, document_ids: list[int]) -> None:
+        """Called when documents are deleted (including a failed or duplicate ingest)."""
+        with self._lock:
+            for doc_id in document_ids:
+                self._generations[int(doc_id)] = self._generations.get(int(doc_id), 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "ttlSeconds": self.ttl_s,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _valid(self, entry: _Entry, key: AnswerKey, now: float) -> bool:
+        if self.ttl_s > 0 and now - entry.created_at > self.ttl_s:
+            return False
+        if entry.key.corpus_generation != self._corpus_generation:
+            return False
+        if any(self._generations.get(doc_id, 0) != gen for doc_id, gen in entry.generations.items()):
+            return False
+        # key carries the model file's current mtime, so answers from a replaced file are stale.
+        return entry.key.model_path != key.model_path or entry.key.model_mtime_ns == key.model_mtime_ns
+
+
+answer_cache = SemanticAnswerCache()
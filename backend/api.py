@@ -1,26 +1,36 @@
-import os
-import sys
-import sqlite3
 import hashlib
-import httpx
-import subprocess
+import json
 from datetime import datetime, timezone
 from pathlib import Path
 
-import numpy as np
 from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from huggingface_hub import snapshot_download
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from gguf_runtime import (
-    MODEL_ROOT,
-    discover_local_gguf_models,
     generate_rag_answer_with_gguf,
     is_model_currently_loaded,
+    order_context_chunks,
+    runtime_pool_status,
+    scheduler_status,
+    start_idle_reaper,
+    stop_idle_reaper,
+    stream_rag_answer_with_gguf,
 )
-from ingest_pdf import embed_text, ingest_pdf
-from init_db import DB_PATH, init_db
+from answer_cache import answer_cache
+from chunking import ChunkingConfig
+from download_manager import download_manager
+from embedding_cache import query_cache
+from finetune_jobs import finetune_jobs
+from ingest_jobs import ingest_jobs
+from ingest_pdf import embed_query
+from model_registry import discover_local_gguf_models, resolve_local_gguf_model
+from readiness import readiness
+from inference_scheduler import QueueFullError, QueueTimeoutError
+from init_db import get_connection, init_db
+import ann_index
+import lexical_index
 
 # --- CONFIGURATION API ---
 app = FastAPI(title="SLM Backend API", version="1.1.0")
@@ -53,6 +63,7 @@ class SourceItem(BaseModel):
     chunkId: int
     documentId: int
     page: int
+    pageEnd: int
     title: str
     score: float
     excerpt: str
@@ -60,16 +71,23 @@ class SourceItem(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
     sources: list[SourceItem] = Field(default_factory=list)
+    cacheHit: bool = False
+    promptTokens: int = 0
+    contextChunks: int = 0
 
 class ModelDownloadRequest(BaseModel):
     modelId: str
 
 class FinetuneRequest(BaseModel):
     datasetName: str
+    customName: str = "mon-modele"
+    quants: list[str] | None = None  # ex. ["Q4_K_M", "Q8_0"] ; le premier est téléchargé
+    imatrix: bool = False
 
 # NOUVEAU MODÈLE : Pour recevoir le nom personnalisé
 class FinetuneDownloadRequest(BaseModel):
     customName: str = "mon-modele"
+    jobId: str | None = None
 
 class LocalModelInfo(BaseModel):
     key: str
@@ -77,17 +95,17 @@ class LocalModelInfo(BaseModel):
     path: str
     sizeBytes: int
     isLoaded: bool
+    memoryBytes: int = 0
+    idleSeconds: float | None = None
+    architecture: str | None = None
+    modelName: str | None = None
+    quantization: str | None = None
+    contextLength: int | None = None
+    parameterCount: int | None = None
+    chatTemplate: str | None = None
 
 # --- REGISTRES & CONFIG ---
 
-MODEL_DOWNLOAD_REGISTRY = {
-    "llama-3.2-3b": {"repo_id": "bartowski/Llama-3.2-3B-Instruct-GGUF", "pattern": "*Q4_K_M.gguf"},
-    "phi-3.5-mini": {"repo_id": "bartowski/Phi-3.5-mini-instruct-GGUF", "pattern": "*Q4_K_M.gguf"},
-    "qwen-2.5-3b": {"repo_id": "bartowski/Qwen2.5-3B-Instruct-GGUF", "pattern": "*Q4_K_M.gguf"},
-    "mistral-7b-instruct": {"repo_id": "bartowski/Mistral-7B-Instruct-v0.3-GGUF", "pattern": "*Q4_K_M.gguf"},
-    "gemma-2-2b": {"repo_id": "bartowski/gemma-2-2b-it-GGUF", "pattern": "*Q4_K_M.gguf"},
-}
-
 MODEL_RAG_PROFILES = {
     "llama-3.2-3b": {"label": "Balanced", "default_top_k": 5},
     "phi-3.5-mini": {"label": "Concise", "default_top_k": 4},
@@ -100,74 +118,137 @@ DEFAULT_RAG_PROFILE = {"label": "Balanced", "default_top_k": 5}
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 UPLOADS_DIR = PROJECT_ROOT / "Storage" / "uploads"
-DOWNLOAD_MODEL_ROOT = MODEL_ROOT
 
 # --- FONCTIONS UTILITAIRES ---
 
 def _find_document_by_hash(file_hash: str) -> tuple[int, str] | None:
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
     cursor.execute("SELECT id, title FROM documents WHERE file_hash = ? LIMIT 1", (file_hash.strip().lower(),))
     row = cursor.fetchone()
-    conn.close()
     return (int(row[0]), str(row[1])) if row else None
 
 def search_chunks(query_text: str, document_ids: list[int] | None = None, top_k: int = 5) -> list[dict]:
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     doc_ids = [int(d) for d in (document_ids or [])]
-    if doc_ids:
-        placeholders = ",".join("?" for _ in doc_ids)
-        query = f"""
-            SELECT c.id, c.document_id, c.page, c.content, d.title, e.vector
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
-            JOIN embeddings e ON e.chunk_id = c.id
-            WHERE c.document_id IN ({placeholders})
-        """
-        cursor.execute(query, tuple(doc_ids))
-    else:
-        cursor.execute("SELECT c.id, c.document_id, c.page, c.content, d.title, e.vector FROM chunks c JOIN documents d ON d.id = c.document_id JOIN embeddings e ON e.chunk_id = c.id")
-
-    rows = cursor.fetchall()
-    conn.close()
-    if not rows: return []
-
-    query_vec = embed_text(query_text.strip())
-    scored = []
-    for cid, did, pg, cont, tit, v_blob in rows:
-        c_vec = np.frombuffer(v_blob, dtype=np.float32)
-        score = float(np.dot(query_vec, c_vec) / (np.linalg.norm(query_vec) * np.linalg.norm(c_vec)))
-        scored.append({"chunk_id": cid, "document_id": did, "page": pg or 0, "title": tit, "content": cont, "score": score})
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return scored[:max(1, int(top_k))]
+    query_vec = embed_query(query_text.strip())
+    hits = lexical_index.retrieve(query_text, query_vec, doc_ids, top_k=max(1, int(top_k)))
+    if not hits: return []
+
+    cursor = get_connection().cursor()
+    placeholders = ",".join("?" for _ in hits)
+    cursor.execute(
+        f"""
+        SELECT c.id, c.page, c.page_end, c.content, d.title
+        FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE c.id IN ({placeholders})
+        """,
+        tuple(cid for cid, _, _ in hits),
+    )
+    rows = {int(row[0]): row[1:] for row in cursor.fetchall()}
+
+    ranked = []
+    for cid, did, score in hits:
+        if cid not in rows: continue
+        pg, pg_end, cont, tit = rows[cid]
+        ranked.append({"chunk_id": cid, "document_id": did, "page": pg or 0, "page_end": pg_end or pg or 0, "title": tit, "content": cont, "score": score})
+    return ranked
+
+def _cached_answer(payload: ChatRequest, msg: str, ranked_chunks: list[dict]):
+    """Consulte le cache sémantique de réponses ; renvoie (clé, vecteur requête, réponse ou None)."""
+    if not answer_cache.enabled:
+        return None, None, None
+    model = resolve_local_gguf_model(payload.selectedModelId, payload.selectedModel)
+    key = answer_cache.key_for(model.path, ranked_chunks)
+    query_vec = embed_query(msg)
+    return key, query_vec, answer_cache.get(key, query_vec)
+
+def _to_sources(ranked_chunks: list[dict]) -> list[SourceItem]:
+    return [SourceItem(chunkId=c["chunk_id"], documentId=c["document_id"], page=c["page"], pageEnd=c["page_end"], title=c["title"], score=round(c["score"], 4), excerpt=c["content"][:160]) for c in ranked_chunks]
 
 # --- ENDPOINTS ---
 
 @app.on_event("startup")
 def startup_event():
     init_db()
+    ann_index.startup()
+    start_idle_reaper()
+    readiness.start()
+    finetune_jobs.start_polling()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    ann_index.shutdown()
+    stop_idle_reaper()
+    ingest_jobs.shutdown()
+    download_manager.shutdown()
+    finetune_jobs.stop_polling()
 
 @app.post("/api/init")
 def api_init():
-    init_db()
+    init_db(force=True)
     return {"status": "ok", "message": "Backend et base de données initialisés."}
 
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/api/ready")
+def ready():
+    """200 une fois les modèles préchargés (GGUF_PRELOAD_MODELS, RAG_PRELOAD_EMBEDDINGS), 503 sinon."""
+    status = readiness.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/api/metrics")
+def api_metrics():
+    return {
+        "queryEmbeddingCache": query_cache.stats(),
+        "answerCache": answer_cache.stats(),
+        "runtimePool": runtime_pool_status(),
+        "inferenceQueues": scheduler_status(),
+    }
+
 @app.get("/api/models/local", response_model=list[LocalModelInfo])
 def api_models_local():
     models = discover_local_gguf_models()
-    return [LocalModelInfo(key=m.key, fileName=m.path.name, path=str(m.path), sizeBytes=m.size_bytes, isLoaded=is_model_currently_loaded(m.path)) for m in models]
+    pooled = {entry["path"]: entry for entry in runtime_pool_status()["models"]}
+    infos = []
+    for m in models:
+        loaded = is_model_currently_loaded(m.path)
+        entry = pooled.get(str(m.path)) if loaded else None
+        meta = m.metadata
+        infos.append(LocalModelInfo(
+            key=m.key, fileName=m.path.name, path=str(m.path), sizeBytes=m.size_bytes, isLoaded=loaded,
+            memoryBytes=entry["memoryBytes"] if entry else 0,
+            idleSeconds=entry["idleSeconds"] if entry else None,
+            # Lu dans l'en-tête GGUF, sans charger les tenseurs.
+            architecture=meta.architecture if meta else None,
+            modelName=meta.name if meta else None,
+            quantization=meta.quantization if meta else None,
+            contextLength=meta.context_length if meta else None,
+            parameterCount=meta.parameter_count if meta else None,
+            chatTemplate=meta.chat_template if meta else None,
+        ))
+    return infos
 
 @app.post("/api/ingest")
-async def api_ingest(files: list[UploadFile] = File(...)):
+async def api_ingest(
+    files: list[UploadFile] = File(...),
+    chunker: str | None = None,
+    chunkTokens: int | None = None,
+    chunkOverlapTokens: int | None = None,
+):
+    """Enregistre les PDF et lance leur ingestion en arrière-plan ; suivre via /api/ingest/jobs/{jobId}.
+
+    chunker / chunkTokens / chunkOverlapTokens (query) remplacent les réglages RAG_CHUNK* pour cet envoi.
+    """
+    defaults = ChunkingConfig()
+    chunking = ChunkingConfig(
+        strategy=(chunker or defaults.strategy).strip().lower(),
+        max_tokens=chunkTokens or defaults.max_tokens,
+        overlap_tokens=defaults.overlap_tokens if chunkOverlapTokens is None else chunkOverlapTokens,
+    )
+    if chunking.strategy not in ("tokens", "chars"):
+        raise HTTPException(status_code=400, detail="chunker must be 'tokens' or 'chars'")
     UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
     results, errors = [], []
     for file in files:
@@ -176,83 +257,154 @@ async def api_ingest(files: list[UploadFile] = File(...)):
             f_hash = hashlib.sha256(payload).hexdigest()
             existing = _find_document_by_hash(f_hash)
             if existing:
-                results.append({"file": file.filename, "documentId": existing[0], "alreadyExists": True})
+                results.append({"file": file.filename, "documentId": existing[0], "alreadyExists": True, "status": "done"})
                 continue
             
             path = UPLOADS_DIR / f"{datetime.now().strftime('%Y%m%dt%H%M%S')}_{file.filename}"
             path.write_bytes(payload)
-            res = ingest_pdf(str(path), title=file.filename, file_hash=f_hash)
-            results.append({"file": file.filename, "documentId": res["document_id"], "chunksInserted": res["chunks_inserted"]})
+            job = ingest_jobs.submit(str(path), file.filename, f_hash, chunking)
+            results.append(job.to_dict())
         except Exception as e:
             errors.append({"file": file.filename, "error": str(e)})
     return {"results": results, "errors": errors}
 
+@app.get("/api/ingest/jobs")
+def api_ingest_jobs():
+    return [job.to_dict() for job in ingest_jobs.list()]
+
+@app.get("/api/ingest/jobs/{job_id}")
+def api_ingest_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if not job: raise HTTPException(status_code=404, detail="Unknown jobId")
+    return job.to_dict()
+
 @app.post("/api/chat", response_model=ChatResponse)
 def api_chat(payload: ChatRequest):
     msg = payload.message.strip()
     if not msg: raise HTTPException(status_code=400, detail="Empty message")
 
-    ranked_chunks = search_chunks(msg, payload.documentIds) if payload.documentIds else []
+    # Sources follow the prompt's [S1..Sn] order, which is deterministic for prefix-cache reuse.
+    ranked_chunks = order_context_chunks(search_chunks(msg, payload.documentIds)) if payload.documentIds else []
 
-    sources = [SourceItem(chunkId=c["chunk_id"], documentId=c["document_id"], page=c["page"], title=c["title"], score=round(c["score"], 4), excerpt=c["content"][:160]) for c in ranked_chunks]
+    sources = _to_sources(ranked_chunks)
 
     try:
-        answer, _, _ = generate_rag_answer_with_gguf(payload.selectedModelId, payload.selectedModel, msg, ranked_chunks)
-        return ChatResponse(answer=answer.strip(), sources=sources)
+        cache_key, query_vec, cached = _cached_answer(payload, msg, ranked_chunks)
+        if cached is not None:
+            return ChatResponse(answer=cached, sources=sources, cacheHit=True)
+        answer, _, _, prompt_stats = generate_rag_answer_with_gguf(payload.selectedModelId, payload.selectedModel, msg, ranked_chunks)
+        answer = answer.strip()
+        if cache_key is not None:
+            answer_cache.put(cache_key, query_vec, answer)
+        return ChatResponse(
+            answer=answer,
+            sources=sources,
+            promptTokens=prompt_stats["promptTokens"],
+            contextChunks=prompt_stats["contextChunks"],
+        )
+    except (QueueFullError, QueueTimeoutError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/finetune")
-async def api_start_finetune(payload: FinetuneRequest):
-    """Déclenche le job de fine-tuning sur Modal"""
-    MODAL_URL = "https://gab404--llama32-gguf-finetune-finetune-endpoint.modal.run"
-    async with httpx.AsyncClient() as client:
+@app.post("/api/chat/stream")
+def api_chat_stream(payload: ChatRequest):
+    """Variante NDJSON de /api/chat : sources, puis tokens au fil du décodage, puis un événement final de stats."""
+    msg = payload.message.strip()
+    if not msg: raise HTTPException(status_code=400, detail="Empty message")
+
+    # Sources follow the prompt's [S1..Sn] order, which is deterministic for prefix-cache reuse.
+    ranked_chunks = order_context_chunks(search_chunks(msg, payload.documentIds)) if payload.documentIds else []
+    sources = _to_sources(ranked_chunks)
+
+    try:
+        cache_key, query_vec, cached = _cached_answer(payload, msg, ranked_chunks)
+        if cached is not None:
+            token_events = iter([
+                {"type": "token", "content": cached},
+                {"type": "done", "model": Path(cache_key.model_path).name, "cacheHit": True},
+            ])
+        else:
+            token_events = stream_rag_answer_with_gguf(payload.selectedModelId, payload.selectedModel, msg, ranked_chunks)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def events():
+        yield json.dumps({"type": "sources", "sources": [s.model_dump() for s in sources]}) + "\n"
+        parts = []
         try:
-            r = await client.post(MODAL_URL, json={"dataset_name": payload.datasetName}, timeout=30.0)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Modal Error: {str(e)}")
+            for event in token_events:
+                if event["type"] == "token":
+                    parts.append(event["content"])
+                elif event["type"] == "done" and "cacheHit" not in event:
+                    event["cacheHit"] = False
+                    if cache_key is not None:
+                        answer_cache.put(cache_key, query_vec, "".join(parts).strip())
+                yield json.dumps(event) + "\n"
+        except RuntimeError as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/finetune")
+def api_start_finetune(payload: FinetuneRequest):
+    """Déclenche le job de fine-tuning sur Modal ; suivre via /api/finetune/{jobId}.
+
+    Une fois terminé, le GGUF est téléchargé dans MODEL_ROOT sous customName puis chargé.
+    """
+    try:
+        return finetune_jobs.start(payload.datasetName, payload.customName, payload.quants, payload.imatrix)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Modal Error: {str(e)}")
+
+@app.get("/api/finetune/jobs")
+def api_finetune_jobs():
+    return finetune_jobs.list()
 
 @app.post("/api/finetune/download")
 def api_download_finetuned(payload: FinetuneDownloadRequest):
-    """Télécharge le modèle fine-tuné depuis le volume Modal vers le dossier local avec un nom custom."""
-    
-    # On nettoie le nom pour éviter les erreurs de système de fichiers
-    clean_name = "".join(c for c in payload.customName if c.isalnum() or c in ("-", "_")).strip()
-    if not clean_name:
-        clean_name = "modele-finetune"
-        
-    target_file = MODEL_ROOT / f"{clean_name}-q4_k_m.gguf"
-    target_file.parent.mkdir(parents=True, exist_ok=True)
-    
+    """Lance le téléchargement du modèle fine-tuné (quant principal du job) vers le dossier local avec un nom custom."""
+    # Chaque job écrit dans son propre dossier du volume (jobs/<jobId>/)
+    job_id = payload.jobId or finetune_jobs.latest_finished_id()
+    if not job_id:
+        raise HTTPException(status_code=404, detail="Aucun job de fine-tuning terminé.")
+
     try:
-        # On ajoute --force pour écraser si on réutilise le même nom
-        cmd = [
-            sys.executable, "-m", "modal", "volume", "get", "finetune-vol", 
-            "model-q4_k_m.gguf", str(target_file), "--force"
-        ]
-        
-        custom_env = os.environ.copy()
-        custom_env["PYTHONIOENCODING"] = "utf-8"
-        
-        subprocess.run(cmd, check=True, capture_output=True, env=custom_env)
-        
-        return {"status": "ok", "message": f"Modèle téléchargé avec succès sous le nom {target_file.name} !"}
-    except subprocess.CalledProcessError as e:
-        error_msg = e.stderr.decode("utf-8", errors="ignore") if e.stderr else "Erreur inconnue"
-        raise HTTPException(status_code=500, detail=f"Erreur Modal CLI: {error_msg}")
+        # Même chemin que le suivi automatique : reprise, vérification sha256, puis chargement
+        download = finetune_jobs.download(job_id, payload.customName)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Fine-tune job not found")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Modal Error: {str(e)}")
+
+    # Le transfert tourne en arrière-plan : suivre via /api/models/downloads/{downloadId}
+    return JSONResponse(status_code=202, content={"downloadId": download.id, "jobId": job_id})
+
+@app.get("/api/finetune/{job_id}")
+def api_finetune_status(job_id: str):
+    job = finetune_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Fine-tune job not found")
+    return job
 
 @app.post("/api/models/download")
 def api_models_download(payload: ModelDownloadRequest):
-    cfg = MODEL_DOWNLOAD_REGISTRY.get(payload.modelId)
-    if not cfg: raise HTTPException(status_code=400, detail="Unknown modelId")
-    target = DOWNLOAD_MODEL_ROOT / payload.modelId
-    target.mkdir(parents=True, exist_ok=True)
+    """Lance (ou rejoint) le téléchargement en arrière-plan ; suivre via /api/models/downloads/{jobId}."""
     try:
-        snapshot_download(repo_id=cfg["repo_id"], allow_patterns=[cfg["pattern"]], local_dir=str(target))
-        return {"status": "ok", "modelId": payload.modelId}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        job = download_manager.submit_model(payload.modelId)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Unknown modelId")
+    return job.to_dict()
+
+@app.get("/api/models/downloads")
+def api_models_downloads():
+    return [job.to_dict() for job in download_manager.list()]
+
+@app.get("/api/models/downloads/{job_id}")
+def api_models_download_status(job_id: str):
+    job = download_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Download job not found")
+    return job.to_dict()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import os
+import re
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+
+
+CHUNKER = os.getenv("RAG_CHUNKER", "tokens").strip().lower()  # tokens | chars
+CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "0"))
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    page: int
+    page_end: int
+    text: str
+
+
+@dataclass(frozen=True)
+class ChunkingConfig:
+    strategy: str = CHUNKER
+    max_tokens: int = CHUNK_TOKENS
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+    chunk_chars: int = 800
+    overlap_chars: int = 150
+
+
+def chunk_text(text: str, chunk_size: int = 800, overlap: int = 150) -> list[str]:
+    chunks: list[str] = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start += max(1, chunk_size - overlap)
+    return chunks
+
+
+def split_sentences(text: str) -> list[str]:
+    """Splits on sentence punctuation and blank lines; PDF line wraps inside a sentence are joined."""
+    return [" ".join(part.split()) for part in _SENTENCE_BREAK.split(text) if part and part.strip()]
+
+
+class TokenChunker:
+    """Packs whole sentences into chunks of at most max_tokens embedding-model tokens.
+
+    Sentences flow across page boundaries, so short pages are merged with their
+    neighbours and each chunk records the page range it covers. A sentence longer than
+    the budget is split on word boundaries.
+    """
+
+    def __init__(self, config: ChunkingConfig, count_tokens: Callable[[list[str]], list[int]]) -> None:
+        self.max_tokens = max(8, config.max_tokens)
+        self.overlap_tokens = max(0, min(config.overlap_tokens, self.max_tokens // 2))
+        self.count_tokens = count_tokens
+
+    def chunk_pages(self, pages: Iterable[tuple[int, str]]) -> Iterator[Chunk]:
+        buffer: list[tuple[int, str, int]] = []
+        total = 0
+        for page_number, page_text in pages:
+            sentences = split_sentences(page_text)
+            if not sentences:
+                continue
+            for sentence, count in zip(sentences, self.count_tokens(sentences)):
+                for piece, tokens in self._fit(sentence, count):
+                    if buffer and total + tokens > self.max_tokens:
+                        yield self._emit(buffer)
+                        buffer = self._overlap(buffer)
+                        total = sum(entry[2] for entry in buffer)
+                        if total + tokens > self.max_tokens:
+                            buffer, total = [], 0
+                    buffer.append((page_number, piece, tokens))
+                    total += tokens
+        if buffer:
+            yield self._emit(buffer)
+
+    def _fit(self, sentence: str, count: int) -> list[tuple[str, int]]:
+        if count <= self.max_tokens:
+            return [(sentence, count)]
+        words = sentence.split()
+        # Token counts are spread evenly over words; close enough to stay under the model limit.
+        step = max(1, int(len(words) * self.max_tokens / count))
+        pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        return [(piece, max(1, round(count * len(piece.split()) / len(words)))) for piece in pieces]
+
+    def _overlap(self, buffer: list[tuple[int, str, int]]) -> list[tuple[int, str, int]]:
+        kept: list[tuple[int, str, int]] = []
+        total = 0
+        for entry in reversed(buffer):
+            if total + entry[2] > self.overlap_tokens:
+                break
+            kept.insert(0, entry)
+            total += entry[2]
+        return kept
+
+    @staticmethod
+    def _emit(buffer: list[tuple[int, str, int]]) -> Chunk:
+        return Chunk(page=buffer[0][0], page_end=buffer[-1][0], text=" ".join(entry[1] for entry in buffer))
+
+
+def chunk_pages(
+    pages: Iterable[tuple[int, str]],
+    config: ChunkingConfig,
+    count_tokens: Callable[[list[str]], list[int]] | None = None,
+) -> Iterator[Chunk]:
+    if config.strategy == "chars":
+        for page_number, page_text in pages:
+            for text in chunk_text(page_text, config.chunk_chars, config.overlap_chars):
+                yield Chunk(page=page_number, page_end=page_number, text=text)
+        return
+    if config.strategy != "tokens":
+        raise ValueError(f"Unknown chunker '{config.strategy}'. Use 'tokens' or 'chars'.")
+    if count_tokens is None:
+        raise ValueError("The token chunker needs a count_tokens function.")
+    yield from TokenChunker(config, count_tokens).chunk_pages(pages)
@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+
+from chunking import ChunkingConfig, split_sentences
+from ingest_pdf import count_tokens, embed_texts, iter_chunks
+from pdf_extract import iter_pdf_pages
+
+
+def _sample_queries(pages: list[tuple[int, str]], count: int, seed: int) -> list[str]:
+    """Picks real sentences from the document; the chunk that contains one intact is its answer."""
+    sentences = [s for _, text in pages for s in split_sentences(text) if len(s.split()) >= 8]
+    if not sentences:
+        return []
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(sentences), min(count, len(sentences)), replace=False)
+    return [sentences[i] for i in sorted(picks)]
+
+
+def compare(pdf_path: str, configs: list[ChunkingConfig], queries: int = 100, top_k: int = 5, seed: int = 7) -> list[dict]:
+    pages = list(iter_pdf_pages(pdf_path))
+    sample = _sample_queries(pages, queries, seed)
+    query_vectors = embed_texts(sample) if sample else np.empty((0, 0), dtype=np.float32)
+
+    report = []
+    for config in configs:
+        started = time.perf_counter()
+        chunks = list(iter_chunks(pages, config))
+        vectors = embed_texts([chunk.text for chunk in chunks])
+        elapsed = time.perf_counter() - started
+
+        normalized = [" ".join(chunk.text.split()) for chunk in chunks]
+        hits, reciprocal = 0, 0.0
+        if sample and chunks:
+            scores = query_vectors @ vectors.T
+            for row, sentence in enumerate(sample):
+                ranked = np.argsort(-scores[row])[:top_k]
+                for rank, index in enumerate(ranked, start=1):
+                    if sentence in normalized[index]:
+                        hits += 1
+                        reciprocal += 1.0 / rank
+                        break
+        tokens = count_tokens([chunk.text for chunk in chunks]) if chunks else []
+        report.append({
+            "chunker": config.strategy,
+            "max_tokens": config.max_tokens if config.strategy == "tokens" else None,
+            "chunks": len(chunks),
+            "avg_tokens": round(float(np.mean(tokens)), 1) if tokens else 0.0,
+            "embedded_tokens": int(sum(tokens)),
+            "seconds": round(elapsed, 2),
+            "hit_at_k": round(hits / len(sample), 4) if sample else 0.0,
+            "mrr": round(reciprocal / len(sample), 4) if sample else 0.0,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the character and token chunkers on one PDF.")
+    parser.add_argument("pdf")
+    parser.add_argument("--tokens", default="128,200,256", help="Comma-separated token budgets for the token chunker.")
+    parser.add_argument("--overlap-tokens", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    configs = [ChunkingConfig(strategy="chars")] + [
+        ChunkingConfig(strategy="tokens", max_tokens=int(n), overlap_tokens=args.overlap_tokens)
+        for n in args.tokens.split(",") if n
+    ]
+    print(f"{args.pdf}: hit@{args.top_k} / MRR over {args.queries} sentence queries")
+    for row in compare(args.pdf, configs, args.queries, args.top_k):
+        label = row["chunker"] if row["max_tokens"] is None else f"tokens<={row['max_tokens']}"
+        print(
+            f"  {label:<12} chunks={row['chunks']:<6} avg_tokens={row['avg_tokens']:<7} "
+            f"embedded_tokens={row['embedded_tokens']:<8} time={row['seconds']}s  "
+            f"hit@k={row['hit_at_k']:.4f}  mrr={row['mrr']:.4f}"
+        )
@@ -0,0 +1,90 @@
+from collections.abc import Callable
+
+
+MIN_PARTIAL_TOKENS = 48  # a truncated chunk shorter than this is not worth its prefill
+MAX_OVERLAP_CHARS = 400
+MIN_OVERLAP_CHARS = 20
+
+
+def _overlap_length(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _adjacent(previous: dict, chunk: dict) -> bool:
+    if int(previous.get("document_id", 0)) != int(chunk.get("document_id", 0)):
+        return False
+    previous_end = int(previous.get("page_end") or previous.get("page") or 0)
+    return int(chunk.get("page", 0) or 0) <= previous_end + 1 and int(chunk["chunk_id"]) == int(previous["chunk_id"]) + 1
+
+
+def merge_adjacent_chunks(ordered_chunks: list[dict]) -> list[dict]:
+    """Merges consecutive chunks of the same document, dropping the text they share.
+
+    ordered_chunks must be in corpus order (see order_context_chunks). Each group keeps the
+    1-based positions of its chunks as source markers and the best score of its members.
+    """
+    groups: list[dict] = []
+    for position, chunk in enumerate(ordered_chunks, start=1):
+        text = " ".join(str(chunk["content"]).split())
+        if groups and _adjacent(groups[-1]["last"], chunk):
+            group = groups[-1]
+            shared = _overlap_length(group["content"], text)
+            group["content"] = group["content"] + text[shared:] if shared else f"{group['content']} {text}"
+            group["markers"].append(position)
+            group["score"] = max(group["score"], float(chunk.get("score", 0.0)))
+            group["last"] = chunk
+            continue
+        groups.append({"markers": [position], "content": text, "score": float(chunk.get("score", 0.0)), "last": chunk})
+    return groups
+
+
+def _truncate(text: str, tokens: int, limit: int, count_tokens: Callable[[str], int]) -> tuple[str, int]:
+    words = text.split()
+    keep = max(1, int(len(words) * limit / max(1, tokens)))
+    while keep > 0:
+        candidate = " ".join(words[:keep]) + "..."
+        used = count_tokens(candidate)
+        if used <= limit:
+            return candidate, used
+        keep = int(keep * 0.9)
+    return "", 0
+
+
+def pack_context(
+    ordered_chunks: list[dict],
+    count_tokens: Callable[[str], int],
+    budget_tokens: int,
+) -> tuple[list[str], dict]:
+    """Fills budget_tokens with merged chunk groups in score order; returns rendered lines and stats.
+
+    Lines stay in corpus order, so the same selection always renders to the same prompt.
+    """
+    groups = merge_adjacent_chunks(ordered_chunks)
+    for group in groups:
+        group["tokens"] = count_tokens(group["content"])
+
+    used = 0
+    for group in sorted(groups, key=lambda g: -g["score"]):
+        remaining = budget_tokens - used
+        if group["tokens"] <= remaining:
+            group["selected"] = True
+            used += group["tokens"]
+        elif remaining >= MIN_PARTIAL_TOKENS:
+            group["content"], group["tokens"] = _truncate(group["content"], group["tokens"], remaining, count_tokens)
+            group["selected"] = bool(group["content"])
+            used += group["tokens"]
+
+    selected = [group for group in groups if group.get("selected")]
+    lines = [f"[{', '.join(f'S{m}' for m in group['markers'])}] {group['content']}" for group in selected]
+    included = sum(len(group["markers"]) for group in selected)
+    return lines, {
+        "contextTokens": used,
+        "contextBudgetTokens": budget_tokens,
+        "contextChunks": included,
+        "mergedChunks": included - len(selected),
+        "droppedChunks": len(ordered_chunks) - included,
+    }
@@ -0,0 +1,60 @@
+import queue
+import sqlite3
+from collections.abc import Callable
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any
+
+from init_db import DB_PATH, init_db, open_connection
+
+
+class SQLiteWriter:
+    """Serializes every write transaction on one thread with one connection.
+
+    Callers hand over fn(conn); it runs inside a transaction that is committed when fn
+    returns and rolled back if it raises. Ingest jobs and caches therefore never
+    compete for SQLite's write lock.
+    """
+
+    def __init__(self, db_path: str = DB_PATH) -> None:
+        self.db_path = db_path
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = Lock()
+        self._thread: Thread | None = None
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return self.submit(fn).result()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        # The writer keeps a dedicated connection rather than a pooled reader one.
+        init_db(self.db_path)
+        conn = open_connection(self.db_path)
+        while True:
+            fn, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(conn)
+                conn.commit()
+                future.set_result(result)
+            except BaseException as exc:
+                conn.rollback()
+                future.set_exception(exc)
+
+
+writer = SQLiteWriter()
@@ -0,0 +1,323 @@
+import fnmatch
+import hashlib
+import os
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+
+import httpx
+
+from model_registry import MODEL_ROOT, model_registry
+
+
+MODEL_DOWNLOAD_REGISTRY = {
+    "llama-3.2-3b": {"repo_id": "bartowski/Llama-3.2-3B-Instruct-GGUF", "pattern": "*Q4_K_M.gguf"},
+    "phi-3.5-mini": {"repo_id": "bartowski/Phi-3.5-mini-instruct-GGUF", "pattern": "*Q4_K_M.gguf"},
+    "qwen-2.5-3b": {"repo_id": "bartowski/Qwen2.5-3B-Instruct-GGUF", "pattern": "*Q4_K_M.gguf"},
+    "mistral-7b-instruct": {"repo_id": "bartowski/Mistral-7B-Instruct-v0.3-GGUF", "pattern": "*Q4_K_M.gguf"},
+    "gemma-2-2b": {"repo_id": "bartowski/gemma-2-2b-it-GGUF", "pattern": "*Q4_K_M.gguf"},
+}
+
+# Any server with the Hugging Face layout works: /api/models/{repo}/tree/{rev} lists
+# files and /{repo}/resolve/{rev}/{path} serves them (a local mirror in tests).
+DOWNLOAD_BASE_URL = os.getenv("MODEL_DOWNLOAD_BASE_URL", os.getenv("HF_ENDPOINT", "https://huggingface.co")).rstrip("/")
+DOWNLOAD_CONCURRENCY = int(os.getenv("MODEL_DOWNLOAD_CONCURRENCY", "2"))
+DOWNLOAD_RETRIES = int(os.getenv("MODEL_DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_BACKOFF_S = 2.0  # first retry delay, doubled after each failed attempt (capped at 30 s)
+DOWNLOAD_CHUNK_BYTES = 1024**2
+FINISHED_JOBS_KEPT = 50
+PARTIAL_DIR_NAME = ".downloads"
+
+
+@dataclass(frozen=True)
+class DownloadFile:
+    url: str
+    target: Path
+    size: int | None = None
+    sha256: str | None = None
+
+
+@dataclass
+class DownloadJob:
+    id: str
+    key: str
+    model_id: str
+    target_dir: Path
+    status: str = "queued"  # queued | running | done | failed
+    files: list[DownloadFile] = field(default_factory=list)
+    bytes_total: int = 0
+    bytes_done: int = 0
+    bytes_resumed: int = 0
+    current_file: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        transferred = self.bytes_done - self.bytes_resumed
+        return {
+            "jobId": self.id,
+            "modelId": self.model_id,
+            "status": self.status,
+            "targetDir": str(self.target_dir),
+            "files": [str(f.target.relative_to(self.target_dir)) for f in self.files],
+            "currentFile": self.current_file,
+            "bytesTotal": self.bytes_total,
+            "bytesDone": self.bytes_done,
+            "progress": round(self.bytes_done / self.bytes_total, 4) if self.bytes_total else 0.0,
+            "bytesPerSec": round(transferred / elapsed, 1) if elapsed > 0 else 0.0,
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at,
+            "error": self.error,
+        }
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def _retryable(status_code: int) -> bool:
+    """Server-side failures and rate limiting are worth another attempt; other 4xx are not."""
+    return status_code == 429 or status_code >= 500
+
+
+class DownloadManager:
+    """Downloads model files in the background.
+
+    Requests for a model that is already downloading return the running job. Files are
+    written to MODEL_ROOT/.downloads and resumed with HTTP Range requests after a failure
+    or restart; they are checked against the expected size and sha256 and only then
+    renamed into place, so the model registry never sees a partial file.
+    """
+
+    def __init__(
+        self,
+        root: Path = MODEL_ROOT,
+        base_url: str = DOWNLOAD_BASE_URL,
+        concurrency: int = DOWNLOAD_CONCURRENCY,
+        retries: int = DOWNLOAD_RETRIES,
+        backoff_s: float = DOWNLOAD_BACKOFF_S,
+    ) -> None:
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.retries = max(0, retries)
+        self.backoff_s = backoff_s
+        self._lock = Lock()
+        self._jobs: dict[str, DownloadJob] = {}
+        self._active_by_key: dict[str, str] = {}
+        self._threads = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="download")
+
+    def submit_model(self, model_id: str) -> DownloadJob:
+        """Downloads the files of a MODEL_DOWNLOAD_REGISTRY entry into MODEL_ROOT/<model_id>."""
+        cfg = MODEL_DOWNLOAD_REGISTRY.get(model_id)
+        if cfg is None:
+            raise KeyError(model_id)
+        target_dir = self.root / model_id
+        revision = cfg.get("revision", "main")
+        return self._submit(
+            f"hf:{cfg['repo_id']}@{revision}:{cfg['pattern']}",
+            model_id,
+            target_dir,
+            lambda: self._list_repo_files(cfg["repo_id"], revision, cfg["pattern"], target_dir),
+        )
+
+    def submit_files(self, key: str, model_id: str, target_dir: Path, files: list[DownloadFile]) -> DownloadJob:
+        """Downloads explicit URLs, e.g. fine-tuning artifacts; key de-duplicates concurrent requests."""
+        return self._submit(key, model_id, target_dir, lambda: files)
+
+    def get(self, job_id: str) -> DownloadJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        # Running transfers stop with the process; their .part files are resumed next time.
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, key: str, model_id: str, target_dir: Path, resolve: Callable[[], list[DownloadFile]]) -> DownloadJob:
+        with self._lock:
+            active_id = self._active_by_key.get(key)
+            if active_id is not None:
+                return self._jobs[active_id]
+            job = DownloadJob(id=uuid.uuid4().hex, key=key, model_id=model_id, target_dir=target_dir)
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job.id
+            self._trim_finished()
+        self._threads.submit(self._run, job, resolve)
+        return job
+
+    def _headers(self) -> dict[str, str]:
+        token = os.getenv("HF_TOKEN")
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def _list_repo_files(self, repo_id: str, revision: str, pattern: str, target_dir: Path) -> list[DownloadFile]:
+        response = httpx.get(
+            f"{self.base_url}/api/models/{repo_id}/tree/{revision}",
+            headers=self._headers(),
+            follow_redirects=True,
+            timeout=30.0,
+        )
+        response.raise_for_status()
+        files = []
+        for entry in response.json():
+            path = entry.get("path", "")
+            if entry.get("type", "file") != "file" or not (fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(Path(path).name, pattern)):
+                continue
+            lfs = entry.get("lfs") or {}
+            files.append(DownloadFile(
+                url=f"{self.base_url}/{repo_id}/resolve/{revision}/{path}",
+                target=target_dir / path,
+                size=lfs.get("size", entry.get("size")),
+                # Only LFS entries carry a sha256; small git blobs have a git sha1 oid.
+                sha256=lfs.get("oid") or lfs.get("sha256"),
+            ))
+        if not files:
+            raise DownloadError(f"No file matching '{pattern}' in {repo_id}@{revision}")
+        return files
+
+    def _run(self, job: DownloadJob, resolve: Callable[[], list[DownloadFile]]) -> None:
+        job.started_at = time.time()
+        try:
+            with self._lock:
+                job.status = "running"
+            files = resolve()
+            with self._lock:
+                job.files = files
+                job.bytes_total = sum(f.size or 0 for f in files)
+            for download in files:
+                with self._lock:
+                    job.current_file = download.target.name
+                self._fetch(job, download)
+            with self._lock:
+                job.status = "done"
+                job.current_file = None
+            model_registry.invalidate()
+        except Exception as exc:
+            job.error = str(exc)
+            with self._lock:
+                job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active_by_key.pop(job.key, None)
+
+    def _partial_path(self, download: DownloadFile) -> Path:
+        name = hashlib.sha256(f"{download.url}|{download.target}".encode("utf-8")).hexdigest()[:24]
+        return self.root / PARTIAL_DIR_NAME / f"{name}.part"
+
+    def _fetch(self, job: DownloadJob, download: DownloadFile) -> None:
+        if download.target.exists() and self._verified(download.target, download):
+            self._advance(job, download.size or download.target.stat().st_size, resumed=True)
+            return
+
+        partial = self._partial_path(download)
+        partial.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            file_start, resumed_start = job.bytes_done, job.bytes_resumed
+        attempt = 0
+        while True:
+            try:
+                self._transfer(job, download, partial, file_start, resumed_start)
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError, DownloadError) as exc:
+                if isinstance(exc, httpx.HTTPStatusError) and not _retryable(exc.response.status_code):
+                    raise
+                attempt += 1
+                if attempt > self.retries:
+                    raise DownloadError(f"{download.target.name}: {exc}") from exc
+                time.sleep(min(30.0, self.backoff_s * 2 ** (attempt - 1)))
+
+        download.target.parent.mkdir(parents=True, exist_ok=True)
+        # .downloads lives under MODEL_ROOT, so this is an atomic rename on one filesystem.
+        os.replace(partial, download.target)
+
+    def _transfer(self, job: DownloadJob, download: DownloadFile, partial: Path, file_start: int, resumed_start: int) -> None:
+        offset = partial.stat().st_size if partial.exists() else 0
+        if download.size is not None and offset > download.size:
+            partial.unlink()
+            offset = 0
+        digest = hashlib.sha256()
+        if offset and download.sha256:
+            with partial.open("rb") as existing:
+                while block := existing.read(DOWNLOAD_CHUNK_BYTES):
+                    digest.update(block)
+
+        headers = self._headers()
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        with httpx.stream("GET", download.url, headers=headers, follow_redirects=True, timeout=60.0) as response:
+            if response.status_code == 416 and offset and download.size in (None, offset):
+                # Nothing left to fetch: the previous attempt got the whole file.
+                response.close()
+            elif response.status_code == 416 and offset:
+                # The .part does not fit the remote file, so every resume would fail the same way.
+                response.close()
+                partial.unlink()
+                return self._transfer(job, download, partial, file_start, resumed_start)
+            elif response.status_code == 200 and offset:
+                # The server ignored the Range header; start over.
+                offset, digest = 0, hashlib.sha256()
+            elif response.status_code not in (200, 206):
+                response.raise_for_status()
+            # Bytes already on disk count as done, but not towards the transfer rate.
+            self._set_done(job, file_start + offset, resumed_start + offset)
+
+            if response.status_code in (200, 206):
+                with partial.open("r+b" if offset else "wb") as handle:
+                    handle.seek(offset)
+                    handle.truncate()
+                    for block in response.iter_bytes(DOWNLOAD_CHUNK_BYTES):
+                        handle.write(block)
+                        if download.sha256:
+                            digest.update(block)
+                        self._advance(job, len(block))
+
+        size = partial.stat().st_size
+        if download.size is not None and size != download.size:
+            if size > download.size:
+                partial.unlink()
+            raise DownloadError(f"size mismatch: expected {download.size} bytes, got {size}")
+        if download.sha256 and digest.hexdigest() != download.sha256.lower():
+            partial.unlink()
+            raise DownloadError("sha256 mismatch; the partial file was discarded")
+
+    @staticmethod
+    def _verified(path: Path, download: DownloadFile) -> bool:
+        if download.size is not None and path.stat().st_size != download.size:
+            return False
+        if download.sha256 is None:
+            return download.size is not None
+        digest = hashlib.sha256()
+        with path.open("rb") as handle:
+            while block := handle.read(DOWNLOAD_CHUNK_BYTES):
+                digest.update(block)
+        return digest.hexdigest() == download.sha256.lower()
+
+    def _advance(self, job: DownloadJob, count: int, resumed: bool = False) -> None:
+        with self._lock:
+            job.bytes_done += count
+            if resumed:
+                job.bytes_resumed += count
+
+    def _set_done(self, job: DownloadJob, bytes_done: int, bytes_resumed: int) -> None:
+        with self._lock:
+            job.bytes_done = bytes_done
+            job.bytes_resumed = bytes_resumed
+
+    def _trim_finished(self) -> None:
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:-FINISHED_JOBS_KEPT or None]:
+            self._jobs.pop(job.id, None)
+
+    # Defined last: inside the class body the name would shadow list[...] in annotations.
+    def list(self) -> list[DownloadJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+
+download_manager = DownloadManager()
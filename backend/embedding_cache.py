@@ -0,0 +1,101 @@
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from db_writer import writer
+from init_db import DB_PATH, get_connection
+
+
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+LOOKUP_BATCH = 500  # stays under SQLite's default host-parameter limit
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def lookup_vectors(model_name: str, hashes: list[str], db_path: str = DB_PATH) -> dict[str, np.ndarray]:
+    """Returns cached vectors for the given text hashes, keyed by hash."""
+    found: dict[str, np.ndarray] = {}
+    unique = list(dict.fromkeys(hashes))
+    if not unique:
+        return found
+
+    conn = get_connection(db_path)
+    for start in range(0, len(unique), LOOKUP_BATCH):
+        batch = unique[start:start + LOOKUP_BATCH]
+        placeholders = ",".join("?" for _ in batch)
+        rows = conn.execute(
+            f"SELECT text_hash, vector FROM embedding_cache WHERE model_name = ? AND text_hash IN ({placeholders})",
+            (model_name, *batch),
+        ).fetchall()
+        for digest, blob in rows:
+            found[digest] = np.frombuffer(blob, dtype=np.float32)
+    return found
+
+
+def store_vectors(model_name: str, items: dict[str, np.ndarray]) -> None:
+    if not items:
+        return
+    rows = [
+        (model_name, digest, np.asarray(vector, dtype=np.float32).tobytes())
+        for digest, vector in items.items()
+    ]
+    # Cache fills are not needed by the caller, so they are queued without waiting.
+    writer.submit(lambda conn: conn.executemany(
+        "INSERT OR IGNORE INTO embedding_cache (model_name, text_hash, vector) VALUES (?, ?, ?)",
+        rows,
+    ))
+
+
+class QueryEmbeddingLRU:
+    """Bounded in-memory LRU of query embeddings with hit/miss counters."""
+
+    def __init__(self, capacity: int = QUERY_CACHE_SIZE) -> None:
+        self.capacity = max(0, capacity)
+        self._lock = Lock()
+        self._entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_name: str, text: str) -> np.ndarray | None:
+        key = (model_name, normalize_text(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model_name: str, text: str, vector: np.ndarray) -> None:
+        if self.capacity == 0:
+            return
+        key = (model_name, normalize_text(text))
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+query_cache = QueryEmbeddingLRU()
@@ -0,0 +1,245 @@
+import os
+import time
+import uuid
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+import httpx
+
+from db_writer import writer
+from download_manager import DownloadFile, DownloadJob, download_manager
+from gguf_runtime import preload_gguf_model
+from init_db import get_connection
+from model_registry import MODEL_ROOT
+
+
+# Modal web endpoints (https://<workspace>--<app>-<function>.modal.run); point them at a
+# local stand-in to test the flow without Modal.
+FINETUNE_START_URL = os.getenv("FINETUNE_START_URL", "https://gab404--llama32-gguf-finetune-finetune-endpoint.modal.run")
+FINETUNE_STATUS_URL = os.getenv("FINETUNE_STATUS_URL", "https://gab404--llama32-gguf-finetune-finetune-status.modal.run")
+FINETUNE_ARTIFACT_URL = os.getenv("FINETUNE_ARTIFACT_URL", "https://gab404--llama32-gguf-finetune-finetune-artifact.modal.run")
+FINETUNE_POLL_S = float(os.getenv("FINETUNE_POLL_S", "30"))
+# Loads a finished model into the runtime pool as soon as it is downloaded.
+FINETUNE_HOT_SWAP = os.getenv("FINETUNE_HOT_SWAP", "1").strip().lower() in ("1", "on", "true")
+
+# submitted -> running -> downloading -> ready, or failed at any step.
+ACTIVE_STATUSES = ("submitted", "running", "downloading")
+_COLUMNS = (
+    "id", "call_id", "dataset_name", "custom_name", "status", "stage", "artifact_sha256",
+    "artifact_size", "download_job_id", "model_path", "error", "preload_error", "created_at", "updated_at",
+)
+
+
+def clean_model_name(name: str) -> str:
+    # Only keep characters that are safe in file names on every platform.
+    return "".join(c for c in name if c.isalnum() or c in ("-", "_")).strip() or "modele-finetune"
+
+
+def _to_dict(row: dict) -> dict:
+    return {
+        "jobId": row["id"],
+        "callId": row["call_id"],
+        "datasetName": row["dataset_name"],
+        "customName": row["custom_name"],
+        "status": row["status"],
+        "stage": row["stage"],
+        "artifactSizeBytes": row["artifact_size"],
+        "downloadJobId": row["download_job_id"],
+        "modelPath": row["model_path"],
+        "error": row["error"],
+        "preloadError": row["preload_error"],
+        "createdAt": row["created_at"],
+        "updatedAt": row["updated_at"],
+    }
+
+
+class FinetuneJobTracker:
+    """Tracks Modal fine-tuning jobs in the finetune_jobs table.
+
+    A background thread polls the status endpoint for active jobs (also after a
+    restart), downloads finished artifacts into MODEL_ROOT through the download manager
+    and preloads them. Loading goes through the model's scheduler, so requests already
+    running on a replaced file finish on the old instance.
+    """
+
+    def __init__(self, poll_s: float = FINETUNE_POLL_S) -> None:
+        self.poll_s = max(0.1, poll_s)
+        self._lock = Lock()
+        self._stop = Event()
+        self._wake = Event()
+        self._thread: Thread | None = None
+
+    def start(self, dataset_name: str, custom_name: str, quants: list[str] | None = None, imatrix: bool = False) -> dict:
+        job_id = uuid.uuid4().hex
+        params = {"job_id": job_id, "imatrix": str(imatrix).lower()}
+        if quants:
+            params["quants"] = ",".join(quants)
+        response = httpx.post(
+            FINETUNE_START_URL,
+            params=params,
+            json={"dataset_name": dataset_name},
+            timeout=30.0,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if "error" in payload:
+            raise RuntimeError(payload["error"])
+        now = time.time()
+        row = {
+            "id": payload.get("job_id", job_id),
+            "call_id": payload.get("call_id"),
+            "dataset_name": dataset_name,
+            "custom_name": clean_model_name(custom_name),
+            "status": "submitted",
+            "created_at": now,
+            "updated_at": now,
+        }
+        writer.run(lambda conn: conn.execute(
+            f"INSERT INTO finetune_jobs ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+            list(row.values()),
+        ))
+        self.start_polling()
+        self._wake.set()
+        return self.get(row["id"])
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._row(job_id)
+        return _to_dict(row) if row else None
+
+    def download(self, job_id: str, custom_name: str) -> DownloadJob:
+        """(Re)downloads a finished job's primary GGUF under custom_name; polling then loads it."""
+        job = self._row(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        remote = self._remote_status(job)
+        if remote["status"] != "done":
+            raise RuntimeError(f"Fine-tune job {job_id} is not finished ({remote['status']})")
+        download = self._submit_download({**job, "custom_name": clean_model_name(custom_name)}, remote.get("result") or {})
+        self.start_polling()
+        self._wake.set()
+        return download
+
+    def list(self, limit: int = 50) -> list[dict]:
+        rows = get_connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM finetune_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [_to_dict(dict(zip(_COLUMNS, row))) for row in rows]
+
+    def latest_finished_id(self) -> str | None:
+        row = get_connection().execute(
+            "SELECT id FROM finetune_jobs WHERE status IN ('downloading', 'ready') OR stage = 'done' "
+            "ORDER BY created_at DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def start_polling(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = Thread(target=self._loop, name="finetune-poller", daemon=True)
+            self._thread.start()
+
+    def stop_polling(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def poll_once(self) -> None:
+        rows = get_connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM finetune_jobs WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})",
+            ACTIVE_STATUSES,
+        ).fetchall()
+        for row in rows:
+            job = dict(zip(_COLUMNS, row))
+            try:
+                if job["status"] == "downloading":
+                    self._check_download(job)
+                else:
+                    self._check_remote(job)
+            except httpx.HTTPError:
+                # Modal unreachable: keep the job active and retry on the next poll.
+                continue
+            except Exception as exc:
+                self._update(job["id"], status="failed", error=str(exc))
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.poll_once()
+            self._wake.wait(self.poll_s)
+            self._wake.clear()
+
+    def _row(self, job_id: str) -> dict | None:
+        row = get_connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM finetune_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    @staticmethod
+    def _remote_status(job: dict) -> dict:
+        response = httpx.get(FINETUNE_STATUS_URL, params={"call_id": job["call_id"], "job_id": job["id"]}, timeout=30.0)
+        response.raise_for_status()
+        return response.json()
+
+    def _check_remote(self, job: dict) -> None:
+        remote = self._remote_status(job)
+        if remote["status"] == "running":
+            self._update(job["id"], status="running", stage=remote.get("stage"))
+        elif remote["status"] == "failed":
+            self._update(job["id"], status="failed", stage=remote.get("stage"), error=remote.get("error") or "Modal job failed")
+        elif remote["status"] == "done":
+            self._submit_download(job, remote.get("result") or {})
+
+    def _submit_download(self, job: dict, result: dict) -> DownloadJob:
+        # Only the primary quant is pulled; the others stay on the volume (see manifest.json).
+        quant = result.get("primary_quant") or "Q4_K_M"
+        target = MODEL_ROOT / f"{job['custom_name']}-{quant.lower()}.gguf"
+        download = download_manager.submit_files(
+            key=f"finetune:{job['id']}:{target.name}",
+            model_id=job["custom_name"],
+            target_dir=MODEL_ROOT,
+            files=[DownloadFile(
+                url=str(httpx.URL(FINETUNE_ARTIFACT_URL, params={"job_id": job["id"], "quant": quant})),
+                target=target,
+                size=result.get("gguf_size_bytes"),
+                sha256=result.get("gguf_sha256"),
+            )],
+        )
+        self._update(
+            job["id"],
+            status="downloading",
+            stage="done",
+            custom_name=job["custom_name"],
+            artifact_sha256=result.get("gguf_sha256"),
+            artifact_size=result.get("gguf_size_bytes"),
+            download_job_id=download.id,
+            model_path=str(target),
+        )
+        return download
+
+    def _check_download(self, job: dict) -> None:
+        download = download_manager.get(job["download_job_id"] or "")
+        if download is None:
+            # The process restarted mid-download: submitting again resumes the .part file.
+            self._update(job["id"], status="running")
+            return
+        if download.status == "failed":
+            self._update(job["id"], status="failed", error=f"Download failed: {download.error}")
+        elif download.status == "done":
+            preload_error = None
+            if FINETUNE_HOT_SWAP:
+                try:
+                    preload_gguf_model(Path(job["model_path"]).name)
+                except Exception as exc:
+                    # The file is in MODEL_ROOT and verified; it loads on first use instead.
+                    preload_error = str(exc)
+            self._update(job["id"], status="ready", preload_error=preload_error)
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        writer.run(lambda conn: conn.execute(
+            f"UPDATE finetune_jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+            [*fields.values(), job_id],
+        ))
+
+
+finetune_jobs = FinetuneJobTracker()
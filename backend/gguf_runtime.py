@@ -1,123 +1,142 @@
 import os
-import re
+import queue
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
 from dataclasses import dataclass
 from pathlib import Path
-from threading import Lock
+from threading import Event, Lock, Thread
 
+from context_packer import pack_context
+from inference_scheduler import InferenceScheduler
+from model_registry import LocalGgufModel, resolve_local_gguf_model
+from prefix_cache import PREFIX_CACHE_MODE, PREFIX_CACHE_RAM_BYTES, PrefixStateCache, build_prefix_cache
 
-MODEL_ROOT = Path(
-    os.getenv("GGUF_MODEL_DIR", str(Path(__file__).resolve().parent / "Model"))
-).resolve()
 
-MODEL_SELECTION_ALIASES: dict[str, list[str]] = {
-    "llama-3-2-3b": ["tinyllama", "llama"],
-    "phi-3-5-mini": ["phi-2", "phi2", "phi"],
-    "qwen-2-5-3b": ["qwen2", "qwen"],
-    "mistral-7b-instruct": ["mistral"],
-    "gemma-2-2b": ["gemma"],
-}
+# Loaded Llama instances are pooled by (path, mtime) and evicted LRU under a memory budget.
+POOL_MAX_BYTES = int(os.getenv("GGUF_POOL_MAX_BYTES", str(8 * 1024**3)))
+POOL_IDLE_TTL_S = float(os.getenv("GGUF_POOL_IDLE_TTL_S", "900"))
+KV_BYTES_PER_TOKEN_ESTIMATE = int(os.getenv("GGUF_KV_BYTES_PER_TOKEN", str(128 * 1024)))
+
+# Prompt tokens given to retrieved context; 0 fills what n_ctx leaves after the answer and question.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("GGUF_CONTEXT_TOKENS", "0"))
+# Room for the chat template's role headers and special tokens.
+PROMPT_MARGIN_TOKENS = int(os.getenv("GGUF_PROMPT_MARGIN_TOKENS", "64"))
+
+# Reads the weights through the page cache before llama.cpp maps them, so the first
+# decode does not stall on page faults.
+PREFETCH_WEIGHTS = os.getenv("GGUF_PREFETCH", "0").strip().lower() in ("1", "on", "true")
+PREFETCH_BLOCK_BYTES = 8 * 1024**2
 
 _runtime_lock = Lock()
-_loaded_model_path: Path | None = None
-_loaded_model_mtime_ns: int | None = None
-_loaded_llm = None
+_reaper_stop = Event()
+_reaper_thread: Thread | None = None
 
 
-@dataclass(frozen=True)
-class LocalGgufModel:
-    key: str
+@dataclass
+class _PooledRuntime:
+    llm: object
     path: Path
+    mtime_ns: int
     size_bytes: int
+    kv_bytes: int
+    loaded_at: float
+    last_used: float
+    prefix_cache: PrefixStateCache | None = None
 
+    @property
+    def memory_bytes(self) -> int:
+        cache_bytes = self.prefix_cache.capacity_bytes if self.prefix_cache is not None else 0
+        return self.size_bytes + self.kv_bytes + cache_bytes
 
-def _normalize(text: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "-", text.strip().lower()).strip("-")
 
+_runtime_pool: OrderedDict[tuple[Path, int], _PooledRuntime] = OrderedDict()
+_schedulers: dict[Path, InferenceScheduler] = {}
+# One lock per model file, held while that file is being loaded.
+_loading_locks: dict[Path, Lock] = {}
 
-def discover_local_gguf_models() -> list[LocalGgufModel]:
-    if not MODEL_ROOT.exists():
-        return []
 
-    discovered: list[LocalGgufModel] = []
-    for path in sorted(MODEL_ROOT.rglob("*.gguf")):
-        try:
-            size_bytes = int(path.stat().st_size)
-        except OSError:
-            size_bytes = 0
-        discovered.append(
-            LocalGgufModel(
-                key=_normalize(path.stem),
-                path=path.resolve(),
-                size_bytes=size_bytes,
-            )
-        )
-    return discovered
+def _runtime_settings() -> dict:
+    return {
+        "n_ctx": int(os.getenv("GGUF_N_CTX", "4096")),
+        "n_batch": int(os.getenv("GGUF_N_BATCH", "512")),
+        "n_threads": int(os.getenv("GGUF_N_THREADS", str(max(1, (os.cpu_count() or 4) - 1)))),
+        "n_gpu_layers": int(os.getenv("GGUF_N_GPU_LAYERS", "-1")),
+        # Pins the mapped weights in RAM so they are never paged out between requests.
+        "use_mlock": os.getenv("GGUF_MLOCK", "0").strip().lower() in ("1", "on", "true"),
+    }
 
 
-def _build_model_lookup(
-    models: list[LocalGgufModel],
-) -> tuple[dict[str, LocalGgufModel], list[LocalGgufModel]]:
-    by_key: dict[str, LocalGgufModel] = {}
-    for model in models:
-        by_key[model.key] = model
-    return by_key, models
+def _prefetch_weights(model_path: Path) -> None:
+    try:
+        with model_path.open("rb", buffering=0) as handle:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while handle.read(PREFETCH_BLOCK_BYTES):
+                pass
+    except OSError:
+        pass
 
 
-def resolve_local_gguf_model(
-    selected_model_id: str,
-    selected_model_name: str,
-) -> LocalGgufModel:
-    models = discover_local_gguf_models()
-    if not models:
-        raise RuntimeError(
-            f"No GGUF model found in '{MODEL_ROOT}'. Add at least one .gguf file."
-        )
-
-    by_key, all_models = _build_model_lookup(models)
-    normalized_id = _normalize(selected_model_id)
-    normalized_name = _normalize(selected_model_name)
-
-    preferred_tokens: list[str] = []
-    if normalized_id:
-        preferred_tokens.append(normalized_id)
-        preferred_tokens.extend(MODEL_SELECTION_ALIASES.get(normalized_id, []))
-    if normalized_name:
-        preferred_tokens.append(normalized_name)
-        preferred_tokens.extend(part for part in normalized_name.split("-") if part)
-
-    for token in preferred_tokens:
-        if token in by_key:
-            return by_key[token]
-        for model in all_models:
-            if token and token in model.key:
-                return model
-
-    if normalized_id or normalized_name:
-        available = ", ".join(model.path.name for model in all_models)
-        raise RuntimeError(
-            "No compatible GGUF model found for "
-            f"selectedModelId='{selected_model_id}' / selectedModel='{selected_model_name}'. "
-            f"Available GGUF files in '{MODEL_ROOT}': {available}"
-        )
-
-    return all_models[0]
+def _estimate_kv_bytes(llm, n_ctx: int) -> int:
+    """f16 K+V cache size from GGUF metadata, or a per-token estimate when keys are missing."""
+    metadata = getattr(llm, "metadata", None) or {}
+    arch = metadata.get("general.architecture", "")
+    try:
+        n_layer = int(metadata[f"{arch}.block_count"])
+        n_embd = int(metadata[f"{arch}.embedding_length"])
+        n_head = int(metadata[f"{arch}.attention.head_count"])
+        n_head_kv = int(metadata.get(f"{arch}.attention.head_count_kv", n_head))
+    except (KeyError, ValueError):
+        return n_ctx * KV_BYTES_PER_TOKEN_ESTIMATE
+    return 2 * n_layer * n_ctx * (n_embd * n_head_kv // max(1, n_head)) * 2
+
+
+def _evict_for(needed_bytes: int, keep: tuple[Path, int] | None = None) -> None:
+    # Caller holds _runtime_lock. Requests still using an evicted instance keep their
+    # reference, so they finish normally and the memory is released afterwards.
+    used = sum(entry.memory_bytes for entry in _runtime_pool.values())
+    for key in list(_runtime_pool.keys()):
+        if used + needed_bytes <= POOL_MAX_BYTES:
+            break
+        if key == keep:
+            continue
+        used -= _runtime_pool.pop(key).memory_bytes
+
+
+def _pooled_runtime(key: tuple[Path, int]):
+    # Caller holds _runtime_lock.
+    entry = _runtime_pool.get(key)
+    if entry is not None:
+        entry.last_used = time.monotonic()
+        _runtime_pool.move_to_end(key)
+    return entry
 
 
 def _get_llama_runtime(model_path: Path):
-    global _loaded_model_path, _loaded_model_mtime_ns, _loaded_llm
-
     try:
         current_mtime_ns = int(model_path.stat().st_mtime_ns)
+        size_bytes = int(model_path.stat().st_size)
     except OSError:
         current_mtime_ns = -1
+        size_bytes = 0
+    key = (model_path, current_mtime_ns)
 
     with _runtime_lock:
-        if (
-            _loaded_llm is not None
-            and _loaded_model_path == model_path
-            and _loaded_model_mtime_ns == current_mtime_ns
-        ):
-            return _loaded_llm, True
+        entry = _pooled_runtime(key)
+        if entry is not None:
+            return entry.llm, True
+        loading_lock = _loading_locks.setdefault(model_path, Lock())
+
+    # The global lock only guards the pool dict: a cold load (prefetch + Llama()) holds
+    # this file's loading lock, so concurrent callers for the same file wait for it and
+    # reuse the instance while other models, /api/metrics and /api/ready keep going.
+    with loading_lock:
+        with _runtime_lock:
+            entry = _pooled_runtime(key)
+            if entry is not None:
+                return entry.llm, True
 
         try:
             from llama_cpp import Llama
@@ -127,24 +146,34 @@ def _get_llama_runtime(model_path: Path):
                 "Run: ./venv/bin/pip install llama-cpp-python"
             ) from exc
 
-        n_ctx = int(os.getenv("GGUF_N_CTX", "4096"))
-        n_batch = int(os.getenv("GGUF_N_BATCH", "512"))
-        n_threads = int(
-            os.getenv("GGUF_N_THREADS", str(max(1, (os.cpu_count() or 4) - 1)))
-        )
-        n_gpu_layers = int(os.getenv("GGUF_N_GPU_LAYERS", "-1"))
-
-        _loaded_llm = Llama(
-            model_path=str(model_path),
-            n_ctx=n_ctx,
-            n_batch=n_batch,
-            n_threads=n_threads,
-            n_gpu_layers=n_gpu_layers,
-            verbose=False,
-        )
-        _loaded_model_path = model_path
-        _loaded_model_mtime_ns = current_mtime_ns
-        return _loaded_llm, False
+        settings = _runtime_settings()
+        cache_bytes = PREFIX_CACHE_RAM_BYTES if PREFIX_CACHE_MODE not in ("", "off", "0", "false") else 0
+        with _runtime_lock:
+            # A rewritten file (new mtime) replaces its stale instance.
+            for stale in [k for k in _runtime_pool if k[0] == model_path]:
+                _runtime_pool.pop(stale)
+            _evict_for(size_bytes + settings["n_ctx"] * KV_BYTES_PER_TOKEN_ESTIMATE + cache_bytes)
+
+        if PREFETCH_WEIGHTS:
+            _prefetch_weights(model_path)
+        llm = Llama(model_path=str(model_path), verbose=False, **settings)
+        prefix_cache = build_prefix_cache(model_path, current_mtime_ns)
+        if prefix_cache is not None:
+            llm.set_cache(prefix_cache)
+        now = time.monotonic()
+        with _runtime_lock:
+            _runtime_pool[key] = _PooledRuntime(
+                llm=llm,
+                path=model_path,
+                mtime_ns=current_mtime_ns,
+                size_bytes=size_bytes,
+                kv_bytes=_estimate_kv_bytes(llm, settings["n_ctx"]),
+                loaded_at=now,
+                last_used=now,
+                prefix_cache=prefix_cache,
+            )
+            _evict_for(0, keep=key)
+        return llm, False
 
 
 def is_model_currently_loaded(model_path: Path) -> bool:
@@ -154,45 +183,173 @@ def is_model_currently_loaded(model_path: Path) -> bool:
         return False
 
     with _runtime_lock:
-        return bool(
-            _loaded_llm is not None
-            and _loaded_model_path == model_path
-            and _loaded_model_mtime_ns == current_mtime_ns
-        )
+        return (model_path, current_mtime_ns) in _runtime_pool
+
+
+def evict_idle_runtimes(ttl_s: float = POOL_IDLE_TTL_S) -> list[Path]:
+    """Unloads pooled models unused for more than ttl_s seconds."""
+    if ttl_s <= 0:
+        return []
+    cutoff = time.monotonic() - ttl_s
+    with _runtime_lock:
+        idle = [key for key, entry in _runtime_pool.items() if entry.last_used < cutoff]
+        for key in idle:
+            _runtime_pool.pop(key)
+    return [path for path, _ in idle]
+
+
+def start_idle_reaper() -> None:
+    global _reaper_thread
+    if POOL_IDLE_TTL_S <= 0 or (_reaper_thread is not None and _reaper_thread.is_alive()):
+        return
+
+    def _loop() -> None:
+        interval = max(1.0, min(60.0, POOL_IDLE_TTL_S / 4))
+        while not _reaper_stop.wait(interval):
+            evict_idle_runtimes()
+
+    _reaper_stop.clear()
+    _reaper_thread = Thread(target=_loop, name="gguf-idle-reaper", daemon=True)
+    _reaper_thread.start()
+
+
+def stop_idle_reaper() -> None:
+    _reaper_stop.set()
+
+
+def runtime_pool_status() -> dict:
+    now = time.monotonic()
+    with _runtime_lock:
+        entries = [
+            {
+                "path": str(entry.path),
+                "sizeBytes": entry.size_bytes,
+                "kvCacheBytes": entry.kv_bytes,
+                "memoryBytes": entry.memory_bytes,
+                "idleSeconds": round(now - entry.last_used, 1),
+                "prefixCache": entry.prefix_cache.stats() if entry.prefix_cache is not None else None,
+            }
+            for entry in reversed(_runtime_pool.values())
+        ]
+    return {
+        "budgetBytes": POOL_MAX_BYTES,
+        "usedBytes": sum(e["memoryBytes"] for e in entries),
+        "idleTtlSeconds": POOL_IDLE_TTL_S,
+        "models": entries,
+    }
+
+
+def order_context_chunks(ranked_chunks: list[dict]) -> list[dict]:
+    """Orders retrieved chunks by position in the corpus instead of by score.
+
+    The same set of chunks then always renders to the same prompt, so llama.cpp can
+    reuse the cached KV state of a shared prefix across questions.
+    """
+    return sorted(
+        ranked_chunks,
+        key=lambda c: (int(c.get("document_id", 0)), int(c.get("page", 0) or 0), int(c.get("chunk_id", 0))),
+    )
+
+
+def _token_counter(llm) -> Callable[[str], int]:
+    if llm is None or not hasattr(llm, "tokenize"):
+        return lambda text: max(1, len(text) // 4)
+    return lambda text: len(llm.tokenize(text.encode("utf-8"), add_bos=False, special=False))
+
+
+def _context_budget(llm, fixed_tokens: int) -> int:
+    if CONTEXT_TOKEN_BUDGET > 0:
+        return CONTEXT_TOKEN_BUDGET
+    n_ctx = llm.n_ctx() if callable(getattr(llm, "n_ctx", None)) else _runtime_settings()["n_ctx"]
+    reserved = _generation_settings()["max_tokens"] + fixed_tokens + PROMPT_MARGIN_TOKENS
+    return max(0, n_ctx - reserved)
 
 
-def _build_messages(question: str, ranked_chunks: list[dict]) -> list[dict]:
+def _build_messages(question: str, ranked_chunks: list[dict], llm=None) -> tuple[list[dict], dict]:
+    """Builds the chat messages and reports how many prompt tokens they take.
+
+    Retrieved chunks are merged with their neighbours and packed into the token budget
+    with the loaded model's tokenizer; markers [S1]... follow order_context_chunks, the
+    same numbering as the sources returned by the API.
+    """
+    count_tokens = _token_counter(llm)
+
     # 1. MODE CHAT NORMAL (Sans PDF)
     if not ranked_chunks:
-        return [
-            {"role": "system", "content": "You are a helpful, smart, and friendly AI assistant."},
+        system_prompt = "You are a helpful, smart, and friendly AI assistant."
+        messages = [
+            {"role": "system", "content": system_prompt},
             {"role": "user", "content": question}
         ]
+        return messages, {"promptTokens": count_tokens(system_prompt) + count_tokens(question), "contextTokens": 0, "contextChunks": 0}
 
     # 2. MODE RAG (Avec PDF)
-    limited_chunks = ranked_chunks[:6]
-    context_lines: list[str] = []
-    for index, chunk in enumerate(limited_chunks, start=1):
-        excerpt = " ".join(str(chunk["content"]).split())
-        if len(excerpt) > 700:
-            excerpt = f"{excerpt[:700]}..."
-        context_lines.append(f"[S{index}] {excerpt}")
-
-    context_text = "\n\n".join(context_lines)
-    
     system_prompt = (
         "You are a helpful local assistant.\n"
         "Answer ONLY from the provided context.\n"
         "If the context is insufficient, say it clearly.\n"
         "When you use information, cite source markers like [S1], [S2]."
     )
-    
+    fixed_tokens = count_tokens(system_prompt) + count_tokens(f"Context:\n\n\nQuestion:\n{question}")
+    context_lines, stats = pack_context(
+        order_context_chunks(ranked_chunks), count_tokens, _context_budget(llm, fixed_tokens)
+    )
+    context_text = "\n\n".join(context_lines)
+
     user_prompt = f"Context:\n{context_text}\n\nQuestion:\n{question}"
 
+    stats["promptTokens"] = fixed_tokens + stats["contextTokens"] + 2 * max(0, len(context_lines) - 1)
     return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
-    ]
+    ], stats
+
+
+def _scheduler_for(model_path: Path) -> InferenceScheduler:
+    with _runtime_lock:
+        scheduler = _schedulers.get(model_path)
+        if scheduler is None:
+            scheduler = _schedulers[model_path] = InferenceScheduler(model_path.name)
+        return scheduler
+
+
+def scheduler_status() -> list[dict]:
+    with _runtime_lock:
+        schedulers = list(_schedulers.values())
+    return [scheduler.stats() for scheduler in schedulers]
+
+
+def _generation_settings() -> dict:
+    return {
+        "temperature": float(os.getenv("GGUF_TEMPERATURE", "0.2")),
+        "top_p": float(os.getenv("GGUF_TOP_P", "0.95")),
+        "max_tokens": int(os.getenv("GGUF_MAX_TOKENS", "512")),
+    }
+
+
+def preload_gguf_model(selected_model: str, warm_up: bool = False) -> dict:
+    """Loads a model into the runtime pool on its scheduler thread, optionally decoding one token.
+
+    The warm-up generation makes llama.cpp allocate its compute graph and buffers, which
+    otherwise happens during the first user request.
+    """
+    model = resolve_local_gguf_model(selected_model, selected_model)
+
+    def job():
+        started = time.perf_counter()
+        runtime, cache_hit = _get_llama_runtime(model.path)
+        loaded = time.perf_counter()
+        if warm_up:
+            messages, _ = _build_messages(question="Hello", ranked_chunks=[], llm=runtime)
+            runtime.create_chat_completion(messages=messages, max_tokens=1, temperature=0.0)
+        return {
+            "model": model.path.name,
+            "alreadyLoaded": cache_hit,
+            "loadMs": round((loaded - started) * 1000, 1),
+            "warmUpMs": round((time.perf_counter() - loaded) * 1000, 1) if warm_up else None,
+        }
+
+    return _scheduler_for(model.path).run(job)
 
 
 def generate_rag_answer_with_gguf(
@@ -200,25 +357,20 @@ def generate_rag_answer_with_gguf(
     selected_model_name: str,
     question: str,
     ranked_chunks: list[dict],
-) -> tuple[str, LocalGgufModel, bool]:
+) -> tuple[str, LocalGgufModel, bool, dict]:
     model = resolve_local_gguf_model(selected_model_id, selected_model_name)
-    runtime, cache_hit = _get_llama_runtime(model.path)
 
-    messages = _build_messages(question=question, ranked_chunks=ranked_chunks)
-    temperature = float(os.getenv("GGUF_TEMPERATURE", "0.2"))
-    top_p = float(os.getenv("GGUF_TOP_P", "0.95"))
-    max_tokens = int(os.getenv("GGUF_MAX_TOKENS", "512"))
+    def job():
+        runtime, cache_hit = _get_llama_runtime(model.path)
+        # Packing needs the model's tokenizer, so it runs once the runtime is loaded.
+        messages, prompt_stats = _build_messages(question=question, ranked_chunks=ranked_chunks, llm=runtime)
+        try:
+            # Utilisation de la Chat API qui gère automatiquement les formats Llama/Mistral/ChatML !
+            return runtime.create_chat_completion(messages=messages, **_generation_settings()), cache_hit, prompt_stats
+        except Exception as exc:
+            raise RuntimeError(f"GGUF inference failed with '{model.path.name}': {exc}") from exc
 
-    try:
-        # Utilisation de la Chat API qui gère automatiquement les formats Llama/Mistral/ChatML !
-        result = runtime.create_chat_completion(
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            top_p=top_p,
-        )
-    except Exception as exc:
-        raise RuntimeError(f"GGUF inference failed with '{model.path.name}': {exc}") from exc
+    result, cache_hit, prompt_stats = _scheduler_for(model.path).run(job)
 
     # Extraction de la réponse depuis la nouvelle structure de données
     answer_text = ""
@@ -226,8 +378,102 @@ def generate_rag_answer_with_gguf(
         choices = result.get("choices", [])
         if choices:
             answer_text = choices[0].get("message", {}).get("content", "").strip()
+        # The exact count once the chat template is applied, when llama.cpp reports it.
+        prompt_stats["promptTokens"] = int(result.get("usage", {}).get("prompt_tokens") or prompt_stats["promptTokens"])
 
     if not answer_text:
         answer_text = "I could not generate an answer from the selected GGUF model."
 
-    return answer_text, model, cache_hit
+    return answer_text, model, cache_hit, prompt_stats
+
+
+def stream_rag_answer_with_gguf(
+    selected_model_id: str,
+    selected_model_name: str,
+    question: str,
+    ranked_chunks: list[dict],
+) -> Iterator[dict]:
+    """Yields {"type": "token"} events as llama.cpp decodes, then one {"type": "done"} event with timings."""
+    model = resolve_local_gguf_model(selected_model_id, selected_model_name)
+    started = time.perf_counter()
+    events: queue.Queue = queue.Queue()
+    cancelled = Event()
+    _end = object()
+
+    def job():
+        # Runs on the model's scheduler thread and hands tokens to the HTTP thread.
+        if cancelled.is_set():
+            events.put((_end, None, None))
+            return
+        runtime, cache_hit = _get_llama_runtime(model.path)
+        try:
+            messages, prompt_stats = _build_messages(question=question, ranked_chunks=ranked_chunks, llm=runtime)
+            events.put(("start", (cache_hit, prompt_stats), time.perf_counter()))
+            stream = runtime.create_chat_completion(messages=messages, stream=True, **_generation_settings())
+            for chunk in stream:
+                if cancelled.is_set():
+                    break
+                choices = chunk.get("choices", []) if isinstance(chunk, dict) else []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    events.put(("token", content, time.perf_counter()))
+        except Exception as exc:
+            events.put(("error", RuntimeError(f"GGUF inference failed with '{model.path.name}': {exc}"), None))
+        finally:
+            events.put((_end, None, None))
+
+    # Submitting before the first event lets callers turn QueueFullError into a 503 up front.
+    future = _scheduler_for(model.path).submit(job)
+    return _drain_stream_events(model, events, future, cancelled, _end, started)
+
+
+def _drain_stream_events(
+    model: LocalGgufModel,
+    events: queue.Queue,
+    future: Future,
+    cancelled: Event,
+    end_marker: object,
+    started: float,
+) -> Iterator[dict]:
+    cache_hit = False
+    prompt_stats: dict = {}
+    started_at = started
+    first_token_at: float | None = None
+    completion_tokens = 0
+
+    try:
+        while True:
+            try:
+                kind, value, at = events.get(timeout=0.5)
+            except queue.Empty:
+                if future.done() and future.exception() is not None:
+                    raise future.exception()
+                continue
+            if kind is end_marker:
+                break
+            if kind == "error":
+                raise value
+            if kind == "start":
+                (cache_hit, prompt_stats), started_at = value, at
+                continue
+            if first_token_at is None:
+                first_token_at = at
+            # llama.cpp emits one streamed chunk per decoded token.
+            completion_tokens += 1
+            yield {"type": "token", "content": value}
+    finally:
+        cancelled.set()
+
+    finished = time.perf_counter()
+    decode_seconds = finished - (first_token_at or finished)
+    yield {
+        "type": "done",
+        "model": model.path.name,
+        "runtimeCacheHit": cache_hit,
+        **prompt_stats,
+        "completionTokens": completion_tokens,
+        "queueWaitMs": round((started_at - started) * 1000, 1),
+        "timeToFirstTokenMs": round(((first_token_at or finished) - started) * 1000, 1),
+        "tokensPerSec": round(completion_tokens / decode_seconds, 2) if decode_seconds > 0 else 0.0,
+        "totalMs": round((finished - started) * 1000, 1),
+    }
@@ -0,0 +1,98 @@
+import os
+import queue
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any
+
+
+QUEUE_MAX = int(os.getenv("GGUF_QUEUE_MAX", "8"))
+QUEUE_TIMEOUT_S = float(os.getenv("GGUF_QUEUE_TIMEOUT_S", "120"))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a model's inference queue has no free slot (admission control)."""
+
+
+class QueueTimeoutError(RuntimeError):
+    """Raised when a request waited longer than the queue timeout before starting."""
+
+
+class InferenceScheduler:
+    """Runs inference jobs for one model on a single worker thread, in FIFO order.
+
+    A llama.cpp context is not safe for concurrent calls, so every job for a model is
+    serialized here while different models run on their own workers in parallel.
+    """
+
+    def __init__(self, name: str, max_queue: int = QUEUE_MAX, timeout_s: float = QUEUE_TIMEOUT_S) -> None:
+        self.name = name
+        self.timeout_s = timeout_s
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = Lock()
+        self._running = False
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._waits_ms: deque[float] = deque(maxlen=256)
+        self._worker = Thread(target=self._loop, name=f"inference-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, job: Callable[[], Any]) -> Future:
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((job, future, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(
+                f"Inference queue for '{self.name}' is full ({self._queue.maxsize} waiting). Retry shortly."
+            ) from None
+        return future
+
+    def run(self, job: Callable[[], Any]) -> Any:
+        return self.submit(job).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = list(self._waits_ms)
+            return {
+                "model": self.name,
+                "queueDepth": self._queue.qsize(),
+                "queueCapacity": self._queue.maxsize,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timedOut": self._timed_out,
+                "avgWaitMs": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                "maxWaitMs": round(max(waits), 1) if waits else 0.0,
+            }
+
+    def _loop(self) -> None:
+        while True:
+            job, future, enqueued_at = self._queue.get()
+            waited_s = time.monotonic() - enqueued_at
+            with self._lock:
+                self._waits_ms.append(waited_s * 1000)
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.timeout_s > 0 and waited_s > self.timeout_s:
+                with self._lock:
+                    self._timed_out += 1
+                future.set_exception(QueueTimeoutError(
+                    f"Request for '{self.name}' waited {waited_s:.1f}s in queue (limit {self.timeout_s:.0f}s)."
+                ))
+                continue
+
+            with self._lock:
+                self._running = True
+            try:
+                future.set_result(job())
+            except BaseException as exc:
+                future.set_exception(exc)
+            finally:
+                with self._lock:
+                    self._running = False
+                    self._completed += 1
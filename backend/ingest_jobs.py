@@ -0,0 +1,166 @@
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock
+
+from chunking import ChunkingConfig
+from ingest_pdf import ingest_pdf
+from pdf_extract import count_pdf_pages, iter_pdf_pages
+
+
+INGEST_CONCURRENCY = int(os.getenv("RAG_INGEST_CONCURRENCY", "2"))
+INGEST_PROCESSES = int(os.getenv("RAG_INGEST_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+PAGES_PER_TASK = int(os.getenv("RAG_INGEST_PAGES_PER_TASK", "16"))
+PAGE_TASKS_IN_FLIGHT = int(os.getenv("RAG_INGEST_PAGE_TASKS_IN_FLIGHT", "4"))
+FINISHED_JOBS_KEPT = 200
+
+
+@dataclass
+class IngestJob:
+    id: str
+    file_name: str
+    path: str
+    file_hash: str
+    chunking: ChunkingConfig | None = None
+    status: str = "queued"  # queued | running | done | failed
+    pages_total: int = 0
+    pages_parsed: int = 0
+    pages_embedded: int = 0
+    chunks_embedded: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: dict | None = None
+    error: str | None = None
+
+    def eta_seconds(self) -> float | None:
+        if self.status != "running" or self.started_at is None or not self.pages_embedded or not self.pages_total:
+            return None
+        # Parsing runs ahead of embedding, so progress is measured on committed pages.
+        elapsed = time.time() - self.started_at
+        return round(elapsed / self.pages_embedded * max(0, self.pages_total - self.pages_embedded), 1)
+
+    def to_dict(self) -> dict:
+        payload = {
+            "jobId": self.id,
+            "file": self.file_name,
+            "status": self.status,
+            "pagesTotal": self.pages_total,
+            "pagesParsed": self.pages_parsed,
+            "pagesEmbedded": self.pages_embedded,
+            "chunksEmbedded": self.chunks_embedded,
+            "etaSeconds": self.eta_seconds(),
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at,
+            "error": self.error,
+        }
+        if self.result:
+            payload.update({
+                "documentId": self.result["document_id"],
+                "chunksInserted": self.result["chunks_inserted"],
+                "chunksPerSec": self.result.get("chunks_per_sec", 0.0),
+                "alreadyExists": self.result.get("already_exists", False),
+            })
+        return payload
+
+
+class IngestJobManager:
+    """Runs PDF ingestion in the background.
+
+    Page ranges are extracted in a process pool (pypdf is pure Python and CPU-bound) and
+    stream into ingest_pdf, which embeds and commits them batch by batch through the
+    single SQLite writer while later pages are still being parsed.
+    """
+
+    def __init__(self, concurrency: int = INGEST_CONCURRENCY, processes: int = INGEST_PROCESSES) -> None:
+        self._lock = Lock()
+        self._jobs: dict[str, IngestJob] = {}
+        self._active_by_hash: dict[str, str] = {}
+        self._threads = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ingest")
+        self._processes_count = max(1, processes)
+        self._processes: ProcessPoolExecutor | None = None
+
+    def submit(self, path: str, file_name: str, file_hash: str, chunking: ChunkingConfig | None = None) -> IngestJob:
+        with self._lock:
+            active_id = self._active_by_hash.get(file_hash)
+            if active_id is not None:
+                return self._jobs[active_id]
+            job = IngestJob(id=uuid.uuid4().hex, file_name=file_name, path=path, file_hash=file_hash, chunking=chunking)
+            self._jobs[job.id] = job
+            self._active_by_hash[file_hash] = job.id
+            self._trim_finished()
+        self._threads.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[IngestJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self._processes_count)
+            return self._processes
+
+    def _set_status(self, job: IngestJob, status: str) -> None:
+        with self._lock:
+            job.status = status
+
+    def _on_pages_parsed(self, job: IngestJob, count: int) -> None:
+        with self._lock:
+            job.pages_parsed = min(job.pages_total, job.pages_parsed + count)
+
+    def _on_progress(self, job: IngestJob, event: dict) -> None:
+        with self._lock:
+            job.chunks_embedded = event["chunks_embedded"]
+            job.pages_embedded = max(job.pages_embedded, event["last_page"])
+
+    def _run(self, job: IngestJob) -> None:
+        job.started_at = time.time()
+        try:
+            self._set_status(job, "running")
+            job.pages_total = count_pdf_pages(job.path)
+            pages = iter_pdf_pages(
+                job.path,
+                executor=self._process_pool(),
+                pages_per_task=PAGES_PER_TASK,
+                max_in_flight=PAGE_TASKS_IN_FLIGHT,
+                on_pages_parsed=lambda count: self._on_pages_parsed(job, count),
+            )
+            job.result = ingest_pdf(
+                job.path,
+                title=job.file_name,
+                file_hash=job.file_hash,
+                pages=pages,
+                progress=lambda event: self._on_progress(job, event),
+                chunking=job.chunking,
+            )
+            with self._lock:
+                job.pages_embedded = job.pages_total
+            self._set_status(job, "done")
+        except Exception as exc:
+            job.error = str(exc)
+            self._set_status(job, "failed")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active_by_hash.pop(job.file_hash, None)
+
+    def _trim_finished(self) -> None:
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:-FINISHED_JOBS_KEPT or None]:
+            self._jobs.pop(job.id, None)
+
+
+ingest_jobs = IngestJobManager()
@@ -1,62 +1,121 @@
 import os
 import sqlite3
 import sys
+import time
 import hashlib
+import queue
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future
+from dataclasses import replace
+from threading import Event, Lock, Thread
 
 import numpy as np #type: ignore
-from pypdf import PdfReader # type: ignore
 from sentence_transformers import SentenceTransformer  #type: ignore
 from tqdm import tqdm #type: ignore
 
-from init_db import DB_PATH, init_db
+from answer_cache import answer_cache
+from chunking import Chunk, ChunkingConfig, chunk_pages
+from db_writer import writer
+from embedding_cache import lookup_vectors, query_cache, store_vectors, text_hash
+from init_db import DB_PATH, fts_enabled, get_connection
+from pdf_extract import iter_pdf_pages
+from vector_codec import encode_vector
+from vector_index import vector_index
+from vector_shards import shard_store
 
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DEFAULT_MODEL = os.getenv("RAG_EMBED_MODEL", "all-MiniLM-L6-v2")
 FALLBACK_MODEL = os.getenv("RAG_EMBED_FALLBACK_MODEL", "BAAI/bge-large-en-v1.5")
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+INGEST_QUEUE_BATCHES = int(os.getenv("RAG_INGEST_QUEUE_BATCHES", "4"))
+STORAGE_FORMAT = os.getenv("RAG_STORAGE_FORMAT", "float32").strip().lower()  # float32 | float16 | int8
 model: SentenceTransformer | None = None
+model_name: str | None = None
+_model_lock = Lock()
 
 
 def get_model() -> SentenceTransformer:
-    global model
+    global model, model_name
     if model is not None:
         return model
 
-    try:
-        model = SentenceTransformer(DEFAULT_MODEL)
-    except Exception:
-        # Offline fallback when the default model is not locally cached.
-        model = SentenceTransformer(FALLBACK_MODEL, local_files_only=True)
+    # The startup preload and the first request may race; only one of them loads.
+    with _model_lock:
+        if model is not None:
+            return model
+        try:
+            loaded = SentenceTransformer(DEFAULT_MODEL)
+            model_name = DEFAULT_MODEL
+        except Exception:
+            # Offline fallback when the default model is not locally cached.
+            loaded = SentenceTransformer(FALLBACK_MODEL, local_files_only=True)
+            model_name = FALLBACK_MODEL
+        model = loaded
     return model
 
 
-def extract_pages_from_pdf(pdf_path: str) -> list[tuple[int, str]]:
-    reader = PdfReader(pdf_path)
-    pages: list[tuple[int, str]] = []
-    for page_number, page in enumerate(reader.pages, start=1):
-        page_text = page.extract_text()
-        clean_text = (page_text or "").strip()
-        if clean_text:
-            pages.append((page_number, clean_text))
-    return pages
-
-
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 150) -> list[str]:
-    chunks: list[str] = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start += max(1, chunk_size - overlap)
-    return chunks
+def get_model_name() -> str:
+    get_model()
+    return model_name or DEFAULT_MODEL
 
 
 def embed_text(text: str) -> np.ndarray:
     return np.array(get_model().encode(text), dtype=np.float32)
 
 
+def embed_texts(texts: list[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Encodes texts in model batches and returns L2-normalized float32 rows."""
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    vectors = get_model().encode(
+        texts,
+        batch_size=max(1, batch_size),
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def embed_texts_cached(texts: list[str], batch_size: int = EMBED_BATCH_SIZE) -> tuple[np.ndarray, int]:
+    """Like embed_texts, but reuses vectors from the persistent embedding cache.
+
+    Returns the vectors and how many texts were served without running the model.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32), 0
+
+    name = get_model_name()
+    hashes = [text_hash(text) for text in texts]
+    known = lookup_vectors(name, hashes)
+
+    # Repeated boilerplate within the batch is encoded once.
+    pending: dict[str, str] = {}
+    for digest, text in zip(hashes, texts):
+        if digest not in known and digest not in pending:
+            pending[digest] = text
+    if pending:
+        fresh = embed_texts(list(pending.values()), batch_size)
+        computed = dict(zip(pending.keys(), fresh))
+        store_vectors(name, computed)
+        known.update(computed)
+
+    vectors = np.vstack([known[digest] for digest in hashes])
+    return vectors, len(texts) - len(pending)
+
+
+def embed_query(text: str) -> np.ndarray:
+    """Embeds a search query, serving repeated queries from the in-memory LRU."""
+    name = get_model_name()
+    cached = query_cache.get(name, text)
+    if cached is not None:
+        return cached
+    vector = embed_texts([text])[0]
+    query_cache.put(name, text, vector)
+    return vector
+
+
 def compute_file_sha256(file_path: str) -> str:
     hasher = hashlib.sha256()
     with open(file_path, "rb") as handle:
@@ -65,98 +124,253 @@ def compute_file_sha256(file_path: str) -> str:
     return hasher.hexdigest()
 
 
+def count_tokens(texts: list[str]) -> list[int]:
+    """Token counts from the embedding model's own tokenizer (special tokens excluded)."""
+    encoded = get_model().tokenizer(texts, add_special_tokens=False)["input_ids"]
+    return [len(ids) for ids in encoded]
+
+
+def iter_chunks(pages: Iterable[tuple[int, str]], chunking: ChunkingConfig | None = None) -> Iterator[Chunk]:
+    config = chunking or ChunkingConfig()
+    if config.strategy == "tokens":
+        # Leave room for the [CLS]/[SEP] tokens the model adds around each chunk.
+        limit = int(getattr(get_model(), "max_seq_length", 0) or 0) - 2
+        if limit > 0 and config.max_tokens > limit:
+            config = replace(config, max_tokens=limit)
+    return chunk_pages(pages, config, count_tokens)
+
+
+def _existing_result(existing: tuple, normalized_hash: str) -> dict:
+    return {
+        "document_id": int(existing[0]),
+        "title": existing[1],
+        "chunks_inserted": 0,
+        "db_path": DB_PATH,
+        "already_exists": True,
+        "file_hash": normalized_hash,
+    }
+
+
+def _delete_document(conn: sqlite3.Connection, document_id: int) -> None:
+    if fts_enabled():
+        # External-content FTS rows must be removed with the text they were indexed from.
+        conn.execute(
+            "INSERT INTO chunks_fts (chunks_fts, rowid, content) SELECT 'delete', id, content FROM chunks WHERE document_id = ?",
+            (document_id,),
+        )
+    conn.execute(
+        "DELETE FROM embeddings WHERE chunk_id IN (SELECT id FROM chunks WHERE document_id = ?)",
+        (document_id,),
+    )
+    conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+    conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+
+def _write_batch(
+    conn: sqlite3.Connection,
+    document_id: int,
+    batch: list[Chunk],
+    vectors: np.ndarray,
+) -> list[int]:
+    conn.executemany(
+        "INSERT INTO chunks (document_id, content, page, page_end) VALUES (?, ?, ?, ?)",
+        [(document_id, chunk.text, chunk.page, chunk.page_end) for chunk in batch],
+    )
+    # Writes are serialized, so this document's newest rows are exactly this batch.
+    rows = conn.execute(
+        "SELECT id FROM chunks WHERE document_id = ? ORDER BY id DESC LIMIT ?",
+        (document_id, len(batch)),
+    ).fetchall()
+    chunk_ids = [int(row[0]) for row in reversed(rows)]
+    conn.executemany(
+        "INSERT INTO embeddings (chunk_id, vector, format) VALUES (?, ?, ?)",
+        [
+            (chunk_id, encode_vector(vector, STORAGE_FORMAT), STORAGE_FORMAT)
+            for chunk_id, vector in zip(chunk_ids, vectors)
+        ],
+    )
+    if fts_enabled():
+        conn.executemany(
+            "INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)",
+            [(chunk_id, chunk.text) for chunk_id, chunk in zip(chunk_ids, batch)],
+        )
+    return chunk_ids
+
+
+def _produce_batches(
+    pages: Iterable[tuple[int, str]],
+    batch_size: int,
+    out: queue.Queue,
+    stop: Event,
+    end_marker: object,
+    chunking: ChunkingConfig | None = None,
+) -> None:
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        batch: list[Chunk] = []
+        for entry in iter_chunks(pages, chunking):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                if not put(batch):
+                    return
+                batch = []
+        if batch and not put(batch):
+            return
+        put(end_marker)
+    except BaseException as exc:
+        put(exc)
+
+
 def ingest_pdf(
     pdf_path: str,
     title: str | None = None,
     show_progress: bool = False,
     file_hash: str | None = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    pages: Iterable[tuple[int, str]] | None = None,
+    progress: Callable[[dict], None] | None = None,
+    chunking: ChunkingConfig | None = None,
 ) -> dict:
+    """Streams a PDF through page extraction, chunking, batched embedding and batched commits.
+
+    pages lets callers supply their own (e.g. process-pool backed) page iterator; progress,
+    if given, receives {"chunks_embedded", "last_page"} after each committed batch; chunking
+    overrides the RAG_CHUNK* defaults for this document. Only a bounded number of batches
+    is ever held in memory, whatever the document size.
+    """
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(f"File not found: {pdf_path}")
 
-    init_db()
-
-    page_entries = extract_pages_from_pdf(pdf_path)
-    if not page_entries:
-        raise ValueError("No extractable text found in the PDF.")
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     document_title = title or os.path.basename(pdf_path)
     normalized_hash = (file_hash or compute_file_sha256(pdf_path)).strip().lower()
 
     if normalized_hash:
-        cursor.execute(
+        existing = get_connection().execute(
             "SELECT id, title FROM documents WHERE file_hash = ? LIMIT 1",
             (normalized_hash,),
-        )
-        existing = cursor.fetchone()
+        ).fetchone()
         if existing:
-            conn.close()
-            return {
-                "document_id": int(existing[0]),
-                "title": existing[1],
-                "chunks_inserted": 0,
-                "db_path": DB_PATH,
-                "already_exists": True,
-                "file_hash": normalized_hash,
-            }
-
+            return _existing_result(existing, normalized_hash)
+
+    if pages is None:
+        pages = iter_pdf_pages(pdf_path)
+
+    # The hash is only set once every batch is committed, so a half-ingested document
+    # is never mistaken for a finished one by the duplicate check.
+    document_id = writer.run(lambda conn: conn.execute(
+        "INSERT INTO documents (title, file_hash) VALUES (?, NULL)",
+        (document_title,),
+    ).lastrowid)
+
+    batch_size = max(1, int(batch_size))
+    batches: queue.Queue = queue.Queue(maxsize=max(1, INGEST_QUEUE_BATCHES))
+    stop = Event()
+    end_marker = object()
+    producer = Thread(
+        target=_produce_batches,
+        args=(pages, batch_size, batches, stop, end_marker, chunking),
+        name="ingest-chunker",
+        daemon=True,
+    )
+
+    shard_store.begin(document_id)
+    started = time.perf_counter()
+    chunks_inserted = 0
+    dim = 0
+    cache_hits = 0
+    pending: tuple[Future, list[Chunk], np.ndarray] | None = None
+    bar = tqdm(desc="Ingesting", unit="chunk") if show_progress else None
+
+    def flush(item: tuple[Future, list[Chunk], np.ndarray]) -> None:
+        nonlocal chunks_inserted, dim
+        future, batch, vectors = item
+        chunk_ids = future.result()
+        vector_index.add(chunk_ids, [document_id] * len(chunk_ids), vectors)
+        shard_store.append(document_id, chunk_ids, vectors)
+        dim = vectors.shape[1]
+        chunks_inserted += len(chunk_ids)
+        if bar is not None:
+            bar.update(len(chunk_ids))
+        if progress:
+            progress({"chunks_embedded": chunks_inserted, "last_page": batch[-1].page_end})
+
+    producer.start()
     try:
-        cursor.execute(
-            "INSERT INTO documents (title, file_hash) VALUES (?, ?)",
-            (document_title, normalized_hash or None),
-        )
-        document_id = cursor.lastrowid
-    except sqlite3.IntegrityError:
-        if normalized_hash:
-            cursor.execute(
-                "SELECT id, title FROM documents WHERE file_hash = ? LIMIT 1",
-                (normalized_hash,),
+        while True:
+            item = batches.get()
+            if item is end_marker:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            vectors, hits = embed_texts_cached([chunk.text for chunk in item], batch_size)
+            cache_hits += hits
+            # The previous batch commits on the writer thread while this one was embedding.
+            if pending is not None:
+                flush(pending)
+            pending = (
+                writer.submit(lambda conn, b=item, v=vectors: _write_batch(conn, document_id, b, v)),
+                item,
+                vectors,
             )
-            existing = cursor.fetchone()
-            if existing:
-                conn.close()
-                return {
-                    "document_id": int(existing[0]),
-                    "title": existing[1],
-                    "chunks_inserted": 0,
-                    "db_path": DB_PATH,
-                    "already_exists": True,
-                    "file_hash": normalized_hash,
-                }
-        conn.close()
+        if pending is not None:
+            flush(pending)
+            pending = None
+
+        if chunks_inserted == 0:
+            raise ValueError("No extractable text found in the PDF.")
+
+        def finalize(conn: sqlite3.Connection):
+            try:
+                conn.execute(
+                    "UPDATE documents SET file_hash = ? WHERE id = ?",
+                    (normalized_hash or None, document_id),
+                )
+            except sqlite3.IntegrityError:
+                # Another upload of the same file finished first; keep that one.
+                existing = conn.execute(
+                    "SELECT id, title FROM documents WHERE file_hash = ? LIMIT 1",
+                    (normalized_hash,),
+                ).fetchone()
+                _delete_document(conn, document_id)
+                return existing
+            return None
+
+        existing = writer.run(finalize)
+        if existing:
+            # Leftover rows would crowd out real hits and leave searches short of top_k.
+            vector_index.remove_documents([document_id])
+            shard_store.discard(document_id)
+            answer_cache.invalidate_documents([document_id])
+            return _existing_result(existing, normalized_hash)
+        shard_store.commit(document_id, dim)
+        # Cached answers were computed without this document; any of them may now differ.
+        answer_cache.invalidate_corpus()
+    except BaseException:
+        stop.set()
+        if pending is not None:
+            try:
+                pending[0].result()
+            except Exception:
+                pass
+        writer.run(lambda conn: _delete_document(conn, document_id))
+        vector_index.remove_documents([document_id])
+        shard_store.discard(document_id)
+        answer_cache.invalidate_documents([document_id])
         raise
+    finally:
+        stop.set()
+        if bar is not None:
+            bar.close()
 
-    chunks_with_page: list[tuple[int, str]] = []
-    for page_number, page_text in page_entries:
-        for chunk in chunk_text(page_text):
-            chunks_with_page.append((page_number, chunk))
-
-    iterator = chunks_with_page
-    if show_progress:
-        iterator = tqdm(chunks_with_page, desc="Progress", unit="chunk")
-
-    chunks_inserted = 0
-    for page_number, chunk in iterator:
-        cursor.execute(
-            "INSERT INTO chunks (document_id, content, page) VALUES (?, ?, ?)",
-            (document_id, chunk, page_number),
-        )
-        chunk_id = cursor.lastrowid
-
-        vector = embed_text(chunk)
-
-        cursor.execute(
-            "INSERT INTO embeddings (chunk_id, vector) VALUES (?, ?)",
-            (chunk_id, vector.tobytes()),
-        )
-        chunks_inserted += 1
-
-    conn.commit()
-    conn.close()
-
+    elapsed = time.perf_counter() - started
     return {
         "document_id": int(document_id),
         "title": document_title,
@@ -164,6 +378,8 @@ def ingest_pdf(
         "db_path": DB_PATH,
         "already_exists": False,
         "file_hash": normalized_hash,
+        "chunks_per_sec": round(chunks_inserted / elapsed, 2) if elapsed > 0 else 0.0,
+        "embedding_cache_hits": cache_hits,
     }
 
 
@@ -174,5 +390,5 @@ if __name__ == "__main__":
         result = ingest_pdf(sys.argv[1], show_progress=True)
         print(f"PDF ingested: {result['title']}")
         print(f"Document ID: {result['document_id']}")
-        print(f"Chunks inserted: {result['chunks_inserted']}")
+        print(f"Chunks inserted: {result['chunks_inserted']} ({result.get('chunks_per_sec', 0)} chunks/s)")
         print(f"Database: {result['db_path']}")
@@ -1,9 +1,18 @@
 import os
 import sqlite3
+import threading
 
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(PROJECT_ROOT, "Storage", "rag.db")
+SQLITE_CACHE_KB = int(os.getenv("RAG_SQLITE_CACHE_KB", str(64 * 1024)))
+SQLITE_MMAP_BYTES = int(os.getenv("RAG_SQLITE_MMAP_BYTES", str(256 * 1024**2)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("RAG_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+_init_lock = threading.Lock()
+_initialized: set[str] = set()
+_fts_enabled: dict[str, bool] = {}
+_local = threading.local()
 
 
 def _column_exists(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
@@ -11,13 +20,59 @@ def _column_exists(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
     return any(row[1] == column for row in cursor.fetchall())
 
 
-def init_db() -> str:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    print("DB path:", DB_PATH)
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
+def open_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Opens a new connection with the pragmas every reader and writer shares."""
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    # WAL lets chat reads proceed while an ingest transaction is being committed.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """Returns this thread's pooled connection, running migrations first if needed.
+
+    Callers must not close it; it lives as long as the thread.
+    """
+    init_db(db_path)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = open_connection(db_path)
+    return conn
+
+
+def init_db(db_path: str = DB_PATH, force: bool = False) -> str:
+    """Creates and migrates the schema once per process (or again with force=True)."""
+    if db_path in _initialized and not force:
+        return db_path
+    with _init_lock:
+        if db_path in _initialized and not force:
+            return db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = open_connection(db_path)
+        try:
+            _migrate(conn.cursor())
+            _fts_enabled[db_path] = _migrate_fts(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        _initialized.add(db_path)
+    return db_path
+
+
+def fts_enabled(db_path: str = DB_PATH) -> bool:
+    """True when the chunks_fts full-text index exists (SQLite built with FTS5)."""
+    init_db(db_path)
+    return _fts_enabled.get(db_path, False)
+
+
+def _migrate(cursor: sqlite3.Cursor) -> None:
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS documents (
@@ -46,6 +101,10 @@ def init_db() -> str:
     if not _column_exists(cursor, "chunks", "page"):
         cursor.execute("ALTER TABLE chunks ADD COLUMN page INTEGER DEFAULT 0")
 
+    if not _column_exists(cursor, "chunks", "page_end"):
+        # Last page a chunk spans; NULL for chunks written before chunks could cross pages.
+        cursor.execute("ALTER TABLE chunks ADD COLUMN page_end INTEGER")
+
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS embeddings (
@@ -56,6 +115,21 @@ def init_db() -> str:
         """
     )
 
+    if not _column_exists(cursor, "embeddings", "format"):
+        # Existing rows were written as raw float32.
+        cursor.execute("ALTER TABLE embeddings ADD COLUMN format TEXT NOT NULL DEFAULT 'float32'")
+
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model_name TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model_name, text_hash)
+        )
+        """
+    )
+
     cursor.execute(
         """
         CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_file_hash
@@ -64,11 +138,56 @@ def init_db() -> str:
         """
     )
 
-    conn.commit()
-    conn.close()
-    print("DB initialized")
-    return DB_PATH
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id)")
+
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS finetune_jobs (
+            id TEXT PRIMARY KEY,
+            call_id TEXT,
+            dataset_name TEXT NOT NULL,
+            custom_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            artifact_sha256 TEXT,
+            artifact_size INTEGER,
+            download_job_id TEXT,
+            model_path TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+
+    if not _column_exists(cursor, "finetune_jobs", "preload_error"):
+        # A failed hot swap leaves the downloaded model usable, so it is not a job error.
+        cursor.execute("ALTER TABLE finetune_jobs ADD COLUMN preload_error TEXT")
+
+
+def _migrate_fts(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'")
+    if cursor.fetchone():
+        return True
+    try:
+        # External-content table: the text lives once, in chunks; ingest keeps the index in sync.
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE chunks_fts USING fts5(
+                content,
+                content='chunks',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: retrieval stays vector-only.
+        return False
+    cursor.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+    return True
 
 
 if __name__ == "__main__":
-    init_db()
+    print("DB path:", init_db(force=True))
+    print("DB initialized")
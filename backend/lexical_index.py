@@ -0,0 +1,154 @@
+import argparse
+import os
+import re
+
+import numpy as np
+
+import ann_index
+from db_writer import writer
+from init_db import DB_PATH, fts_enabled, get_connection
+from vector_index import vector_index
+from vector_shards import SHARDS_ENABLED
+
+
+HYBRID_MODE = os.getenv("RAG_HYBRID_MODE", "off").strip().lower()  # off | rrf
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "50"))
+# Above this many vectors, lexical hits become the candidate set scored by the vector index.
+LEXICAL_PREFILTER_MIN_VECTORS = int(os.getenv("RAG_LEXICAL_PREFILTER_MIN_VECTORS", "200000"))
+LEXICAL_PREFILTER_CANDIDATES = int(os.getenv("RAG_LEXICAL_PREFILTER_CANDIDATES", "1000"))
+MAX_QUERY_TERMS = 32
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text: str) -> str | None:
+    """Turns free text into a safe FTS5 MATCH expression (quoted terms joined with OR)."""
+    terms = list(dict.fromkeys(term.lower() for term in _TERM_RE.findall(text)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def lexical_search(
+    query_text: str,
+    document_ids: list[int] | None = None,
+    limit: int = HYBRID_CANDIDATES,
+    db_path: str = DB_PATH,
+) -> list[tuple[int, int, float]]:
+    """Returns (chunk_id, document_id, score) by BM25, best first; score is -bm25 so higher is better."""
+    match = fts_query(query_text)
+    if match is None or not fts_enabled(db_path):
+        return []
+    params: list = [match]
+    doc_filter = ""
+    if document_ids:
+        doc_filter = f"AND c.document_id IN ({','.join('?' for _ in document_ids)})"
+        params.extend(int(d) for d in document_ids)
+    params.append(max(1, int(limit)))
+    rows = get_connection(db_path).execute(
+        f"""
+        SELECT c.id, c.document_id, bm25(chunks_fts) AS rank
+        FROM chunks_fts
+        JOIN chunks c ON c.id = chunks_fts.rowid
+        WHERE chunks_fts MATCH ? {doc_filter}
+        ORDER BY rank
+        LIMIT ?
+        """,
+        params,
+    ).fetchall()
+    return [(int(cid), int(did), -float(rank)) for cid, did, rank in rows]
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[tuple[int, int, float]]],
+    top_k: int,
+    k: int = RRF_K,
+) -> list[tuple[int, int, float]]:
+    """Fuses ranked lists by sum of 1 / (k + rank); the returned score is the fused score."""
+    fused: dict[int, float] = {}
+    documents: dict[int, int] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, document_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            documents[chunk_id] = document_id
+    # Ties are broken by chunk id so the order is reproducible.
+    best = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[: max(1, int(top_k))]
+    return [(chunk_id, documents[chunk_id], score) for chunk_id, score in best]
+
+
+def hybrid_retrieve(
+    query_text: str,
+    query_vector: np.ndarray,
+    document_ids: list[int] | None = None,
+    top_k: int = 5,
+) -> list[tuple[int, int, float]]:
+    """BM25 + vector retrieval fused with RRF; falls back to vectors only without FTS5."""
+    if not fts_enabled():
+        return ann_index.retrieve(query_vector, document_ids, top_k)
+
+    candidates = max(int(top_k), HYBRID_CANDIDATES)
+    # Document-filtered searches are already cheap over the per-document shards.
+    use_index = not (document_ids and SHARDS_ENABLED)
+    if use_index:
+        # len() is 0 until the index is loaded, which would skip the prefilter on a large corpus.
+        vector_index.ensure_loaded()
+    if use_index and len(vector_index) >= LEXICAL_PREFILTER_MIN_VECTORS:
+        prefilter = lexical_search(query_text, document_ids, LEXICAL_PREFILTER_CANDIDATES)
+        if len(prefilter) >= top_k:
+            # Only the lexical candidates are scored, instead of the whole corpus.
+            semantic = vector_index.search(
+                query_vector, document_ids, candidates, candidate_ids=[cid for cid, _, _ in prefilter]
+            )
+            return reciprocal_rank_fusion([semantic, prefilter[:candidates]], top_k)
+
+    lexical = lexical_search(query_text, document_ids, candidates)
+    semantic = ann_index.retrieve(query_vector, document_ids, candidates)
+    return reciprocal_rank_fusion([semantic, lexical], top_k)
+
+
+def retrieve(
+    query_text: str,
+    query_vector: np.ndarray,
+    document_ids: list[int] | None = None,
+    top_k: int = 5,
+) -> list[tuple[int, int, float]]:
+    """Routes a query to hybrid or vector-only retrieval depending on RAG_HYBRID_MODE."""
+    if HYBRID_MODE == "rrf":
+        return hybrid_retrieve(query_text, query_vector, document_ids, top_k)
+    return ann_index.retrieve(query_vector, document_ids, top_k)
+
+
+def rebuild() -> None:
+    """Re-indexes chunks_fts from chunks, e.g. after rows were changed outside ingest_pdf."""
+    if fts_enabled():
+        writer.run(lambda conn: conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the FTS5 index or compare lexical, vector and hybrid results.")
+    parser.add_argument("command", choices=["rebuild", "search"])
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument("--document-ids", default="", help="Comma-separated document ids.")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if not fts_enabled():
+        raise SystemExit("This SQLite build has no FTS5 support.")
+    if args.command == "rebuild":
+        rebuild()
+        print("chunks_fts rebuilt")
+    else:
+        from ingest_pdf import embed_query
+
+        doc_ids = [int(d) for d in args.document_ids.split(",") if d]
+        ann_index.startup()
+        vector = embed_query(args.query)
+        for label, hits in (
+            ("bm25", lexical_search(args.query, doc_ids, args.top_k)),
+            ("vector", ann_index.retrieve(vector, doc_ids, args.top_k)),
+            ("hybrid", hybrid_retrieve(args.query, vector, doc_ids, args.top_k)),
+        ):
+            print(label)
+            for chunk_id, document_id, score in hits:
+                print(f"  chunk={chunk_id:<8} doc={document_id:<6} score={score:.4f}")
@@ -0,0 +1,126 @@
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+
+from db_writer import SQLiteWriter, writer
+from init_db import DB_PATH, get_connection, init_db, open_connection
+from vector_codec import INDEX_FORMATS, STORAGE_FORMATS, decode_vector, encode_vector
+from vector_index import VectorIndex
+
+
+MIGRATE_BATCH_ROWS = 1000
+
+
+def migrate(target: str, db_path: str = DB_PATH, vacuum: bool = False) -> int:
+    """Re-encodes every stored embedding into the target storage format. Returns rows converted.
+
+    Converting to float16 or int8 is lossy: compact-index re-scoring then runs on the
+    decoded vectors, and converting back to float32 does not restore them.
+    """
+    if target not in STORAGE_FORMATS:
+        raise ValueError(f"Unsupported embedding storage format '{target}'. Use one of {STORAGE_FORMATS}.")
+    # The shared writer is bound to the default database; another one gets its own.
+    db_writer = writer if db_path == writer.db_path else SQLiteWriter(db_path)
+
+    def convert_batch(conn: sqlite3.Connection) -> int:
+        rows = conn.execute(
+            "SELECT chunk_id, vector, format FROM embeddings WHERE format != ? LIMIT ?",
+            (target, MIGRATE_BATCH_ROWS),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE embeddings SET vector = ?, format = ? WHERE chunk_id = ?",
+            [(encode_vector(decode_vector(blob, fmt), target), target, chunk_id) for chunk_id, blob, fmt in rows],
+        )
+        return len(rows)
+
+    converted = 0
+    while True:
+        count = db_writer.run(convert_batch)
+        converted += count
+        if count < MIGRATE_BATCH_ROWS:
+            break
+
+    if vacuum:
+        # Shrinking blobs only frees pages inside the file until it is vacuumed.
+        conn = open_connection(db_path)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    return converted
+
+
+def storage_report(db_path: str = DB_PATH) -> dict:
+    conn = get_connection(db_path)
+    counts = dict(conn.execute("SELECT format, COUNT(*) FROM embeddings GROUP BY format").fetchall())
+    sample = conn.execute("SELECT vector, format FROM embeddings LIMIT 1").fetchone()
+    total = sum(counts.values())
+    per_vector = {}
+    if sample is not None:
+        vector = decode_vector(sample[0], sample[1])
+        per_vector = {fmt: len(encode_vector(vector, fmt)) for fmt in STORAGE_FORMATS}
+    return {"rows": total, "formats": counts, "bytesPerVector": per_vector}
+
+
+def index_report(queries: int = 200, top_k: int = 5, rescore_factor: int = 4, seed: int = 7) -> list[dict]:
+    """Compares memory and recall@k of every index format against exact float32 search."""
+    exact = VectorIndex("float32")
+    exact.load()
+    codes, _, _ = exact.snapshot()
+    if len(codes) == 0:
+        return []
+
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(len(codes), min(queries, len(codes)), replace=False))
+    sample = codes.decode(picks) + rng.normal(scale=0.05, size=(picks.size, codes.dim)).astype(np.float32)
+    truth = [{cid for cid, _, _ in exact.search(q, None, top_k)} for q in sample]
+    expected = max(1, sum(len(t) for t in truth))
+
+    report = []
+    for fmt in INDEX_FORMATS:
+        index = exact if fmt == "float32" else VectorIndex(fmt, rescore_factor)
+        index.load()
+        for rescore in ([False] if fmt == "float32" else [False, True]):
+            started = time.perf_counter()
+            results = [index.search(q, None, top_k, rescore=rescore) for q in sample]
+            elapsed_ms = (time.perf_counter() - started) * 1000 / picks.size
+            hits = sum(len(t & {cid for cid, _, _ in found}) for t, found in zip(truth, results))
+            report.append({
+                "format": fmt,
+                "rescore": rescore,
+                "index_bytes": index.nbytes,
+                "memory_saved": round(1 - index.nbytes / exact.nbytes, 4),
+                "recall": round(hits / expected, 4),
+                "avg_ms": round(elapsed_ms, 3),
+            })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored embeddings or compare compact index formats.")
+    parser.add_argument("command", choices=["migrate", "report"])
+    parser.add_argument("--to", choices=STORAGE_FORMATS, default="float16", help="Target storage format for migrate.")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database after migrating.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "migrate":
+        converted = migrate(args.to, vacuum=args.vacuum)
+        print(f"Converted {converted} embeddings to {args.to}")
+    else:
+        storage = storage_report()
+        print(f"{storage['rows']} stored embeddings {storage['formats']}")
+        for fmt, size in storage["bytesPerVector"].items():
+            print(f"  storage {fmt:<8} {size} bytes/vector")
+        print(f"Index formats, recall@{args.top_k} vs exact float32 (rescore factor {args.rescore_factor})")
+        for row in index_report(args.queries, args.top_k, args.rescore_factor):
+            label = f"{row['format']}{' + rescore' if row['rescore'] else ''}"
+            print(
+                f"  {label:<18} {row['index_bytes'] / 1024:10.1f} KiB  saved={row['memory_saved']:.1%}  "
+                f"recall={row['recall']:.4f}  avg={row['avg_ms']:.3f} ms/query"
+            )
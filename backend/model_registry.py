@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import re
+import struct
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from threading import Lock
+
+
+MODEL_ROOT = Path(
+    os.getenv("GGUF_MODEL_DIR", str(Path(__file__).resolve().parent / "Model"))
+).resolve()
+
+MODEL_SELECTION_ALIASES: dict[str, list[str]] = {
+    "llama-3-2-3b": ["tinyllama", "llama"],
+    "phi-3-5-mini": ["phi-2", "phi2", "phi"],
+    "qwen-2-5-3b": ["qwen2", "qwen"],
+    "mistral-7b-instruct": ["mistral"],
+    "gemma-2-2b": ["gemma"],
+}
+
+GGUF_MAGIC = b"GGUF"
+
+# llama_ftype values stored in general.file_type.
+GGUF_FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16",
+}
+
+# GGUF value types: struct format for scalars, None for string (8) and array (9).
+_SCALAR_FORMATS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d"}
+_STRING, _ARRAY = 8, 9
+
+
+@dataclass(frozen=True)
+class GgufMetadata:
+    architecture: str = ""
+    name: str = ""
+    quantization: str = ""
+    context_length: int = 0
+    parameter_count: int = 0
+    chat_template: str | None = None
+    # Scalar and string header fields (arrays such as the vocabulary are skipped).
+    fields: dict = field(default_factory=dict, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class LocalGgufModel:
+    key: str
+    path: Path
+    size_bytes: int
+    metadata: GgufMetadata | None = None
+
+
+class _HeaderReader:
+    def __init__(self, handle) -> None:
+        self.handle = handle
+
+    def read(self, fmt: str):
+        size = struct.calcsize(fmt)
+        data = self.handle.read(size)
+        if len(data) != size:
+            raise ValueError("truncated GGUF header")
+        return struct.unpack(fmt, data)[0]
+
+    def string(self) -> str:
+        length = self.read("<Q")
+        return self.handle.read(length).decode("utf-8", errors="replace")
+
+    def skip_string(self) -> None:
+        self.handle.seek(self.read("<Q"), os.SEEK_CUR)
+
+    def value(self, value_type: int):
+        if value_type == _STRING:
+            return self.string()
+        if value_type == _ARRAY:
+            item_type, count = self.read("<I"), self.read("<Q")
+            # Arrays are tokenizer tables; skip them without decoding.
+            if item_type == _STRING:
+                for _ in range(count):
+                    self.skip_string()
+            elif item_type in _SCALAR_FORMATS:
+                self.handle.seek(struct.calcsize(_SCALAR_FORMATS[item_type]) * count, os.SEEK_CUR)
+            else:
+                for _ in range(count):
+                    self.value(item_type)
+            return None
+        if value_type not in _SCALAR_FORMATS:
+            raise ValueError(f"unknown GGUF value type {value_type}")
+        return self.read(_SCALAR_FORMATS[value_type])
+
+
+def read_gguf_metadata(path: Path) -> GgufMetadata:
+    """Parses the key/value header and tensor infos of a GGUF file; tensor data is never read."""
+    with path.open("rb") as handle:
+        reader = _HeaderReader(handle)
+        if handle.read(4) != GGUF_MAGIC:
+            raise ValueError(f"'{path.name}' is not a GGUF file")
+        version = reader.read("<I")
+        if version < 2:
+            raise ValueError(f"'{path.name}' uses GGUF v{version}, which is not supported")
+        tensor_count, kv_count = reader.read("<Q"), reader.read("<Q")
+
+        fields: dict = {}
+        for _ in range(kv_count):
+            key = reader.string()
+            value = reader.value(reader.read("<I"))
+            if value is not None:
+                fields[key] = value
+
+        parameter_count = 0
+        for _ in range(tensor_count):
+            reader.skip_string()
+            elements = 1
+            for _ in range(reader.read("<I")):
+                elements *= reader.read("<Q")
+            reader.read("<I")  # tensor type
+            reader.read("<Q")  # data offset
+            parameter_count += elements
+
+    arch = str(fields.get("general.architecture", ""))
+    file_type = fields.get("general.file_type")
+    return GgufMetadata(
+        architecture=arch,
+        name=str(fields.get("general.name", "")),
+        quantization=GGUF_FILE_TYPES.get(file_type, str(file_type)) if file_type is not None else "",
+        context_length=int(fields.get(f"{arch}.context_length", 0) or 0),
+        parameter_count=parameter_count,
+        chat_template=fields.get("tokenizer.chat_template"),
+        fields=fields,
+    )
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.strip().lower()).strip("-")
+
+
+class ModelRegistry:
+    """Caches the .gguf files under MODEL_ROOT with their parsed headers.
+
+    The recursive scan only runs again when the mtime of a scanned directory changes
+    (a file was added, removed or renamed); headers are re-parsed only for files whose
+    size or mtime changed. Resolution uses exact lookups on file name, key, model name
+    and architecture instead of substring matching.
+    """
+
+    def __init__(self, root: Path = MODEL_ROOT) -> None:
+        self.root = root
+        self._lock = Lock()
+        self._dir_mtimes: dict[Path, int] | None = None
+        self._models: list[LocalGgufModel] = []
+        self._headers: dict[Path, tuple[int, int, GgufMetadata | None]] = {}
+        self._index: dict[str, dict[str, list[LocalGgufModel]]] = {}
+        self.scans = 0
+
+    def models(self) -> list[LocalGgufModel]:
+        with self._lock:
+            if self._stale():
+                self._scan()
+            return list(self._models)
+
+    def invalidate(self) -> None:
+        """Forces a rescan on the next lookup, e.g. after a download wrote into MODEL_ROOT."""
+        with self._lock:
+            self._dir_mtimes = None
+
+    def resolve(self, selected_model_id: str, selected_model_name: str) -> LocalGgufModel:
+        models = self.models()
+        if not models:
+            raise RuntimeError(
+                f"No GGUF model found in '{self.root}'. Add at least one .gguf file."
+            )
+
+        normalized_id = _normalize(selected_model_id)
+        normalized_name = _normalize(selected_model_name)
+        if not normalized_id and not normalized_name:
+            return models[0]
+
+        with self._lock:
+            index = self._index
+        # Exact identity first (file name or key), then the header's model name, then a
+        # catalogue id that prefixes a key ("llama-3-2-3b" -> "llama-3-2-3b-instruct-q4-k-m"),
+        # then catalogue aliases matched against whole key segments, and last an architecture
+        # shared by exactly one file ("llama" is also Mistral's and many others' architecture).
+        for selected in (selected_model_id, selected_model_name):
+            for table, value in (("file", selected.strip().lower()), ("key", _normalize(selected)), ("name", _normalize(selected))):
+                if value and value in index[table]:
+                    return self._checked(index[table][value][0])
+        for value in (normalized_id, normalized_name):
+            for model in models:
+                if value and model.key.startswith(f"{value}-"):
+                    return self._checked(model)
+        name_parts = [part for part in normalized_name.split("-") if part and not part.isdigit()]
+        tokens = [*MODEL_SELECTION_ALIASES.get(normalized_id, []), *name_parts]
+        for token in tokens:
+            if token in index["segment"]:
+                return self._checked(index["segment"][token][0])
+        ambiguous: list[LocalGgufModel] = []
+        for token in tokens:
+            candidates = index["arch"].get(token, [])
+            if len(candidates) == 1:
+                return self._checked(candidates[0])
+            ambiguous.extend(m for m in candidates if m not in ambiguous)
+
+        available = ", ".join(model.path.name for model in models)
+        if ambiguous:
+            raise RuntimeError(
+                "Ambiguous model selection "
+                f"selectedModelId='{selected_model_id}' / selectedModel='{selected_model_name}': "
+                f"several GGUF files share its architecture ({', '.join(m.path.name for m in ambiguous)}). "
+                "Select one by file name."
+            )
+        raise RuntimeError(
+            "No compatible GGUF model found for "
+            f"selectedModelId='{selected_model_id}' / selectedModel='{selected_model_name}'. "
+            f"Available GGUF files in '{self.root}': {available}"
+        )
+
+    def _checked(self, model: LocalGgufModel) -> LocalGgufModel:
+        # A file rewritten in place keeps its directory mtime, so the chosen one is re-checked.
+        try:
+            stat = model.path.stat()
+        except OSError:
+            self.invalidate()
+            return self.resolve(model.key, "")
+        cached = self._headers.get(model.path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return model
+        self.invalidate()
+        return next((m for m in self.models() if m.path == model.path), model)
+
+    def _stale(self) -> bool:
+        if self._dir_mtimes is None:
+            return True
+        for directory, mtime_ns in self._dir_mtimes.items():
+            try:
+                if directory.stat().st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _scan(self) -> None:
+        self.scans += 1
+        dir_mtimes: dict[Path, int] = {}
+        models: list[LocalGgufModel] = []
+        headers: dict[Path, tuple[int, int, GgufMetadata | None]] = {}
+        if self.root.exists():
+            for directory, subdirs, files in os.walk(self.root):
+                # Skips hidden folders such as the download manager's .downloads.
+                subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+                directory_path = Path(directory)
+                dir_mtimes[directory_path] = directory_path.stat().st_mtime_ns
+                for file_name in files:
+                    if file_name.endswith(".gguf"):
+                        path = (directory_path / file_name).resolve()
+                        model, headers[path] = self._describe(path)
+                        models.append(model)
+        else:
+            # Watch the nearest existing parent so creating MODEL_ROOT triggers a scan.
+            parent = self.root.parent
+            while not parent.exists() and parent != parent.parent:
+                parent = parent.parent
+            dir_mtimes[parent] = parent.stat().st_mtime_ns if parent.exists() else 0
+
+        models.sort(key=lambda model: model.path)
+        index: dict[str, dict[str, list[LocalGgufModel]]] = {t: {} for t in ("file", "key", "name", "arch", "segment")}
+        for model in models:
+            index["file"].setdefault(model.path.name.lower(), []).append(model)
+            index["file"].setdefault(model.path.stem.lower(), []).append(model)
+            index["key"].setdefault(model.key, []).append(model)
+            for segment in model.key.split("-"):
+                index["segment"].setdefault(segment, []).append(model)
+            if model.metadata is not None:
+                if model.metadata.name:
+                    index["name"].setdefault(_normalize(model.metadata.name), []).append(model)
+                if model.metadata.architecture:
+                    index["arch"].setdefault(model.metadata.architecture.lower(), []).append(model)
+
+        self._dir_mtimes, self._models, self._headers, self._index = dir_mtimes, models, headers, index
+
+    def _describe(self, path: Path) -> tuple[LocalGgufModel, tuple[int, int, GgufMetadata | None]]:
+        try:
+            stat = path.stat()
+            mtime_ns, size_bytes = stat.st_mtime_ns, int(stat.st_size)
+        except OSError:
+            mtime_ns, size_bytes = -1, 0
+        cached = self._headers.get(path)
+        if cached is not None and cached[:2] == (mtime_ns, size_bytes):
+            metadata = cached[2]
+        else:
+            try:
+                metadata = read_gguf_metadata(path)
+            except (OSError, ValueError, struct.error):
+                # Partial downloads and foreign files are still listed, without metadata.
+                metadata = None
+        model = LocalGgufModel(key=_normalize(path.stem), path=path, size_bytes=size_bytes, metadata=metadata)
+        return model, (mtime_ns, size_bytes, metadata)
+
+
+model_registry = ModelRegistry()
+
+
+def discover_local_gguf_models() -> list[LocalGgufModel]:
+    return model_registry.models()
+
+
+def resolve_local_gguf_model(
+    selected_model_id: str,
+    selected_model_name: str,
+) -> LocalGgufModel:
+    return model_registry.resolve(selected_model_id, selected_model_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the GGUF models under GGUF_MODEL_DIR with their header metadata.")
+    parser.add_argument("paths", nargs="*", help="Read these GGUF files instead of scanning the model directory.")
+    args = parser.parse_args()
+
+    for path in [Path(p) for p in args.paths] or [m.path for m in model_registry.models()]:
+        try:
+            metadata = read_gguf_metadata(path)
+        except (OSError, ValueError, struct.error) as exc:
+            print(f"{path.name}: {exc}")
+            continue
+        summary = asdict(metadata)
+        summary.pop("fields")
+        summary["chat_template"] = bool(summary["chat_template"])
+        print(f"{path.name}: {json.dumps(summary)}")
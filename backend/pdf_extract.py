@@ -0,0 +1,66 @@
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor
+
+from pypdf import PdfReader # type: ignore
+
+
+# Kept free of model/DB imports so process-pool workers start quickly.
+
+def count_pdf_pages(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> list[tuple[int, str]]:
+    """Extracts non-empty text for pages start..end-1 (0-based), numbered from 1."""
+    reader = PdfReader(pdf_path)
+    pages: list[tuple[int, str]] = []
+    for index in range(start, min(end, len(reader.pages))):
+        page_text = reader.pages[index].extract_text()
+        clean_text = (page_text or "").strip()
+        if clean_text:
+            pages.append((index + 1, clean_text))
+    return pages
+
+
+def iter_pdf_pages(
+    pdf_path: str,
+    executor: Executor | None = None,
+    pages_per_task: int = 16,
+    max_in_flight: int = 4,
+    on_pages_parsed: Callable[[int], None] | None = None,
+) -> Iterator[tuple[int, str]]:
+    """Yields (page_number, text) in page order.
+
+    With an executor, page ranges are extracted in parallel, but never more than
+    max_in_flight ranges ahead of the consumer, so memory stays bounded.
+    """
+    total = count_pdf_pages(pdf_path)
+    starts = iter(range(0, total, max(1, pages_per_task)))
+
+    if executor is None:
+        for start in starts:
+            end = min(total, start + pages_per_task)
+            yield from extract_page_range(pdf_path, start, end)
+            if on_pages_parsed:
+                on_pages_parsed(end - start)
+        return
+
+    in_flight: deque = deque()
+    for start in starts:
+        in_flight.append((start, executor.submit(extract_page_range, pdf_path, start, start + pages_per_task)))
+        if len(in_flight) >= max(1, max_in_flight):
+            break
+    while in_flight:
+        start, future = in_flight.popleft()
+        pages = future.result()
+        next_start = next(starts, None)
+        if next_start is not None:
+            in_flight.append((next_start, executor.submit(extract_page_range, pdf_path, next_start, next_start + pages_per_task)))
+        if on_pages_parsed:
+            on_pages_parsed(min(total, start + pages_per_task) - start)
+        yield from pages
+
+
+def extract_pages_from_pdf(pdf_path: str) -> list[tuple[int, str]]:
+    return list(iter_pdf_pages(pdf_path))
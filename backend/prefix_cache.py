@@ -0,0 +1,158 @@
+import os
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+from threading import Lock
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PREFIX_CACHE_MODE = os.getenv("GGUF_PREFIX_CACHE", "ram").strip().lower()  # off | ram | disk
+PREFIX_CACHE_RAM_BYTES = int(os.getenv("GGUF_PREFIX_CACHE_RAM_BYTES", str(1 * 1024**3)))
+PREFIX_CACHE_DISK_BYTES = int(os.getenv("GGUF_PREFIX_CACHE_DISK_BYTES", str(8 * 1024**3)))
+# A shared BOS or system-prompt opening is not worth a state restore: shorter matches
+# count as misses (unless they cover the whole prompt).
+PREFIX_CACHE_MIN_TOKENS = int(os.getenv("GGUF_PREFIX_CACHE_MIN_TOKENS", "32"))
+PREFIX_CACHE_DIR = Path(os.getenv("GGUF_PREFIX_CACHE_DIR", str(PROJECT_ROOT / "Storage" / "kv_cache")))
+
+
+def _common_prefix(a: Sequence[int], b: Sequence[int]) -> int:
+    length = 0
+    for left, right in zip(a, b):
+        if left != right:
+            break
+        length += 1
+    return length
+
+
+class PrefixStateCache:
+    """Two-tier prompt-prefix state cache plugged into Llama.set_cache().
+
+    llama.cpp looks up the saved state whose token key shares the longest prefix with the
+    new prompt and only re-evaluates the remaining tokens. States live in an LRU RAM tier
+    and, optionally, in a size-bounded on-disk tier that survives restarts.
+    """
+
+    def __init__(
+        self,
+        ram_bytes: int = PREFIX_CACHE_RAM_BYTES,
+        disk_dir: Path | None = None,
+        disk_bytes: int = PREFIX_CACHE_DISK_BYTES,
+        min_tokens: int = PREFIX_CACHE_MIN_TOKENS,
+    ) -> None:
+        self.capacity_bytes = ram_bytes
+        self.min_tokens = max(1, min_tokens)
+        self._lock = Lock()
+        self._ram: OrderedDict[tuple[int, ...], object] = OrderedDict()
+        self._ram_bytes = 0
+        self._disk = None
+        # Keys of the disk tier, so lookups do not walk the cache directory's index.
+        self._disk_keys: set[tuple[int, ...]] = set()
+        if disk_dir is not None:
+            import diskcache  # type: ignore
+
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk = diskcache.Cache(
+                str(disk_dir),
+                size_limit=disk_bytes,
+                eviction_policy="least-recently-used",
+            )
+            self._disk_keys = set(self._disk.iterkeys())
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self.lookup_tokens = 0
+
+    @property
+    def cache_size(self) -> int:
+        return self._ram_bytes
+
+    def _longest(self, keys, key: tuple[int, ...]) -> tuple[tuple[int, ...] | None, int]:
+        """Longest stored prefix of key, or (None, 0) when it is too short to be useful."""
+        best_key, best_len = None, 0
+        for candidate in keys:
+            length = _common_prefix(candidate, key)
+            if length > best_len:
+                best_key, best_len = candidate, length
+        if best_len < min(self.min_tokens, len(key)):
+            return None, 0
+        return best_key, best_len
+
+    def __getitem__(self, key: Sequence[int]):
+        key = tuple(key)
+        with self._lock:
+            self.lookup_tokens += len(key)
+            ram_key, ram_len = self._longest(self._ram.keys(), key)
+            disk_key, disk_len = (None, 0)
+            if self._disk is not None:
+                disk_key, disk_len = self._longest(self._disk_keys, key)
+
+            if disk_key is not None and disk_len > ram_len:
+                state = self._disk.get(disk_key)
+                if state is None:
+                    # diskcache evicted it on its own to stay under its size limit.
+                    self._disk_keys.discard(disk_key)
+                else:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self.reused_tokens += disk_len
+                    self._put_ram(disk_key, state)
+                    return state
+            if ram_key is None:
+                self.misses += 1
+                raise KeyError("No cached prefix")
+            self._ram.move_to_end(ram_key)
+            self.hits += 1
+            self.reused_tokens += ram_len
+            return self._ram[ram_key]
+
+    def __contains__(self, key: Sequence[int]) -> bool:
+        key = tuple(key)
+        with self._lock:
+            if self._longest(self._ram.keys(), key)[0] is not None:
+                return True
+            return self._longest(self._disk_keys, key)[0] is not None
+
+    def __setitem__(self, key: Sequence[int], value) -> None:
+        key = tuple(key)
+        with self._lock:
+            self._put_ram(key, value)
+            if self._disk is not None:
+                self._disk.set(key, value)
+                self._disk_keys.add(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "mode": "disk" if self._disk is not None else "ram",
+                "entries": len(self._ram),
+                "ramBytes": self._ram_bytes,
+                "ramCapacityBytes": self.capacity_bytes,
+                "diskBytes": int(self._disk.volume()) if self._disk is not None else 0,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "reusedTokenRate": round(self.reused_tokens / self.lookup_tokens, 4) if self.lookup_tokens else 0.0,
+            }
+
+    def _put_ram(self, key: tuple[int, ...], value) -> None:
+        previous = self._ram.pop(key, None)
+        if previous is not None:
+            self._ram_bytes -= int(getattr(previous, "llama_state_size", 0))
+        self._ram[key] = value
+        self._ram_bytes += int(getattr(value, "llama_state_size", 0))
+        while self._ram_bytes > self.capacity_bytes and len(self._ram) > 1:
+            _, evicted = self._ram.popitem(last=False)
+            self._ram_bytes -= int(getattr(evicted, "llama_state_size", 0))
+
+
+def build_prefix_cache(model_path: Path, mtime_ns: int) -> PrefixStateCache | None:
+    if PREFIX_CACHE_MODE in ("", "off", "0", "false"):
+        return None
+    disk_dir = None
+    if PREFIX_CACHE_MODE == "disk":
+        # States are only valid for the exact model file, so the directory is keyed by mtime too.
+        disk_dir = PREFIX_CACHE_DIR / f"{model_path.stem}-{mtime_ns}"
+    return PrefixStateCache(disk_dir=disk_dir)
@@ -0,0 +1,81 @@
+import os
+import time
+from threading import Lock, Thread
+
+from gguf_runtime import preload_gguf_model
+from ingest_pdf import embed_text, get_model_name
+
+
+# Comma-separated model ids or file names to load at startup; "default" is the model
+# chosen when a request selects none. Empty disables GGUF preloading.
+PRELOAD_GGUF_MODELS = [m.strip() for m in os.getenv("GGUF_PRELOAD_MODELS", "").split(",") if m.strip()]
+PRELOAD_EMBEDDINGS = os.getenv("RAG_PRELOAD_EMBEDDINGS", "1").strip().lower() in ("1", "on", "true")
+WARMUP_GENERATION = os.getenv("GGUF_WARMUP", "0").strip().lower() in ("1", "on", "true")
+
+
+class Readiness:
+    """Tracks startup preloading; the instance is ready once every component has loaded.
+
+    /api/health only says the process is up, /api/ready says requests will not pay for a
+    cold model load.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._components: dict[str, dict] = {}
+        self._finished = False
+        self._thread: Thread | None = None
+
+    def start(self) -> None:
+        """Preloads in the background so the server answers health checks right away."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            if PRELOAD_EMBEDDINGS:
+                self._components["embeddings"] = {"status": "pending"}
+            for selected in PRELOAD_GGUF_MODELS:
+                self._components[f"gguf:{selected}"] = {"status": "pending"}
+            self._thread = Thread(target=self._preload, name="startup-preload", daemon=True)
+        self._thread.start()
+
+    def status(self) -> dict:
+        with self._lock:
+            components = {name: dict(state) for name, state in self._components.items()}
+            finished = self._finished
+        ready = finished and all(state["status"] == "ready" for state in components.values())
+        return {"ready": ready, "finished": finished, "components": components}
+
+    def _preload(self) -> None:
+        steps = []
+        if PRELOAD_EMBEDDINGS:
+            steps.append(("embeddings", self._load_embeddings))
+        for selected in PRELOAD_GGUF_MODELS:
+            steps.append((f"gguf:{selected}", lambda s=selected: self._load_gguf(s)))
+        for name, step in steps:
+            self._update(name, status="loading")
+            started = time.perf_counter()
+            try:
+                details = step()
+            except Exception as exc:
+                self._update(name, status="failed", error=str(exc))
+                continue
+            self._update(name, status="ready", totalMs=round((time.perf_counter() - started) * 1000, 1), **details)
+        with self._lock:
+            self._finished = True
+
+    @staticmethod
+    def _load_embeddings() -> dict:
+        # One encode also initialises the tokenizer and the first forward pass.
+        embed_text("warm-up")
+        return {"model": get_model_name()}
+
+    @staticmethod
+    def _load_gguf(selected: str) -> dict:
+        return preload_gguf_model("" if selected == "default" else selected, warm_up=WARMUP_GENERATION)
+
+    def _update(self, name: str, **state) -> None:
+        with self._lock:
+            self._components[name] = state
+
+
+readiness = Readiness()
@@ -0,0 +1,144 @@
+import numpy as np
+
+
+# Storage formats for embeddings.vector BLOBs. "binary" is index-only: one sign bit per
+# dimension cannot be decoded back, so it could not serve the re-score at all.
+STORAGE_FORMATS = ("float32", "float16", "int8")
+INDEX_FORMATS = ("float32", "float16", "int8", "binary")
+SCORE_BLOCK_ROWS = 65536
+
+
+def encode_vector(vector: np.ndarray, fmt: str) -> bytes:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if fmt == "float32":
+        return vector.tobytes()
+    if fmt == "float16":
+        return vector.astype(np.float16).tobytes()
+    if fmt == "int8":
+        # Symmetric scalar quantization with a per-vector scale stored in front.
+        scale = float(np.abs(vector).max()) / 127.0 or 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).tobytes() + codes.tobytes()
+    raise ValueError(f"Unsupported embedding storage format '{fmt}'. Use one of {STORAGE_FORMATS}.")
+
+
+def decode_vector(blob: bytes, fmt: str | None) -> np.ndarray:
+    if fmt in (None, "", "float32"):
+        return np.frombuffer(blob, dtype=np.float32)
+    if fmt == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if fmt == "int8":
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"Unsupported embedding storage format '{fmt}'.")
+
+
+class CodeView:
+    """Read-only view over compact codes of L2-normalized vectors."""
+
+    def __init__(self, fmt: str, dim: int, data: np.ndarray, scales: np.ndarray | None = None) -> None:
+        self.fmt = fmt
+        self.dim = dim
+        self.data = data
+        self.scales = scales
+
+    def __len__(self) -> int:
+        return int(self.data.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    @property
+    def exact(self) -> bool:
+        return self.fmt == "float32"
+
+    def decode(self, rows: np.ndarray | slice | None = None) -> np.ndarray:
+        data = self.data if rows is None else self.data[rows]
+        if self.fmt == "float32":
+            return data
+        if self.fmt == "float16":
+            return data.astype(np.float32)
+        if self.fmt == "int8":
+            scales = self.scales if rows is None else self.scales[rows]
+            return data.astype(np.float32) * scales[:, None]
+        signs = np.unpackbits(data, axis=1, count=self.dim).astype(np.float32)
+        return (signs * 2.0 - 1.0) / np.sqrt(self.dim)
+
+    def score(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Dot products of the (normalized) query against the selected rows."""
+        if self.fmt == "float32":
+            data = self.data if rows is None else self.data[rows]
+            return data @ query
+        # Compact codes are widened block by block so the float32 copy stays bounded.
+        count = len(self) if rows is None else int(rows.shape[0])
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = start + SCORE_BLOCK_ROWS
+            block = self.decode(slice(start, end) if rows is None else rows[start:end])
+            scores[start:start + block.shape[0]] = block @ query
+        return scores
+
+
+class CodeMatrix:
+    """Growable code storage; appends amortize reallocation, readers use view()."""
+
+    def __init__(self, fmt: str = "float32") -> None:
+        if fmt not in INDEX_FORMATS:
+            raise ValueError(f"Unsupported index format '{fmt}'. Use one of {INDEX_FORMATS}.")
+        self.fmt = fmt
+        self.dim = 0
+        self.size = 0
+        self._data: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+        if self.fmt == "float32":
+            return vectors.astype(np.float32, copy=False), None
+        if self.fmt == "float16":
+            return vectors.astype(np.float16), None
+        if self.fmt == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return np.packbits(vectors > 0, axis=1), None
+
+    def append(self, vectors: np.ndarray) -> None:
+        count, dim = vectors.shape
+        if self.dim and dim != self.dim:
+            raise ValueError(f"Embedding dimension mismatch: index has {self.dim}, got {dim}.")
+        codes, scales = self._encode(vectors)
+        needed = self.size + count
+        if self._data is None or needed > self._data.shape[0]:
+            capacity = max(needed, int((0 if self._data is None else self._data.shape[0]) * 1.5), 1024)
+            data = np.empty((capacity,) + codes.shape[1:], dtype=codes.dtype)
+            if self.size:
+                data[: self.size] = self._data[: self.size]
+            self._data = data
+            if scales is not None:
+                scale_buf = np.empty(capacity, dtype=np.float32)
+                if self.size:
+                    scale_buf[: self.size] = self._scales[: self.size]
+                self._scales = scale_buf
+            self.dim = dim
+        self._data[self.size:needed] = codes
+        if scales is not None:
+            self._scales[self.size:needed] = scales
+        self.size = needed
+
+    def keep(self, rows: np.ndarray) -> None:
+        """Compacts storage in place down to the given row positions (ascending)."""
+        if self._data is None:
+            return
+        count = int(rows.size)
+        self._data[:count] = self._data[rows]
+        if self._scales is not None:
+            self._scales[:count] = self._scales[rows]
+        self.size = count
+
+    def view(self) -> CodeView:
+        if self._data is None:
+            return CodeView(self.fmt, self.dim, np.empty((0, 0), dtype=np.float32))
+        scales = self._scales[: self.size] if self._scales is not None else None
+        return CodeView(self.fmt, self.dim, self._data[: self.size], scales)
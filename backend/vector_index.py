@@ -0,0 +1,254 @@
+import os
+from collections.abc import Callable
+from threading import Lock
+
+import numpy as np
+
+from init_db import DB_PATH, get_connection
+from vector_codec import CodeMatrix, CodeView, decode_vector
+
+
+INDEX_FORMAT = os.getenv("RAG_INDEX_FORMAT", "float32").strip().lower()  # float32 | float16 | int8 | binary
+RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+RESCORE_BATCH = 500  # stays under SQLite's default host-parameter limit
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def normalize_query(query_vector: np.ndarray) -> np.ndarray:
+    query = np.asarray(query_vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(query))
+    return query / norm if norm > 0 else query
+
+
+def top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first (ties keep row order)."""
+    k = max(1, min(int(k), scores.shape[0]))
+    candidates = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def load_full_vectors(chunk_ids: list[int], db_path: str = DB_PATH) -> dict[int, np.ndarray]:
+    """Reads stored embeddings by primary key and decodes them to float32."""
+    found: dict[int, np.ndarray] = {}
+    conn = get_connection(db_path)
+    for start in range(0, len(chunk_ids), RESCORE_BATCH):
+        batch = chunk_ids[start:start + RESCORE_BATCH]
+        placeholders = ",".join("?" for _ in batch)
+        rows = conn.execute(
+            f"SELECT chunk_id, vector, format FROM embeddings WHERE chunk_id IN ({placeholders})",
+            batch,
+        ).fetchall()
+        for chunk_id, blob, fmt in rows:
+            found[int(chunk_id)] = decode_vector(blob, fmt)
+    return found
+
+
+class VectorIndex:
+    """Process-resident codes of the L2-normalized embeddings used for cosine search.
+
+    With the default float32 codes the search is exact. Compact codes (float16, int8,
+    binary) only drive a first pass over top_k * rescore_factor candidates, which are
+    then re-scored against the stored vectors fetched by primary key. That re-score is
+    exact only with float32 storage; with RAG_STORAGE_FORMAT float16 or int8 it uses the
+    decoded stored vectors and is approximate too (closer than the index codes).
+    """
+
+    def __init__(self, index_format: str = INDEX_FORMAT, rescore_factor: int = RESCORE_FACTOR) -> None:
+        self.index_format = index_format
+        self.rescore_factor = max(1, rescore_factor)
+        self._db_path = DB_PATH
+        self._lock = Lock()
+        self._loaded = False
+        self._size = 0
+        self._codes = CodeMatrix(index_format)
+        self._chunk_ids = np.empty(0, dtype=np.int64)
+        self._document_ids = np.empty(0, dtype=np.int64)
+        self._listeners: list[Callable[[str, int, np.ndarray, np.ndarray], None]] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._codes.view().nbytes
+
+    def load(self, db_path: str = DB_PATH) -> None:
+        self._db_path = db_path
+        rows = get_connection(db_path).execute(
+            """
+            SELECT c.id, c.document_id, e.vector, e.format
+            FROM chunks c
+            JOIN embeddings e ON e.chunk_id = c.id
+            ORDER BY c.id
+            """
+        ).fetchall()
+
+        with self._lock:
+            self._reset()
+            if rows:
+                chunk_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                document_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+                vectors = np.vstack([decode_vector(row[2], row[3]) for row in rows])
+                vectors = self._append(chunk_ids, document_ids, vectors)
+            else:
+                vectors = np.empty((0, 0), dtype=np.float32)
+            self._loaded = True
+            self._notify("load", 0, vectors)
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def add(self, chunk_ids: list[int], document_ids: list[int], vectors: np.ndarray) -> None:
+        if not len(chunk_ids):
+            return
+        with self._lock:
+            if not self._loaded:
+                # The next load() reads these rows back from SQLite anyway.
+                return
+            start = self._size
+            normalized = self._append(
+                np.asarray(chunk_ids, dtype=np.int64),
+                np.asarray(document_ids, dtype=np.int64),
+                np.asarray(vectors, dtype=np.float32).reshape(len(chunk_ids), -1),
+            )
+            self._notify("append", start, normalized)
+
+    def remove_documents(self, document_ids: list[int]) -> int:
+        """Drops the rows of these documents and compacts the index; returns how many rows went."""
+        if not document_ids:
+            return 0
+        with self._lock:
+            if not self._loaded or self._size == 0:
+                return 0
+            drop = np.isin(self._document_ids[: self._size], np.asarray(document_ids, dtype=np.int64))
+            removed = np.flatnonzero(drop)
+            if removed.size == 0:
+                return 0
+            kept = np.flatnonzero(~drop)
+            self._codes.keep(kept)
+            self._chunk_ids[: kept.size] = self._chunk_ids[kept]
+            self._document_ids[: kept.size] = self._document_ids[kept]
+            self._size = int(kept.size)
+            for listener in self._listeners:
+                listener("remove", int(removed[0]), np.empty((0, self._codes.dim), dtype=np.float32), removed)
+            return int(removed.size)
+
+    def subscribe(self, listener: Callable[[str, int, np.ndarray, np.ndarray], None]) -> None:
+        """Registers listener(event, start_row, vectors, chunk_ids), called under the index lock on load/append/remove.
+
+        vectors are the normalized float32 rows, before they are reduced to index codes.
+        On "remove" vectors is empty and the last argument holds the removed row positions
+        (ascending); rows after them shift down.
+        """
+        self._listeners.append(listener)
+
+    def snapshot(self) -> tuple[CodeView, np.ndarray, np.ndarray]:
+        """Returns read-only views of (codes, chunk_ids, document_ids) for the current rows."""
+        self.ensure_loaded()
+        with self._lock:
+            size = self._size
+            return self._codes.view(), self._chunk_ids[:size], self._document_ids[:size]
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        document_ids: list[int] | None = None,
+        top_k: int = 5,
+        rescore: bool = True,
+        candidate_ids: list[int] | None = None,
+    ) -> list[tuple[int, int, float]]:
+        """Returns (chunk_id, document_id, score) tuples sorted by descending cosine score.
+
+        candidate_ids, if given, restricts scoring to those chunks (e.g. lexical prefilter hits).
+        """
+        self.ensure_loaded()
+        query = normalize_query(query_vector)
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return []
+            codes = self._codes.view()
+            chunk_ids = self._chunk_ids[:size]
+            doc_ids = self._document_ids[:size]
+
+            mask = None
+            if document_ids:
+                mask = np.isin(doc_ids, np.asarray(document_ids, dtype=np.int64))
+            if candidate_ids is not None:
+                wanted = np.isin(chunk_ids, np.asarray(candidate_ids, dtype=np.int64))
+                mask = wanted if mask is None else mask & wanted
+            rows = None
+            if mask is not None:
+                rows = np.flatnonzero(mask)
+                if rows.size == 0:
+                    return []
+            scores = codes.score(query, rows)
+            if rows is None:
+                rows = np.arange(size)
+        return self.select(query, rows, scores, chunk_ids, doc_ids, top_k, codes.exact or not rescore)
+
+    def select(
+        self,
+        query: np.ndarray,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        chunk_ids: np.ndarray,
+        doc_ids: np.ndarray,
+        top_k: int,
+        exact: bool,
+    ) -> list[tuple[int, int, float]]:
+        """Picks the top_k rows from first-pass scores, re-scoring compact-code candidates."""
+        if exact:
+            best = top_rows(scores, top_k)
+            return [(int(chunk_ids[rows[i]]), int(doc_ids[rows[i]]), float(scores[i])) for i in best]
+
+        shortlist = top_rows(scores, max(1, int(top_k)) * self.rescore_factor)
+        candidates = [(int(chunk_ids[rows[i]]), int(doc_ids[rows[i]])) for i in shortlist]
+        full = load_full_vectors([chunk_id for chunk_id, _ in candidates], self._db_path)
+        # Rows deleted since they were indexed have no stored vector and are dropped here.
+        kept = [(chunk_id, doc_id) for chunk_id, doc_id in candidates if chunk_id in full]
+        if not kept:
+            return []
+        exact_scores = normalize_rows(np.vstack([full[chunk_id] for chunk_id, _ in kept])) @ query
+        best = top_rows(exact_scores, top_k)
+        return [(kept[i][0], kept[i][1], float(exact_scores[i])) for i in best]
+
+    def _notify(self, event: str, start: int, vectors: np.ndarray) -> None:
+        chunk_ids = self._chunk_ids[start:start + vectors.shape[0]]
+        for listener in self._listeners:
+            listener(event, start, vectors, chunk_ids)
+
+    def _reset(self) -> None:
+        self._size = 0
+        self._codes = CodeMatrix(self.index_format)
+        self._chunk_ids = np.empty(0, dtype=np.int64)
+        self._document_ids = np.empty(0, dtype=np.int64)
+
+    def _append(self, chunk_ids: np.ndarray, document_ids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        vectors = normalize_rows(vectors)
+        count = vectors.shape[0]
+        self._codes.append(vectors)
+
+        needed = self._size + count
+        if needed > self._chunk_ids.shape[0]:
+            # Amortized growth keeps incremental ingest from copying the arrays every time.
+            capacity = max(needed, int(self._chunk_ids.shape[0] * 1.5), 1024)
+            chunk_buf = np.empty(capacity, dtype=np.int64)
+            chunk_buf[: self._size] = self._chunk_ids[: self._size]
+            doc_buf = np.empty(capacity, dtype=np.int64)
+            doc_buf[: self._size] = self._document_ids[: self._size]
+            self._chunk_ids, self._document_ids = chunk_buf, doc_buf
+
+        self._chunk_ids[self._size:needed] = chunk_ids
+        self._document_ids[self._size:needed] = document_ids
+        self._size = needed
+        return vectors
+
+
+vector_index = VectorIndex()
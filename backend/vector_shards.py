@@ -0,0 +1,190 @@
+import argparse
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from init_db import DB_PATH, PROJECT_ROOT, get_connection
+from vector_codec import decode_vector
+from vector_index import normalize_query, normalize_rows, top_rows
+
+
+SHARDS_ENABLED = os.getenv("RAG_VECTOR_SHARDS", "1").strip().lower() not in ("0", "false", "off")
+SHARD_DIR = os.getenv("RAG_SHARD_DIR", os.path.join(PROJECT_ROOT, "Storage", "vectors"))
+SHARD_OPEN_MAX = int(os.getenv("RAG_SHARD_OPEN_MAX", "256"))
+COPY_BLOCK_ROWS = 4096
+
+
+class ShardStore:
+    """Per-document, memory-mapped embedding shards.
+
+    Each document owns doc-<id>.npy (normalized float32 rows) and doc-<id>.ids.npy (chunk
+    ids). A documentIds-filtered search only touches the mapped shards of those documents,
+    so it never needs the whole corpus in memory and the OS page cache is shared between
+    worker processes. Ingest appends batches to .part files and publishes the shard once
+    the document is committed; shards missing on disk are exported from SQLite on demand.
+    """
+
+    def __init__(self, directory: str = SHARD_DIR, open_max: int = SHARD_OPEN_MAX, db_path: str = DB_PATH) -> None:
+        self.directory = directory
+        self.open_max = max(1, open_max)
+        self.db_path = db_path
+        self._lock = Lock()
+        self._open: OrderedDict[int, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+        self._pending: set[int] = set()
+
+    def _paths(self, document_id: int) -> tuple[str, str]:
+        base = os.path.join(self.directory, f"doc-{int(document_id)}")
+        return f"{base}.npy", f"{base}.ids.npy"
+
+    def begin(self, document_id: int) -> None:
+        """Marks a document as being ingested; its batches go to .part files."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._pending.add(int(document_id))
+        for path in self._paths(document_id):
+            if os.path.exists(f"{path}.part"):
+                os.remove(f"{path}.part")
+
+    def append(self, document_id: int, chunk_ids: list[int], vectors: np.ndarray) -> None:
+        vectors_path, ids_path = self._paths(document_id)
+        with open(f"{vectors_path}.part", "ab") as handle:
+            handle.write(normalize_rows(np.asarray(vectors, dtype=np.float32)).tobytes())
+        with open(f"{ids_path}.part", "ab") as handle:
+            handle.write(np.asarray(chunk_ids, dtype=np.int64).tobytes())
+
+    def commit(self, document_id: int, dim: int) -> None:
+        """Turns the .part files into the published shard."""
+        vectors_path, ids_path = self._paths(document_id)
+        try:
+            chunk_ids = np.fromfile(f"{ids_path}.part", dtype=np.int64)
+            raw = np.memmap(f"{vectors_path}.part", dtype=np.float32, mode="r", shape=(chunk_ids.size, dim))
+            with self._lock:
+                self._write(document_id, chunk_ids, raw)
+            del raw
+        finally:
+            self.discard(document_id)
+
+    def discard(self, document_id: int) -> None:
+        with self._lock:
+            self._pending.discard(int(document_id))
+        for path in self._paths(document_id):
+            if os.path.exists(f"{path}.part"):
+                os.remove(f"{path}.part")
+
+    def delete(self, document_id: int) -> None:
+        with self._lock:
+            self._open.pop(int(document_id), None)
+            for path in self._paths(document_id):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def search(self, query_vector: np.ndarray, document_ids: list[int], top_k: int = 5) -> list[tuple[int, int, float]]:
+        """Exact cosine search restricted to the given documents' shards."""
+        query = normalize_query(query_vector)
+        scores, chunk_ids, doc_ids = [], [], []
+        for document_id in dict.fromkeys(int(d) for d in document_ids):
+            vectors, ids = self.open(document_id)
+            if ids.size == 0:
+                continue
+            scores.append(vectors @ query)
+            chunk_ids.append(ids)
+            doc_ids.append(np.full(ids.size, document_id, dtype=np.int64))
+        if not scores:
+            return []
+        scores_all = np.concatenate(scores)
+        chunk_all = np.concatenate(chunk_ids)
+        doc_all = np.concatenate(doc_ids)
+        return [(int(chunk_all[i]), int(doc_all[i]), float(scores_all[i])) for i in top_rows(scores_all, top_k)]
+
+    def open(self, document_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (mapped vectors, chunk ids) for a document, exporting the shard if needed."""
+        document_id = int(document_id)
+        with self._lock:
+            cached = self._open.get(document_id)
+            if cached is not None:
+                self._open.move_to_end(document_id)
+                return cached
+        vectors_path, ids_path = self._paths(document_id)
+        if not (os.path.exists(vectors_path) and os.path.exists(ids_path)):
+            chunk_ids, vectors = self._read_from_db(document_id)
+            if chunk_ids.size == 0:
+                return vectors, chunk_ids
+            with self._lock:
+                if document_id in self._pending:
+                    # Still being ingested: serve the committed rows without publishing a partial shard.
+                    return vectors, chunk_ids
+                if not os.path.exists(vectors_path):
+                    self._write(document_id, chunk_ids, vectors)
+        mapped = (np.load(vectors_path, mmap_mode="r"), np.load(ids_path))
+        with self._lock:
+            self._open[document_id] = mapped
+            while len(self._open) > self.open_max:
+                self._open.popitem(last=False)
+        return mapped
+
+    def export_all(self) -> int:
+        """Writes shards for every document that has none yet. Returns how many were written."""
+        document_ids = [row[0] for row in get_connection(self.db_path).execute("SELECT id FROM documents").fetchall()]
+        written = 0
+        for document_id in document_ids:
+            if not os.path.exists(self._paths(document_id)[0]):
+                self.open(document_id)
+                written += 1
+        return written
+
+    def cleanup_parts(self) -> None:
+        """Removes .part files left behind by ingests interrupted by a restart."""
+        if not os.path.isdir(self.directory):
+            return
+        with self._lock:
+            pending = {f"doc-{d}." for d in self._pending}
+        for name in os.listdir(self.directory):
+            if name.endswith(".part") and not any(name.startswith(prefix) for prefix in pending):
+                os.remove(os.path.join(self.directory, name))
+
+    def _read_from_db(self, document_id: int) -> tuple[np.ndarray, np.ndarray]:
+        rows = get_connection(self.db_path).execute(
+            """
+            SELECT c.id, e.vector, e.format
+            FROM chunks c
+            JOIN embeddings e ON e.chunk_id = c.id
+            WHERE c.document_id = ?
+            ORDER BY c.id
+            """,
+            (document_id,),
+        ).fetchall()
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        chunk_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        vectors = normalize_rows(np.vstack([decode_vector(row[1], row[2]) for row in rows]))
+        return chunk_ids, vectors
+
+    def _write(self, document_id: int, chunk_ids: np.ndarray, vectors: np.ndarray) -> None:
+        # Called with the lock held. Files are written aside and renamed, so readers in
+        # other processes only ever map complete shards.
+        os.makedirs(self.directory, exist_ok=True)
+        vectors_path, ids_path = self._paths(document_id)
+        tmp_vectors, tmp_ids = f"{vectors_path}.tmp.npy", f"{ids_path}.tmp.npy"
+        out = np.lib.format.open_memmap(tmp_vectors, mode="w+", dtype=np.float32, shape=vectors.shape)
+        for start in range(0, vectors.shape[0], COPY_BLOCK_ROWS):
+            out[start:start + COPY_BLOCK_ROWS] = vectors[start:start + COPY_BLOCK_ROWS]
+        out.flush()
+        del out
+        np.save(tmp_ids, np.asarray(chunk_ids, dtype=np.int64))
+        os.replace(tmp_ids, ids_path)
+        os.replace(tmp_vectors, vectors_path)
+        self._open.pop(int(document_id), None)
+
+
+shard_store = ShardStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export per-document vector shards from rag.db.")
+    parser.add_argument("command", choices=["export"])
+    args = parser.parse_args()
+
+    count = shard_store.export_all()
+    print(f"Wrote {count} shards to {shard_store.directory}")
@@ -0,0 +1,172 @@
+"""
+Throughput auto-tuner for the LoRA fine-tune recipe (see modal_app.py).
+
+Runs short trials over batch size, gradient accumulation, torch.compile and activation
+checkpointing, then keeps the fastest configuration whose peak memory fits. The effective
+batch (batch_size × grad_accum) stays fixed, so tuning changes speed, not the optimisation.
+
+No Modal or torch import here: the trial runner is passed in, so the search and the
+selection run offline with a fake runner.
+"""
+
+import json
+import re
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16)
+STEP_LINE_RE = re.compile(r"Step (\d+) \| (.*)")
+METRIC_RE = re.compile(r"(\w+):(-?[\d.]+(?:[eE][-+]?\d+)?)")
+
+
+@dataclass(frozen=True)
+class TrainingConfig:
+    batch_size: int
+    grad_accum: int
+    compile: bool = False
+    activation_checkpointing: bool = False
+
+    @property
+    def effective_batch(self) -> int:
+        return self.batch_size * self.grad_accum
+
+    def overrides(self) -> list[str]:
+        """torchtune command-line overrides applying this configuration to a recipe."""
+        return [
+            f"batch_size={self.batch_size}",
+            f"gradient_accumulation_steps={self.grad_accum}",
+            f"compile={self.compile}",
+            f"enable_activation_checkpointing={self.activation_checkpointing}",
+        ]
+
+
+@dataclass(frozen=True)
+class TrialResult:
+    config: TrainingConfig
+    tokens_per_sec: float | None = None
+    peak_memory_gb: float | None = None
+    error: str | None = None
+
+    def fits(self, memory_limit_gb: float) -> bool:
+        return (
+            self.error is None
+            and self.tokens_per_sec is not None
+            and self.peak_memory_gb is not None
+            and self.peak_memory_gb <= memory_limit_gb
+        )
+
+    def to_dict(self) -> dict:
+        return {**asdict(self.config), "tokens_per_sec": self.tokens_per_sec, "peak_memory_gb": self.peak_memory_gb, "error": self.error}
+
+
+def candidate_configs(
+    effective_batch: int,
+    batch_sizes: Iterable[int] = DEFAULT_BATCH_SIZES,
+    compile_options: Iterable[bool] = (False, True),
+    checkpointing_options: Iterable[bool] = (False, True),
+) -> list[TrainingConfig]:
+    """Every combination keeping batch_size × grad_accum == effective_batch, smallest batch first."""
+    sizes = sorted(b for b in set(batch_sizes) if 0 < b <= effective_batch and effective_batch % b == 0)
+    return [
+        TrainingConfig(batch_size, effective_batch // batch_size, compiled, checkpointing)
+        for compiled in compile_options
+        for checkpointing in checkpointing_options
+        for batch_size in sizes
+    ]
+
+
+def select_best(results: Iterable[TrialResult], memory_limit_gb: float) -> TrialResult | None:
+    """Fastest trial that fits; ties go to the lower peak memory."""
+    fitting = [r for r in results if r.fits(memory_limit_gb)]
+    return max(fitting, key=lambda r: (r.tokens_per_sec, -r.peak_memory_gb), default=None)
+
+
+def run_trials(
+    runner: Callable[[TrainingConfig], TrialResult],
+    candidates: Iterable[TrainingConfig],
+    memory_limit_gb: float,
+) -> list[TrialResult]:
+    """Runs the candidates, skipping the ones known in advance not to help.
+
+    Within a (compile, checkpointing) group, batch sizes run in ascending order and the
+    group stops at the first one that fails or does not fit: larger batches need more
+    memory. Checkpointing only saves memory at a speed cost, so with checkpointing only
+    batch sizes that did not fit without it are tried.
+    """
+    groups: dict[tuple[bool, bool], list[TrainingConfig]] = {}
+    for config in candidates:
+        groups.setdefault((config.compile, config.activation_checkpointing), []).append(config)
+
+    results: list[TrialResult] = []
+    largest_fit: dict[bool, int] = {}
+    # Groups without checkpointing first, so their largest fitting batch is known.
+    for (compiled, checkpointing), configs in sorted(groups.items(), key=lambda item: item[0][1]):
+        for config in sorted(configs, key=lambda c: c.batch_size):
+            if checkpointing and config.batch_size <= largest_fit.get(compiled, 0):
+                continue
+            try:
+                result = runner(config)
+            except Exception as exc:
+                result = TrialResult(config, error=str(exc))
+            results.append(result)
+            if not result.fits(memory_limit_gb):
+                break
+            if not checkpointing:
+                largest_fit[compiled] = config.batch_size
+    return results
+
+
+def autotune(
+    runner: Callable[[TrainingConfig], TrialResult],
+    effective_batch: int,
+    memory_limit_gb: float,
+    **candidate_options,
+) -> tuple[TrainingConfig | None, list[TrialResult]]:
+    """Returns (best configuration or None when nothing fits, every trial run)."""
+    results = run_trials(runner, candidate_configs(effective_batch, **candidate_options), memory_limit_gb)
+    best = select_best(results, memory_limit_gb)
+    return (best.config if best else None), results
+
+
+def parse_metric_log(text: str, warmup_steps: int = 0) -> tuple[float | None, float | None]:
+    """Reads a torchtune DiskLogger log; returns (mean tokens/sec after warm-up, peak memory in GiB).
+
+    The first warmup_steps steps are left out of the throughput: they include compilation
+    and allocator growth.
+    """
+    throughput: list[float] = []
+    peak: float | None = None
+    for line in text.splitlines():
+        match = STEP_LINE_RE.search(line)
+        if not match:
+            continue
+        metrics = {name: float(value) for name, value in METRIC_RE.findall(match.group(2))}
+        memory = metrics.get("peak_memory_reserved", metrics.get("peak_memory_alloc"))
+        if memory is not None:
+            peak = max(peak or 0.0, memory)
+        if int(match.group(1)) > warmup_steps and "tokens_per_second_per_gpu" in metrics:
+            throughput.append(metrics["tokens_per_second_per_gpu"])
+    return (sum(throughput) / len(throughput) if throughput else None), peak
+
+
+def load_tuned(path: Path) -> TrainingConfig | None:
+    try:
+        return TrainingConfig(**json.loads(path.read_text())["config"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_tuned(path: Path, best: TrainingConfig, results: Iterable[TrialResult], **context) -> None:
+    """Records the chosen configuration (and the trials behind it) for later runs."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({
+        "config": asdict(best),
+        "trials": [r.to_dict() for r in results],
+        "tuned_at": time.time(),
+        **context,
+    }, indent=2))
+    tmp.replace(path)
@@ -1,6 +1,6 @@
 """
 Modal fine-tuning backend for Llama 3.2 1B.
-Pipeline: JSON dataset → LoRA fine-tune → merge weights → Q4_K_M GGUF
+Pipeline: JSON dataset → LoRA fine-tune → merge weights → F16 GGUF → quantized GGUFs
 
 Usage (CLI):
     modal run finetune.py --dataset your_data.json
@@ -17,39 +17,108 @@ Dataset format (Open-Source):
     {"dataset_name": "cybersec"}
 
 Output:
-    GGUF saved to Modal Volume 'finetune-vol' at /output/model-q4_k_m.gguf
-    Download with:
-        modal volume get finetune-vol /output/model-q4_k_m.gguf ./model-q4_k_m.gguf
+    GGUFs saved to Modal Volume 'finetune-vol' at /output/jobs/<job_id>/model-<quant>.gguf
+    (Q4_K_M by default; ?quants=Q4_0,Q5_K_M,Q8_0&imatrix=true for several variants),
+    with manifest.json listing size, sha256 and perplexity per quant.
+    Poll GET .../finetune_status?call_id=...&job_id=... and fetch the file from
+    GET .../finetune_artifact?job_id=..., or download with:
+        modal volume get finetune-vol /jobs/<job_id>/model-q4_k_m.gguf ./model-q4_k_m.gguf
+
+Dataset preparation:
+    Records are streamed to JSONL, deduplicated (normalized prompt + response) and
+    dropped when longer than MAX_SEQ_LEN tokens. Training packs several records per
+    sequence (PACK_SEQUENCES); the result reports padding ratio and effective tokens/sec.
+
+Auto-tuning:
+    ?autotune=true (or --autotune) runs short trials over batch size, gradient
+    accumulation, torch.compile and activation checkpointing before training and
+    records the fastest configuration that fits on the cache volume; later runs on
+    the same GPU type reuse it (see finetune_autotune.py).
+
+Caching:
+    Base weights (per commit), raw HF datasets and prepared datasets live on the
+    'finetune-cache' volume, so repeat jobs start training without downloads.
 
 Prerequisites:
     modal secret create huggingface-secret HF_TOKEN=hf_xxxxx
 """
 
+import functools
+import hashlib
+import itertools
 import json
 import os
+import re
+import shutil
 import subprocess
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from pathlib import Path
 
 import modal
 from fastapi import Body  # <-- 1. Ajoute cet import
 
+from finetune_autotune import TrainingConfig, TrialResult, autotune, load_tuned, parse_metric_log, save_tuned
+
 # ---------------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------------
 
 BASE_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
+BASE_MODEL_REVISION = "main"   # branch, tag or commit; the cache is keyed by the resolved commit
 
 # Ephemeral container paths
-DATASET_PATH  = "/tmp/dataset.json"
+DATASET_PATH  = "/tmp/dataset.jsonl"
 RECIPE_PATH   = "/tmp/lora_finetune.yaml"
-BASE_DIR      = "/tmp/base_model"
-TOKENIZER_DIR = "/tmp/tokenizer"
+BASE_DIR      = "/tmp/base_model"   # default for build_torchtune_config; jobs use the cache volume
 ADAPTER_DIR   = "/tmp/adapter"
 MERGED_DIR    = "/tmp/merged_model"
 LLAMA_CPP_DIR = "/llama.cpp"       # prebuilt in ghcr.io/ggerganov/llama.cpp:full
 
-# Persistent path on Modal Volume
-GGUF_VOLUME_PATH = "/output/model-q4_k_m.gguf"
+# Persistent cache volume: base weights per commit, HF datasets, prepared datasets.
+CACHE_ROOT           = "/cache"
+DATASET_PREP_VERSION = 2     # bump when prepare_dataset changes its output
+# Idle containers stay up this long, so a follow-up job skips the cold start entirely.
+CONTAINER_SCALEDOWN_S = 300
+
+# Persistent paths on Modal Volume: every job writes under its own folder so
+# concurrent jobs never overwrite each other.
+OUTPUT_ROOT = "/output"
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Quantization targets; the first one requested is the primary artifact.
+DEFAULT_QUANTS   = ["Q4_K_M"]
+SUPPORTED_QUANTS = (
+    "Q2_K", "Q3_K_S", "Q3_K_M", "Q3_K_L", "Q4_0", "Q4_1", "Q4_K_S", "Q4_K_M",
+    "Q5_0", "Q5_1", "Q5_K_S", "Q5_K_M", "Q6_K", "Q8_0", "IQ3_M", "IQ4_XS", "IQ4_NL",
+)
+IMATRIX_CALIBRATION_RECORDS = 200   # training records fed to llama-imatrix
+PERPLEXITY_EVAL_RECORDS     = 100   # last records of the set, held out of training
+TRAIN_PATH                  = "/tmp/train.jsonl"
+EVAL_TEXT_PATH              = "/tmp/eval.txt"
+PERPLEXITY_CHUNKS           = 32
+PERPLEXITY_CTX              = 512
+PPL_RE = re.compile(r"Final estimate: PPL = ([0-9.]+)")
+
+
+def gguf_file_name(quant: str) -> str:
+    return f"model-{quant.lower()}.gguf"
+
+
+def normalize_quants(quants: list[str] | str | None) -> list[str]:
+    if isinstance(quants, str):
+        quants = quants.split(",")
+    chosen = list(dict.fromkeys(q.strip().upper() for q in (quants or DEFAULT_QUANTS) if q.strip()))
+    unknown = [q for q in chosen if q not in SUPPORTED_QUANTS]
+    if unknown or not chosen:
+        raise ValueError(f"Unsupported quant(s) {unknown}. Supported: {list(SUPPORTED_QUANTS)}")
+    return chosen
+
+
+def job_output_dir(job_id: str) -> str:
+    return f"{OUTPUT_ROOT}/jobs/{job_id}"
 
 # Training hyperparams
 GPU        = "A10G"
@@ -57,6 +126,25 @@ LORA_RANK  = 16
 BATCH_SIZE = 4
 MAX_STEPS  = 50   # raise for larger datasets
 LR         = 3e-4
+GRAD_ACCUM_STEPS = 4
+MAX_SEQ_LEN      = 2048
+# Packs several short records into each MAX_SEQ_LEN sequence instead of padding every
+# record; a packed batch holds far more real tokens, so it uses a smaller batch size.
+PACK_SEQUENCES    = True
+PACKED_BATCH_SIZE = 2
+# Llama 3 chat framing torchtune adds around a prompt/response pair (BOS, headers, EOT).
+TEMPLATE_TOKENS   = 12
+PREP_BATCH_RECORDS = 1000   # records tokenized per call while streaming
+
+# Auto-tuning trials: a few optimizer steps each, the first ones (compilation, allocator
+# growth) left out of the throughput. Peak memory must stay under this share of the GPU.
+AUTOTUNE_TRIAL_STEPS     = 6
+AUTOTUNE_WARMUP_STEPS    = 2
+AUTOTUNE_MEMORY_HEADROOM = 0.9
+
+
+def default_training_config(packed: bool = PACK_SEQUENCES) -> TrainingConfig:
+    return TrainingConfig(batch_size=PACKED_BATCH_SIZE if packed else BATCH_SIZE, grad_accum=GRAD_ACCUM_STEPS)
 
 # ---------------------------------------------------------------------------
 # Supported Open-Source Datasets
@@ -110,17 +198,26 @@ image = (
         "accelerate",
         "bitsandbytes",
     )
+    .add_local_python_source("finetune_autotune")
 )
 
 app = modal.App("llama32-gguf-finetune", image=image)
 vol = modal.Volume.from_name("finetune-vol", create_if_missing=True)
+cache_vol = modal.Volume.from_name("finetune-cache", create_if_missing=True)
 
 
 # ---------------------------------------------------------------------------
 # Helper: torchtune YAML config
 # ---------------------------------------------------------------------------
 
-def build_torchtune_config(dataset_path: str, adapter_out: str) -> str:
+def build_torchtune_config(
+    dataset_path: str,
+    adapter_out: str,
+    base_dir: str = BASE_DIR,
+    packed: bool = PACK_SEQUENCES,
+    training: TrainingConfig | None = None,
+) -> str:
+    training = training or default_training_config(packed)
     return f"""
 model:
   _component_: torchtune.models.llama3_2.lora_llama3_2_1b
@@ -131,8 +228,8 @@ model:
 
 tokenizer:
   _component_: torchtune.models.llama3.llama3_tokenizer
-  path: {BASE_DIR}/original/tokenizer.model
-  max_seq_len: 2048
+  path: {base_dir}/original/tokenizer.model
+  max_seq_len: {MAX_SEQ_LEN}
 
 dataset:
   _component_: torchtune.datasets.instruct_dataset
@@ -142,11 +239,12 @@ dataset:
     input: prompt
     output: response
   train_on_input: false
+  packed: {str(packed).lower()}
   split: train
 
 checkpointer:
   _component_: torchtune.training.FullModelHFCheckpointer
-  checkpoint_dir: {BASE_DIR}
+  checkpoint_dir: {base_dir}
   checkpoint_files:
     - model.safetensors
   recipe_checkpoint: null
@@ -171,11 +269,12 @@ lr_scheduler:
 loss:
   _component_: torch.nn.CrossEntropyLoss
 
-batch_size: {BATCH_SIZE}
+batch_size: {training.batch_size}
 epochs: 1
 max_steps_per_epoch: {MAX_STEPS}
-gradient_accumulation_steps: 4
-compile: false
+gradient_accumulation_steps: {training.grad_accum}
+compile: {str(training.compile).lower()}
+enable_activation_checkpointing: {str(training.activation_checkpointing).lower()}
 resume_from_checkpoint: false
 shuffle: true
 
@@ -191,61 +290,354 @@ log_every_n_steps: 10
 # Helper: prepare dataset (Custom JSON or HuggingFace Open Source)
 # ---------------------------------------------------------------------------
 
-def prepare_dataset(input_data: dict | list) -> int:
-    """
-    Traite soit un JSON custom (liste), soit un nom de dataset (dict).
-    Filtre les valeurs vides (None) et sauvegarde le résultat dans DATASET_PATH.
-    Retourne le nombre de records valides.
-    """
-    records = []
-
+def _iter_raw_records(input_data: dict | list, revision: str | None = None):
+    """Yields raw (prompt, response) pairs without building the whole dataset in memory."""
     if isinstance(input_data, dict) and "dataset_name" in input_data:
         name = input_data["dataset_name"]
         if name not in SUPPORTED_DATASETS:
             raise ValueError(f"Dataset inconnu: '{name}'. Supportés: {list(SUPPORTED_DATASETS.keys())}")
-        
+
         print(f"[dataset] Téléchargement du dataset open-source : {name} ...")
         from datasets import load_dataset
-        
+
         info = SUPPORTED_DATASETS[name]
-        hf_data = load_dataset(info["repo_id"], split="train")
-        
+        # Les fichiers bruts restent sur le volume de cache entre deux jobs ; le dataset
+        # Arrow est mappé en mémoire, on ne matérialise qu'une ligne à la fois.
+        hf_data = load_dataset(info["repo_id"], split="train", revision=revision, cache_dir=f"{CACHE_ROOT}/datasets")
         for row in hf_data:
-            p = row.get(info["prompt_col"])
-            r = row.get(info["response_col"])
-            # Filtre de sécurité : on s'assure que le texte existe et n'est pas vide
-            if p and r and isinstance(p, str) and isinstance(r, str):
-                records.append({
-                    "prompt": p.strip(),
-                    "response": r.strip()
-                })
-                
+            yield row.get(info["prompt_col"]), row.get(info["response_col"])
+
     elif isinstance(input_data, list):
-        for i, rec in enumerate(input_data):
-            p = rec.get("prompt")
-            r = rec.get("response")
-            if p and r and isinstance(p, str) and isinstance(r, str):
-                records.append({
-                    "prompt": p.strip(),
-                    "response": r.strip()
-                })
-            else:
-                print(f"[dataset] Attention : Ligne {i} ignorée car invalide ou vide.")
-        
+        for rec in input_data:
+            yield (rec.get("prompt"), rec.get("response")) if isinstance(rec, dict) else (None, None)
+
     else:
         raise ValueError("Input invalide. Fournissez une liste d'objets ou {'dataset_name': 'nom'}.")
 
-    with open(DATASET_PATH, "w") as f:
-        json.dump(records, f)
-    
-    print(f"[dataset] {len(records)} records valides prêts → {DATASET_PATH}")
-    return len(records)
+
+def _dedupe_key(prompt: str, response: str) -> bytes:
+    # Whitespace and case differences do not make a record new.
+    text = f"{' '.join(prompt.split()).lower()}\x00{' '.join(response.split()).lower()}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def prepare_dataset(
+    input_data: dict | list,
+    out_path: str = DATASET_PATH,
+    revision: str | None = None,
+    tokenizer_dir: str = BASE_DIR,
+    tokenizer=None,
+) -> dict:
+    """
+    Traite soit un JSON custom (liste), soit un nom de dataset (dict), en streaming vers out_path (JSONL).
+    Filtre les valeurs vides, les doublons et les records plus longs que MAX_SEQ_LEN tokens.
+    Retourne les statistiques, dont la longueur en tokens de chaque record gardé ("lengths").
+    tokenizer remplace celui de tokenizer_dir (même interface que les tokenizers HF).
+    """
+    if tokenizer is None:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+    stats = {"num_records": 0, "invalid": 0, "duplicates": 0, "too_long": 0, "tokens": 0}
+    lengths: list[int] = []
+    seen: set[bytes] = set()
+    raw = _iter_raw_records(input_data, revision)
+
+    with open(out_path, "w") as out:
+        while batch := list(itertools.islice(raw, PREP_BATCH_RECORDS)):
+            kept = []
+            for p, r in batch:
+                if not (isinstance(p, str) and isinstance(r, str) and p.strip() and r.strip()):
+                    stats["invalid"] += 1
+                    continue
+                key = _dedupe_key(p, r)
+                if key in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(key)
+                kept.append((p.strip(), r.strip()))
+            if not kept:
+                continue
+
+            prompt_ids = tokenizer([p for p, _ in kept], add_special_tokens=False)["input_ids"]
+            response_ids = tokenizer([r for _, r in kept], add_special_tokens=False)["input_ids"]
+            for (p, r), p_ids, r_ids in zip(kept, prompt_ids, response_ids):
+                length = len(p_ids) + len(r_ids) + TEMPLATE_TOKENS
+                # Truncation would cut the response, the only part trained on: drop instead.
+                if length > MAX_SEQ_LEN:
+                    stats["too_long"] += 1
+                    continue
+                out.write(json.dumps({"prompt": p, "response": r}, ensure_ascii=False) + "\n")
+                lengths.append(length)
+                stats["tokens"] += length
+
+    stats["num_records"] = len(lengths)
+    print(
+        f"[dataset] {stats['num_records']} records valides prêts → {out_path} "
+        f"({stats['tokens']} tokens; ignorés : {stats['invalid']} invalides, "
+        f"{stats['duplicates']} doublons, {stats['too_long']} > {MAX_SEQ_LEN} tokens)"
+    )
+    if not lengths:
+        raise ValueError("Aucun record utilisable après filtrage.")
+    return {**stats, "lengths": lengths}
+
+
+def sequence_layout(lengths: list[int], packed: bool, batch_size: int, max_seq_len: int = MAX_SEQ_LEN) -> dict:
+    """
+    Estimates how records become training samples. Packed: greedy sequential packs padded
+    to max_seq_len (as torchtune's PackedDataset); unpacked: batches padded to their longest record.
+    """
+    real = sum(lengths)
+    if packed:
+        samples, fill = 0, max_seq_len
+        for length in lengths:
+            if fill + length > max_seq_len:
+                samples, fill = samples + 1, 0
+            fill += length
+        padded = samples * max_seq_len
+    else:
+        samples = len(lengths)
+        padded = sum(
+            max(lengths[i:i + batch_size]) * len(lengths[i:i + batch_size])
+            for i in range(0, len(lengths), batch_size)
+        )
+    return {
+        "samples": samples,
+        "real_tokens": real,
+        "padding_ratio": round(1 - real / padded, 4) if padded else 0.0,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Helpers: persistent caches on the 'finetune-cache' volume
+# ---------------------------------------------------------------------------
+
+class StageTimer:
+    """Collects wall-clock seconds per pipeline stage; starting a stage ends the previous one."""
+
+    def __init__(self) -> None:
+        self.timings: dict[str, float] = {}
+        self._current: str | None = None
+        self._started = 0.0
+
+    def begin(self, name: str) -> None:
+        self.end()
+        self._current, self._started = name, time.perf_counter()
+
+    def end(self) -> None:
+        if self._current is not None:
+            self.timings[self._current] = round(time.perf_counter() - self._started, 2)
+            print(f"[timing] {self._current}: {self.timings[self._current]}s")
+            self._current = None
+
+
+def _publish_dir(staging: Path, target: Path) -> None:
+    """Renames a fully written staging folder into place; a concurrent job may have won."""
+    try:
+        os.rename(staging, target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+    cache_vol.commit()
+
+
+def cached_base_model(hf_token: str | None) -> tuple[str, bool]:
+    """
+    Returns (path, cache_hit) for BASE_MODEL at BASE_MODEL_REVISION. Weights and tokenizer
+    come from one snapshot stored under its commit hash, so a new upstream commit gets
+    its own folder and older jobs stay reproducible.
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    commit = HfApi(token=hf_token).model_info(BASE_MODEL, revision=BASE_MODEL_REVISION).sha
+    target = Path(CACHE_ROOT) / "models" / BASE_MODEL.replace("/", "--") / commit
+    if (target / ".complete").exists():
+        return str(target), True
+
+    staging = target.with_name(f"{commit}.partial-{uuid.uuid4().hex[:8]}")
+    snapshot_download(
+        repo_id=BASE_MODEL,
+        revision=commit,
+        local_dir=str(staging),
+        token=hf_token,
+        ignore_patterns=["*.msgpack", "*.h5", "flax_*"],
+    )
+    (staging / ".complete").write_text(f"{BASE_MODEL}@{commit}\n")
+    _publish_dir(staging, target)
+    return str(target), False
+
+
+def dataset_cache_key(input_data: dict | list, tokenizer_dir: str) -> tuple[str, str | None]:
+    """Returns (cache key, dataset revision); the key changes with the data, the tokenizer or the prep code."""
+    if isinstance(input_data, dict) and input_data.get("dataset_name") in SUPPORTED_DATASETS:
+        from huggingface_hub import HfApi
+
+        info = SUPPORTED_DATASETS[input_data["dataset_name"]]
+        revision = HfApi(token=os.environ.get("HF_TOKEN")).dataset_info(info["repo_id"]).sha
+        material = json.dumps({"info": info, "revision": revision, "version": DATASET_PREP_VERSION}, sort_keys=True)
+    else:
+        revision = None
+        material = json.dumps({"records": input_data, "version": DATASET_PREP_VERSION}, sort_keys=True)
+    material += json.dumps({"tokenizer": Path(tokenizer_dir).name, "max_seq_len": MAX_SEQ_LEN})
+    return hashlib.sha256(material.encode("utf-8")).hexdigest(), revision
+
+
+def cached_prepared_dataset(input_data: dict | list, tokenizer_dir: str) -> tuple[str, dict, bool]:
+    """Returns (path, stats, cache_hit); identical inputs reuse the prepared file and its stats."""
+    key, revision = dataset_cache_key(input_data, tokenizer_dir)
+    folder = Path(CACHE_ROOT) / "prepared" / key
+    if (folder / "meta.json").exists():
+        return str(folder / "dataset.jsonl"), json.loads((folder / "meta.json").read_text()), True
+
+    staging = folder.with_name(f"{key}.partial-{uuid.uuid4().hex[:8]}")
+    staging.mkdir(parents=True, exist_ok=True)
+    stats = prepare_dataset(input_data, out_path=str(staging / "dataset.jsonl"), revision=revision, tokenizer_dir=tokenizer_dir)
+    (staging / "meta.json").write_text(json.dumps({**stats, "revision": revision}))
+    _publish_dir(staging, folder)
+    return str(folder / "dataset.jsonl"), stats, False
+
+
+# ---------------------------------------------------------------------------
+# Helpers: locate prebuilt llama.cpp binaries (resolved once per container)
+# ---------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def find_binary(name: str) -> str:
+    candidates = [
+        f"/app/{name}",
+        f"/app/build/bin/{name}",
+        f"/llama.cpp/build/bin/{name}",
+        f"/llama.cpp/{name}",
+        f"/usr/local/bin/{name}",
+        f"/usr/bin/{name}",
+    ]
+    for p in candidates:
+        if Path(p).exists():
+            return p
+    result = subprocess.run(["which", name], capture_output=True, text=True)
+    if result.returncode == 0:
+        return result.stdout.strip()
+    raise FileNotFoundError(f"Could not find binary: {name}. Tried: {candidates}")
+
+
+@functools.lru_cache(maxsize=None)
+def find_convert_script() -> str:
+    candidates = [
+        "/app/convert_hf_to_gguf.py",
+        "/llama.cpp/convert_hf_to_gguf.py",
+        "/llama.cpp/convert-hf-to-gguf.py",
+    ]
+    for p in candidates:
+        if Path(p).exists():
+            return p
+    raise FileNotFoundError(f"Could not find convert script. Tried: {candidates}")
 
 
 # ---------------------------------------------------------------------------
 # Helper: run shell command, raise on failure
 # ---------------------------------------------------------------------------
 
+def write_job_status(job_id: str, stage: str, **extra) -> None:
+    """Records the current stage on the volume so the status endpoint can report it."""
+    out_dir = job_output_dir(job_id)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(f"{out_dir}/status.json", "w") as f:
+        json.dump({"job_id": job_id, "stage": stage, "updated_at": time.time(), **extra}, f)
+    vol.commit()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_holdout(dataset_path: str, num_records: int, train_path: str, eval_path: str) -> int:
+    """
+    Streams the prepared dataset into train_path, keeping its last records apart as
+    perplexity text in eval_path; returns how many were held out (at most a tenth).
+    """
+    holdout = min(PERPLEXITY_EVAL_RECORDS, num_records // 10)
+    with open(dataset_path) as src, open(train_path, "w") as train, open(eval_path, "w") as held:
+        for index, line in enumerate(src):
+            if index < num_records - holdout:
+                train.write(line)
+            else:
+                row = json.loads(line)
+                held.write(f"{row['prompt']}\n{row['response']}\n\n")
+    return holdout
+
+
+def write_text_sample(dataset_path: str, out_path: str, limit: int) -> int:
+    """Writes prompt/response text of the first limit records of the dataset, for llama-imatrix."""
+    with open(dataset_path) as f:
+        rows = [json.loads(line) for line in itertools.islice(f, limit)]
+    with open(out_path, "w") as f:
+        for row in rows:
+            f.write(f"{row['prompt']}\n{row['response']}\n\n")
+    return len(rows)
+
+
+def quantize_all(quantize_bin: str, f16_gguf: str, quants: list[str], imatrix_path: str | None) -> dict[str, str]:
+    """Quantizes every target from the same F16 file in parallel; CPU threads are split between them."""
+    threads = max(1, (os.cpu_count() or 4) // len(quants))
+
+    def one(quant: str) -> str:
+        out = f"/tmp/{gguf_file_name(quant)}"
+        cmd = [quantize_bin]
+        if imatrix_path:
+            cmd += ["--imatrix", imatrix_path]
+        run(cmd + [f16_gguf, out, quant, str(threads)], label=f"quantize→{quant}")
+        return out
+
+    with ThreadPoolExecutor(max_workers=len(quants)) as pool:
+        return dict(zip(quants, pool.map(one, quants)))
+
+
+def measure_perplexity(perplexity_bin: str, gguf_path: str, eval_path: str) -> float | None:
+    """Perplexity on the held-out records (see split_holdout); None when the text is too short or the run fails."""
+    result = subprocess.run(
+        [perplexity_bin, "-m", gguf_path, "-f", eval_path, "-ngl", "99",
+         "-c", str(PERPLEXITY_CTX), "--chunks", str(PERPLEXITY_CHUNKS)],
+        capture_output=True, text=True,
+    )
+    match = PPL_RE.search(result.stdout + result.stderr)
+    return float(match.group(1)) if match else None
+
+
+def autotune_record_path(gpu_name: str, training: TrainingConfig, packed: bool = PACK_SEQUENCES) -> Path:
+    """The tuned configuration holds for one GPU type, model and sequence layout."""
+    material = json.dumps({
+        "gpu": gpu_name, "model": BASE_MODEL, "lora_rank": LORA_RANK, "max_seq_len": MAX_SEQ_LEN,
+        "packed": packed, "effective_batch": training.effective_batch,
+    }, sort_keys=True)
+    return Path(CACHE_ROOT) / "autotune" / f"{hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+def torchtune_trial(recipe_path: str, config: TrainingConfig) -> TrialResult:
+    """Runs a few optimizer steps of the recipe with config applied; reads throughput and memory from its log."""
+    out_dir = f"/tmp/autotune-{uuid.uuid4().hex[:8]}"
+    cmd = [
+        "tune", "run", "lora_finetune_single_device", "--config", recipe_path, *config.overrides(),
+        f"max_steps_per_epoch={AUTOTUNE_TRIAL_STEPS}", "log_every_n_steps=1", "log_peak_memory_stats=True",
+        f"output_dir={out_dir}", f"checkpointer.output_dir={out_dir}", f"metric_logger.log_dir={out_dir}/logs",
+        "save_adapter_weights_only=True",
+    ]
+    print(f"[autotune] {' '.join(config.overrides())}")
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            tail = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+            return TrialResult(config, error="out of memory" if "out of memory" in result.stderr.lower() else tail)
+        log_text = "\n".join(f.read_text() for f in Path(out_dir, "logs").glob("*.txt"))
+        tokens_per_sec, peak_memory_gb = parse_metric_log(log_text, AUTOTUNE_WARMUP_STEPS)
+        print(f"[autotune]   → {tokens_per_sec} tokens/s, peak {peak_memory_gb} GiB")
+        return TrialResult(config, tokens_per_sec=tokens_per_sec, peak_memory_gb=peak_memory_gb)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
 def run(cmd: list[str], label: str) -> None:
     print(f"[{label}] {' '.join(cmd)}")
     result = subprocess.run(cmd, text=True)
@@ -260,81 +652,152 @@ def run(cmd: list[str], label: str) -> None:
 @app.function(
     gpu=GPU,
     timeout=60 * 60 * 4,          # 4 hours: fine-tune + merge + quantize
-    volumes={"/output": vol},
+    volumes={"/output": vol, CACHE_ROOT: cache_vol},
     secrets=[modal.Secret.from_name("huggingface-secret")],
     cpu=4,
     memory=32768,
+    scaledown_window=CONTAINER_SCALEDOWN_S,
 )
-def finetune_and_quantize(dataset: dict | list) -> dict:
+def finetune_and_quantize(
+    dataset: dict | list,
+    job_id: str | None = None,
+    quants: list[str] | None = None,
+    imatrix: bool = False,
+    tune: bool = False,
+) -> dict:
     """
     Runs the full pipeline on a GPU container:
-      Step 1 — Download Llama 3.2 1B base weights from HuggingFace
-      Step 2 — Fine-tune with LoRA via torchtune
+      Step 1 — Load Llama 3.2 1B base weights (cache volume, downloaded once per commit)
+      Step 2 — Fine-tune with LoRA via torchtune (batch/compile/checkpointing from the
+               recorded auto-tune result, re-tuned first when tune=True)
       Step 3 — Merge LoRA adapter into full model weights (PEFT)
       Step 4 — Convert merged HF model → F16 GGUF  (llama.cpp)
-      Step 5 — Quantize F16 GGUF → Q4_K_M GGUF     (llama.cpp)
-      Step 6 — Persist final GGUF to Modal Volume
+      Step 5 — Quantize F16 GGUF → every requested quant in parallel (llama.cpp),
+               optionally with an importance matrix computed from the training set
+      Step 6 — Persist GGUFs + manifest.json to Modal Volume under jobs/<job_id>/
     """
-    import shutil
-
     import torch
-    from huggingface_hub import snapshot_download
     from peft import PeftModel
     from transformers import AutoModelForCausalLM, AutoTokenizer
 
+    entered_at = time.perf_counter()
+    job_id = job_id or uuid.uuid4().hex
+    quants = normalize_quants(quants)   # fail before training, not after
+    timer = StageTimer()
+    cache_hits: dict[str, bool] = {}
+
+    def enter_stage(name: str) -> None:
+        timer.begin(name)
+        write_job_status(job_id, name, timings=timer.timings, cache_hits=cache_hits)
+
     print(f"[info] GPU  : {torch.cuda.get_device_name(0)}")
+    print(f"[info] Job  : {job_id}")
+    print(f"[info] Quant: {', '.join(quants)}{' (imatrix)' if imatrix else ''}")
     print(f"[info] Steps: 6")
+    # Warm containers keep /tmp from the previous job.
+    for stale in (ADAPTER_DIR, MERGED_DIR):
+        shutil.rmtree(stale, ignore_errors=True)
 
     # ------------------------------------------------------------------
-    # Step 1 — Prepare dataset
+    # Step 1 — Base model + tokenizer (cached by commit)
     # ------------------------------------------------------------------
-    num_records = prepare_dataset(dataset)
+    hf_token = os.environ.get("HF_TOKEN")
+    enter_stage("download")
+    print(f"\n[1/5] Loading {BASE_MODEL}@{BASE_MODEL_REVISION} ...")
+    cache_vol.reload()
+    base_dir, cache_hits["base_model"] = cached_base_model(hf_token)
+    print(f"[1/5] Base model ready ({'cache hit' if cache_hits['base_model'] else 'downloaded'}): {base_dir}")
 
     # ------------------------------------------------------------------
-    # Step 2 — Download base model + tokenizer
+    # Step 2 — Prepare dataset (cached by content / dataset revision / tokenizer)
     # ------------------------------------------------------------------
-    hf_token = os.environ.get("HF_TOKEN")
-    print(f"\n[1/5] Downloading {BASE_MODEL} ...")
-    snapshot_download(
-        repo_id=BASE_MODEL,
-        local_dir=BASE_DIR,
-        token=hf_token,
-        ignore_patterns=["*.msgpack", "*.h5", "flax_*"],
-    )
-    snapshot_download(
-        repo_id=BASE_MODEL,
-        local_dir=TOKENIZER_DIR,
-        token=hf_token,
-        allow_patterns=["tokenizer*", "special_tokens_map.json"],
-    )
-    print("[1/5] Download complete.")
+    enter_stage("dataset")
+    dataset_path, dataset_stats, cache_hits["dataset"] = cached_prepared_dataset(dataset, base_dir)
+    # The perplexity records never reach training, so per-quant perplexity is measured on unseen text.
+    held_out = split_holdout(dataset_path, dataset_stats["num_records"], TRAIN_PATH, EVAL_TEXT_PATH)
+    num_records = dataset_stats["num_records"] - held_out
+    train_lengths = dataset_stats["lengths"][:num_records]
+    layout = sequence_layout(train_lengths, PACK_SEQUENCES, default_training_config().batch_size)
+    unpacked_layout = sequence_layout(train_lengths, False, BATCH_SIZE)
 
     # ------------------------------------------------------------------
     # Step 3 — LoRA fine-tuning (torchtune)
     # ------------------------------------------------------------------
-    print("\n[2/5] Fine-tuning with LoRA ...")
     os.makedirs(ADAPTER_DIR, exist_ok=True)
+    gpu_name = torch.cuda.get_device_name(0)
+    training_config = default_training_config()
+    record_path = autotune_record_path(gpu_name, training_config)
+    trials: list[TrialResult] = []
+    if tune:
+        enter_stage("autotune")
+        print(f"\n[2/5] Auto-tuning training throughput on {gpu_name} ...")
+        with open(RECIPE_PATH, "w") as f:
+            f.write(build_torchtune_config(TRAIN_PATH, ADAPTER_DIR, base_dir, training=training_config))
+        memory_limit_gb = torch.cuda.get_device_properties(0).total_memory / 1024**3 * AUTOTUNE_MEMORY_HEADROOM
+        best, trials = autotune(
+            lambda config: torchtune_trial(RECIPE_PATH, config),
+            training_config.effective_batch,
+            memory_limit_gb,
+        )
+        if best is not None:
+            save_tuned(record_path, best, trials, gpu=gpu_name, memory_limit_gb=round(memory_limit_gb, 2))
+            cache_vol.commit()
+        config_source = "autotune" if best else "default"
+        training_config = best or training_config
+    else:
+        recorded = load_tuned(record_path)
+        config_source = "recorded" if recorded else "default"
+        training_config = recorded or training_config
+    print(f"[2/5] Training config ({config_source}): {' '.join(training_config.overrides())}")
+
+    enter_stage("train")
+    print("\n[2/5] Fine-tuning with LoRA ...")
     with open(RECIPE_PATH, "w") as f:
-        f.write(build_torchtune_config(DATASET_PATH, ADAPTER_DIR))
+        f.write(build_torchtune_config(TRAIN_PATH, ADAPTER_DIR, base_dir, training=training_config))
 
+    seconds_to_training = round(time.perf_counter() - entered_at, 2)
+    print(f"[timing] job start → training launch: {seconds_to_training}s")
+    print(
+        f"[2/5] {num_records} records → {layout['samples']} {'packed ' if PACK_SEQUENCES else ''}sequences, "
+        f"padding {layout['padding_ratio']:.1%} (unpacked: {unpacked_layout['padding_ratio']:.1%})"
+    )
+    train_started = time.perf_counter()
     run(
         ["tune", "run", "lora_finetune_single_device", "--config", RECIPE_PATH, "resume_from_checkpoint=False"],
         label="torchtune",
     )
-    print("[2/5] Fine-tuning complete.")
+    train_seconds = time.perf_counter() - train_started
+    # Real (non-padding) tokens of the samples the capped run went through, over the
+    # whole torchtune run including model load.
+    samples_trained = min(layout["samples"], MAX_STEPS * training_config.effective_batch)
+    real_tokens = round(layout["real_tokens"] * samples_trained / max(1, layout["samples"]))
+    training = {
+        "packed": PACK_SEQUENCES,
+        "config": asdict(training_config),
+        "config_source": config_source,
+        "autotune_trials": [r.to_dict() for r in trials],
+        "samples_trained": samples_trained,
+        "real_tokens": real_tokens,
+        "padding_ratio": layout["padding_ratio"],
+        "padding_ratio_unpacked": unpacked_layout["padding_ratio"],
+        "train_seconds": round(train_seconds, 2),
+        "effective_tokens_per_sec": round(real_tokens / train_seconds, 1) if train_seconds else None,
+    }
+    print(f"[2/5] Fine-tuning complete: {real_tokens} real tokens, {training['effective_tokens_per_sec']} tokens/s.")
 
     # ------------------------------------------------------------------
     # Step 4 — Merge LoRA adapter into full weights (PEFT on CPU)
     # ------------------------------------------------------------------
+    enter_stage("merge")
     print("\n[3/5] Merging LoRA adapter into full model ...")
     os.makedirs(MERGED_DIR, exist_ok=True)
 
     base_model = AutoModelForCausalLM.from_pretrained(
-        BASE_DIR,
+        base_dir,
         torch_dtype=torch.float16,
         device_map="cpu",        # merge on CPU to keep VRAM free
     )
-    tokenizer = AutoTokenizer.from_pretrained(BASE_DIR)
+    tokenizer = AutoTokenizer.from_pretrained(base_dir)
 
     merged_model = PeftModel.from_pretrained(base_model, ADAPTER_DIR)
     merged_model = merged_model.merge_and_unload()
@@ -346,45 +809,19 @@ def finetune_and_quantize(dataset: dict | list) -> dict:
     print(f"[3/5] Merged model saved to {MERGED_DIR}.")
 
     # ------------------------------------------------------------------
-    # Locate prebuilt llama.cpp binaries
+    # Locate prebuilt llama.cpp binaries (cached for warm containers)
     # ------------------------------------------------------------------
-    def find_binary(name: str) -> str:
-        candidates = [
-            f"/app/{name}",
-            f"/app/build/bin/{name}",
-            f"/llama.cpp/build/bin/{name}",
-            f"/llama.cpp/{name}",
-            f"/usr/local/bin/{name}",
-            f"/usr/bin/{name}",
-        ]
-        for p in candidates:
-            if Path(p).exists():
-                return p
-        result = subprocess.run(["which", name], capture_output=True, text=True)
-        if result.returncode == 0:
-            return result.stdout.strip()
-        raise FileNotFoundError(f"Could not find binary: {name}. Tried: {candidates}")
-
-    def find_convert_script() -> str:
-        candidates = [
-            "/app/convert_hf_to_gguf.py",
-            "/llama.cpp/convert_hf_to_gguf.py",
-            "/llama.cpp/convert-hf-to-gguf.py",
-        ]
-        for p in candidates:
-            if Path(p).exists():
-                return p
-        raise FileNotFoundError(f"Could not find convert script. Tried: {candidates}")
-
     quantize_bin  = find_binary("llama-quantize")
+    perplexity_bin = find_binary("llama-perplexity")
     convert_script = find_convert_script()
     print(f"[paths] quantize  : {quantize_bin}")
     print(f"[paths] convert   : {convert_script}")
 
     # ------------------------------------------------------------------
-    # Step 5 — Convert merged model → F16 GGUF
+    # Step 5 — Convert merged model → F16 GGUF (single intermediate)
     # ------------------------------------------------------------------
     f16_gguf = "/tmp/model-f16.gguf"
+    enter_stage("convert")
     print("\n[4/5] Converting to F16 GGUF ...")
     run(
         [
@@ -398,31 +835,86 @@ def finetune_and_quantize(dataset: dict | list) -> dict:
     print(f"[4/5] F16 GGUF: {Path(f16_gguf).stat().st_size / 1024 / 1024:.1f} MB")
 
     # ------------------------------------------------------------------
-    # Step 6 — Quantize F16 GGUF → Q4_K_M
+    # Step 6 — Quantize F16 GGUF → all requested quants
     # ------------------------------------------------------------------
-    q4_gguf = "/tmp/model-q4_k_m.gguf"
-    print("\n[5/5] Quantizing to Q4_K_M ...")
-    run(
-        [quantize_bin, f16_gguf, q4_gguf, "Q4_K_M"],
-        label="quantize→Q4_K_M",
-    )
-    size_mb = Path(q4_gguf).stat().st_size / 1024 / 1024
-    print(f"[5/5] Q4_K_M GGUF: {size_mb:.1f} MB")
+    imatrix_path = None
+    if imatrix:
+        enter_stage("imatrix")
+        calibration = "/tmp/calibration.txt"
+        write_text_sample(TRAIN_PATH, calibration, IMATRIX_CALIBRATION_RECORDS)
+        imatrix_path = "/tmp/imatrix.dat"
+        run(
+            [find_binary("llama-imatrix"), "-m", f16_gguf, "-f", calibration, "-o", imatrix_path, "-ngl", "99"],
+            label="imatrix",
+        )
+
+    enter_stage("quantize")
+    print(f"\n[5/5] Quantizing to {', '.join(quants)} ...")
+    outputs = quantize_all(quantize_bin, f16_gguf, quants, imatrix_path)
+
+    enter_stage("perplexity")
+    # Without held-out records (tiny datasets) there is nothing fair to measure on.
+    baseline_ppl = measure_perplexity(perplexity_bin, f16_gguf, EVAL_TEXT_PATH) if held_out else None
+    manifest = []
+    for quant in quants:
+        size_bytes = Path(outputs[quant]).stat().st_size
+        ppl = measure_perplexity(perplexity_bin, outputs[quant], EVAL_TEXT_PATH) if held_out else None
+        print(f"[5/5] {quant}: {size_bytes / 1024 / 1024:.1f} MB, PPL {ppl} (F16 {baseline_ppl})")
+        manifest.append({
+            "quant": quant,
+            "file": gguf_file_name(quant),
+            "size_bytes": size_bytes,
+            "sha256": sha256_file(outputs[quant]),
+            "perplexity": ppl,
+        })
 
     # ------------------------------------------------------------------
     # Persist to Modal Volume
     # ------------------------------------------------------------------
-    os.makedirs("/output", exist_ok=True)
-    shutil.copy2(q4_gguf, GGUF_VOLUME_PATH)
-    vol.commit()
-
-    print(f"\n✅ Done — GGUF saved to volume at {GGUF_VOLUME_PATH}")
-    return {
-        "gguf_volume_path": GGUF_VOLUME_PATH,
-        "gguf_size_mb": round(size_mb, 1),
+    enter_stage("publish")
+    out_dir = job_output_dir(job_id)
+    os.makedirs(out_dir, exist_ok=True)
+    for quant in quants:
+        # Copy under a temporary name first: the artifact endpoint never serves a partial file.
+        target = f"{out_dir}/{gguf_file_name(quant)}"
+        shutil.copy2(outputs[quant], f"{target}.tmp")
+        os.replace(f"{target}.tmp", target)
+    with open(f"{out_dir}/manifest.json", "w") as f:
+        json.dump({
+            "job_id": job_id,
+            "base_model": BASE_MODEL,
+            "imatrix": bool(imatrix_path),
+            "baseline_perplexity": baseline_ppl,
+            "quants": manifest,
+        }, f, indent=2)
+
+    primary = manifest[0]
+    gguf_volume_path = f"{out_dir}/{primary['file']}"
+    result = {
+        "job_id": job_id,
+        "primary_quant": primary["quant"],
+        "gguf_volume_path": gguf_volume_path,
+        "gguf_size_mb": round(primary["size_bytes"] / 1024 / 1024, 1),
+        "gguf_size_bytes": primary["size_bytes"],
+        "gguf_sha256": primary["sha256"],
+        "artifacts": manifest,
+        "baseline_perplexity": baseline_ppl,
         "num_records": num_records,
-        "download_cmd": f"modal volume get finetune-vol {GGUF_VOLUME_PATH} ./model-q4_k_m.gguf",
+        "held_out_records": held_out,
+        "dataset": {k: v for k, v in dataset_stats.items() if k not in ("lengths", "revision")},
+        "training": training,
+        "download_cmd": f"modal volume get finetune-vol {gguf_volume_path.removeprefix(OUTPUT_ROOT)} ./{primary['file']}",
     }
+    timer.end()
+    result.update(
+        stage_seconds=timer.timings,
+        seconds_to_training=seconds_to_training,
+        cache_hits=cache_hits,
+    )
+    write_job_status(job_id, "done", **result)
+
+    print(f"\n✅ Done — {len(manifest)} GGUF(s) saved to volume under {out_dir}")
+    return result
 
 
 # ---------------------------------------------------------------------------
@@ -431,34 +923,98 @@ def finetune_and_quantize(dataset: dict | list) -> dict:
 
 @app.function(timeout=10)
 @modal.fastapi_endpoint(method="POST", docs=True)
-def finetune_endpoint(body: dict | list = Body(...)) -> dict:
+def finetune_endpoint(
+    body: dict | list = Body(...),
+    job_id: str | None = None,
+    quants: str | None = None,
+    imatrix: bool = False,
+    autotune: bool = False,
+) -> dict:
     """
     POST your dataset as a JSON array or config dict. Returns immediately with a job ID.
+    The caller may pick the job ID (?job_id=<32 hex chars>) to name the output folder,
+    and the quants to export (?quants=Q4_K_M,Q8_0&imatrix=true); ?autotune=true re-tunes
+    the training configuration before training.
     """
     if not body or not isinstance(body, (list, dict)):
         return {"error": "Body must be a JSON array of {prompt, response} objects, or a dict like {'dataset_name': 'ctf'}"}
+    if job_id is not None and not JOB_ID_RE.match(job_id):
+        return {"error": "job_id must be 32 lowercase hex characters"}
+
+    try:
+        quant_list = normalize_quants(quants)
+    except ValueError as exc:
+        return {"error": str(exc)}
 
-    call = finetune_and_quantize.spawn(body)
+    job_id = job_id or uuid.uuid4().hex
+    call = finetune_and_quantize.spawn(body, job_id, quant_list, imatrix, autotune)
+    output_path = f"{job_output_dir(job_id)}/{gguf_file_name(quant_list[0])}"
     return {
         "status": "started",
-        "job_id": call.object_id,
-        "pipeline": "LoRA fine-tune → merge → Q4_K_M GGUF",
+        "job_id": job_id,
+        "call_id": call.object_id,
+        "pipeline": f"LoRA fine-tune → merge → {', '.join(quant_list)} GGUF",
+        "quants": quant_list,
         "output_volume": "finetune-vol",
-        "output_path": GGUF_VOLUME_PATH,
-        "download_cmd": f"modal volume get finetune-vol {GGUF_VOLUME_PATH} ./model-q4_k_m.gguf",
+        "output_path": output_path,
+        "download_cmd": f"modal volume get finetune-vol {output_path.removeprefix(OUTPUT_ROOT)} ./{gguf_file_name(quant_list[0])}",
         "logs_cmd": "modal app logs llama32-gguf-finetune",
     }
 
 
+@app.function(timeout=30, volumes={OUTPUT_ROOT: vol})
+@modal.fastapi_endpoint(method="GET", docs=True)
+def finetune_status(call_id: str, job_id: str | None = None) -> dict:
+    """
+    Reports a spawned job: {"status": "running" | "done" | "failed", "stage", "result", "error"}.
+    """
+    stage = None
+    if job_id and JOB_ID_RE.match(job_id):
+        vol.reload()
+        status_path = Path(job_output_dir(job_id)) / "status.json"
+        if status_path.exists():
+            stage = json.loads(status_path.read_text()).get("stage")
+
+    try:
+        result = modal.FunctionCall.from_id(call_id).get(timeout=0)
+    except (modal.exception.TimeoutError, TimeoutError):
+        # get(timeout=0) reports an unfinished call with Modal's own TimeoutError.
+        return {"status": "running", "stage": stage}
+    except Exception as exc:
+        return {"status": "failed", "stage": stage, "error": str(exc)}
+    return {"status": "done", "stage": "done", "result": result}
+
+
+@app.function(timeout=60 * 30, volumes={OUTPUT_ROOT: vol})
+@modal.fastapi_endpoint(method="GET", docs=True)
+def finetune_artifact(job_id: str, quant: str = DEFAULT_QUANTS[0]):
+    """
+    Serves one of the job's GGUFs (HTTP Range supported, so interrupted downloads resume).
+    """
+    from fastapi import HTTPException
+    from fastapi.responses import FileResponse
+
+    if not JOB_ID_RE.match(job_id):
+        raise HTTPException(status_code=400, detail="job_id must be 32 lowercase hex characters")
+    quant = quant.strip().upper()
+    if quant not in SUPPORTED_QUANTS:
+        raise HTTPException(status_code=400, detail=f"Unsupported quant '{quant}'")
+    vol.reload()
+    path = Path(job_output_dir(job_id)) / gguf_file_name(quant)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Artifact not found (job still running, failed, or quant not exported)")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+
 # ---------------------------------------------------------------------------
 # CLI entrypoint
 # ---------------------------------------------------------------------------
 
 @app.local_entrypoint()
-def main(dataset: str = "dataset.json"):
+def main(dataset: str = "dataset.json", quants: str = "Q4_K_M", imatrix: bool = False, autotune: bool = False):
     """
     Run the full pipeline from the CLI:
-        modal run finetune.py --dataset your_data.json
+        modal run finetune.py --dataset your_data.json [--quants Q4_0,Q5_K_M,Q8_0] [--imatrix] [--autotune]
     """
     path = Path(dataset)
     if not path.exists():
@@ -480,12 +1036,22 @@ def main(dataset: str = "dataset.json"):
     else:
         print(f"[local] {len(records)} custom records detected — submitting to Modal ...")
 
-    result = finetune_and_quantize.remote(records)
+    result = finetune_and_quantize.remote(records, uuid.uuid4().hex, normalize_quants(quants), imatrix, autotune)
 
     print("\n✅ Pipeline complete!")
     print(f"   GGUF on Modal Volume : {result['gguf_volume_path']}")
     print(f"   Size                 : {result['gguf_size_mb']} MB")
+    for artifact in result["artifacts"]:
+        print(f"   {artifact['quant']:<20} : {artifact['size_bytes'] / 1024 / 1024:.1f} MB, PPL {artifact['perplexity']}")
     print(f"   Records used         : {result['num_records']}")
+    print(f"   Dataset filtering    : {result['dataset']}")
+    print(f"   Padding ratio        : {result['training']['padding_ratio']:.1%} "
+          f"(unpacked {result['training']['padding_ratio_unpacked']:.1%})")
+    print(f"   Effective tokens/sec : {result['training']['effective_tokens_per_sec']}")
+    print(f"   Training config      : {result['training']['config']} ({result['training']['config_source']})")
+    print(f"   Cache hits           : {result['cache_hits']}")
+    print(f"   Start → training     : {result['seconds_to_training']}s")
+    print(f"   Stage timings        : {result['stage_seconds']}")
     print()
     print("Download your model:")
     print(f"   {result['download_cmd']}")
\ No newline at end of file
@@ -1,5 +1,5 @@
 import React, { useEffect, useRef, useState } from "react";
-import { sendChatMessage } from "./api";
+import { streamChatMessage } from "./api";
 // Correction du chemin : ./assets au lieu de ../assets car ce fichier est dans src/
 import brandLogo from "./assets/Logo.png"; 
 
@@ -24,15 +24,26 @@ export default function ChatInterface({ selectedModel, uploadedFiles = [], onNav
     setInput("");
     setIsLoading(true);
 
+    // Le message assistant est ajouté vide puis rempli au fil des tokens reçus
+    const updateReply = (patch) => setMessages(prev => {
+      const next = [...prev];
+      next[next.length - 1] = { ...next[next.length - 1], ...patch };
+      return next;
+    });
+    setMessages(prev => [...prev, { role: "slm", content: "", sources: [] }]);
+
     try {
-      const res = await sendChatMessage({
+      const res = await streamChatMessage({
         message: userMsg.content,
         selectedModel: selectedModel.name,
         selectedModelId: selectedModel.id,
         documentIds: uploadedFiles.map(f => f.documentId),
+        onSources: (sources) => updateReply({ sources }),
+        onToken: (_, answer) => updateReply({ content: answer }),
       });
-      setMessages(prev => [...prev, { role: "slm", content: res.answer, sources: res.sources }]);
+      updateReply({ content: res.answer, sources: res.sources });
     } catch (err) { 
+      setMessages(prev => prev.filter((m, i) => i < prev.length - 1 || m.content));
       alert(err.message); 
     }
     setIsLoading(false);
@@ -91,7 +102,7 @@ export default function ChatInterface({ selectedModel, uploadedFiles = [], onNav
                 <div className="mt-4 flex flex-wrap gap-2">
                   {msg.sources.map((s, si) => (
                     <span key={si} className="text-[9px] border border-[var(--brand-line)] px-2 py-0.5 rounded text-[var(--muted-ink)]">
-                      Ref: {s.title} (p.{s.page})
+                      Ref: {s.title} (p.{s.pageEnd && s.pageEnd !== s.page ? `${s.page}-${s.pageEnd}` : s.page})
                     </span>
                   ))}
                 </div>
@@ -11,7 +11,10 @@ export default function DiscoverModels({ onNavigate }) {
     setDownloadMessage("");
     setDownloadingId(entry.id);
     try {
-      const result = await downloadModelGguf({ modelId: entry.id });
+      const result = await downloadModelGguf({
+        modelId: entry.id,
+        onProgress: (job) => setDownloadMessage(`⬇️ ${entry.name}: ${Math.round((job.progress || 0) * 100)}%`),
+      });
       setDownloadMessage(`✅ ${entry.name} saved to ${result.targetDir}`);
     } catch (error) {
       setDownloadMessage(`❌ ${error.message || "Download failed."}`);
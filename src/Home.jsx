@@ -5,6 +5,7 @@ import {
   ingestSinglePdf, 
   initializeBackend, 
   downloadFinetunedModel, 
+  fetchFinetuneJob,
   startFinetuning 
 } from "./api";
 
@@ -24,6 +25,28 @@ export default function Home({ onNavigate, onStartChat }) {
 
   useEffect(() => { initializeBackend().catch(() => {}); }, []);
 
+  // Le backend suit le job Modal et télécharge le GGUF tout seul : on affiche son état
+  useEffect(() => {
+    if (!finetuneJobId) return undefined;
+    const timer = setInterval(async () => {
+      try {
+        const job = await fetchFinetuneJob(finetuneJobId);
+        if (job.status === "ready") {
+          setModalStatus(`✅ ${job.customName} is now available in 'Your Models'.`);
+          setIsTraining(false);
+          clearInterval(timer);
+        } else if (job.status === "failed") {
+          setModalStatus(`❌ Error: ${job.error || "fine-tuning failed"}`);
+          setIsTraining(false);
+          clearInterval(timer);
+        } else {
+          setModalStatus(`⚙️ ${job.status}${job.stage ? ` (${job.stage})` : ""} — ID: ${finetuneJobId}`);
+        }
+      } catch { /* on réessaie au prochain tick */ }
+    }, 5000);
+    return () => clearInterval(timer);
+  }, [finetuneJobId]);
+
   const visibleModels = useMemo(() => SLM_DOWNLOADS.slice(0, 3), []);
 
   const handleDrop = async (e) => {
@@ -48,11 +71,11 @@ export default function Home({ onNavigate, onStartChat }) {
     
     try {
       // On envoie 'datasetName' comme attendu par le backend
-      const data = await startFinetuning({ datasetName: "cybersec" });
+      const data = await startFinetuning({ datasetName: "cybersec", customName: `${selectedModel.id}-cybersec` });
       
-      if (data.job_id) {
-        setFinetuneJobId(data.job_id);
-        setModalStatus(`⚙️ Training in progress (ID: ${data.job_id})`);
+      if (data.jobId) {
+        setFinetuneJobId(data.jobId);
+        setModalStatus(`⚙️ Training in progress (ID: ${data.jobId})`);
       }
     } catch (err) {
       setModalStatus(`❌ Error: ${err.message}`);
@@ -67,7 +90,11 @@ export default function Home({ onNavigate, onStartChat }) {
     setIsDownloading(true);
     setModalStatus("⬇️ Downloading GGUF from cloud...");
     try {
-      await downloadFinetunedModel({ customName: name });
+      await downloadFinetunedModel({
+        customName: name,
+        jobId: finetuneJobId,
+        onProgress: (job) => setModalStatus(`⬇️ Downloading GGUF from cloud... ${Math.round(job.progress * 100)}%`),
+      });
       setModalStatus(`✅ ${name} is now available in 'Your Models'.`);
     } catch (err) {
       setModalStatus(`❌ Download error: ${err.message}`);
@@ -29,7 +29,21 @@ export async function initializeBackend() {
   return parseJsonSafe(response);
 }
 
-export async function ingestSinglePdf(file) {
+export async function fetchIngestJob(jobId) {
+  const response = await fetch(buildUrl(`/api/ingest/jobs/${encodeURIComponent(jobId)}`), {
+    method: "GET", // Correspond à @app.get("/api/ingest/jobs/{job_id}")
+  });
+
+  const payload = await parseJsonSafe(response);
+  if (!response.ok) {
+    const detail = payload.detail || payload.message || "Failed to fetch ingest job.";
+    throw new Error(typeof detail === "string" ? detail : JSON.stringify(detail));
+  }
+
+  return payload;
+}
+
+export async function ingestSinglePdf(file, { onProgress, pollIntervalMs = 1000 } = {}) {
   const formData = new FormData();
   formData.append("files", file);
 
@@ -44,7 +58,21 @@ export async function ingestSinglePdf(file) {
     throw new Error(typeof detail === "string" ? detail : JSON.stringify(detail));
   }
 
-  const first = Array.isArray(payload.results) ? payload.results[0] : null;
+  let first = Array.isArray(payload.results) ? payload.results[0] : null;
+  if (!first && Array.isArray(payload.errors) && payload.errors[0]) {
+    throw new Error(payload.errors[0].error || "Failed to ingest PDF.");
+  }
+
+  // L'ingestion tourne en arrière-plan : on suit le job jusqu'à la fin
+  while (first && first.jobId && first.status !== "done" && first.status !== "failed") {
+    onProgress?.(first);
+    await new Promise((resolve) => setTimeout(resolve, pollIntervalMs));
+    first = await fetchIngestJob(first.jobId);
+  }
+
+  if (first?.status === "failed") {
+    throw new Error(first.error || "Failed to ingest PDF.");
+  }
   if (!first || typeof first.documentId !== "number") {
     throw new Error("Invalid ingest response from backend.");
   }
@@ -76,7 +104,94 @@ export async function sendChatMessage({ message, selectedModel, selectedModelId,
   return payload;
 }
 
-export async function downloadModelGguf({ modelId }) {
+/**
+ * Variante streaming de sendChatMessage (NDJSON).
+ * Correspond à @app.post("/api/chat/stream") : sources, puis tokens, puis un événement "done" avec les stats.
+ */
+export async function streamChatMessage({
+  message,
+  selectedModel,
+  selectedModelId,
+  documentIds,
+  topK = 5,
+  onSources,
+  onToken,
+}) {
+  const response = await fetch(buildUrl("/api/chat/stream"), {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      message,
+      selectedModel,
+      selectedModelId,
+      documentIds,
+      topK,
+    }),
+  });
+
+  if (!response.ok || !response.body) {
+    const payload = await parseJsonSafe(response);
+    const detail = payload.detail || payload.message || "Chat request failed.";
+    throw new Error(typeof detail === "string" ? detail : JSON.stringify(detail));
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let answer = "";
+  let sources = [];
+  let stats = null;
+
+  const handleLine = (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    const event = JSON.parse(line);
+    if (event.type === "sources") {
+      sources = event.sources || [];
+      onSources?.(sources);
+    } else if (event.type === "token") {
+      answer += event.content;
+      onToken?.(event.content, answer);
+    } else if (event.type === "done") {
+      stats = event;
+    } else if (event.type === "error") {
+      throw new Error(event.detail || "Chat request failed.");
+    }
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer + decoder.decode());
+
+  return { answer: answer.trim(), sources, stats };
+}
+
+export async function fetchDownloadJob(jobId) {
+  const response = await fetch(buildUrl(`/api/models/downloads/${encodeURIComponent(jobId)}`), {
+    method: "GET", // Correspond à @app.get("/api/models/downloads/{job_id}")
+  });
+
+  const payload = await parseJsonSafe(response);
+  if (!response.ok) {
+    const detail = payload.detail || payload.message || "Failed to fetch download job.";
+    throw new Error(typeof detail === "string" ? detail : JSON.stringify(detail));
+  }
+
+  return payload;
+}
+
+export async function downloadModelGguf({ modelId, onProgress, pollIntervalMs = 1000 }) {
   const response = await fetch(buildUrl("/api/models/download"), {
     method: "POST", // Correspond à @app.post("/api/models/download")
     headers: {
@@ -85,12 +200,23 @@ export async function downloadModelGguf({ modelId }) {
     body: JSON.stringify({ modelId }),
   });
 
-  const payload = await parseJsonSafe(response);
+  let payload = await parseJsonSafe(response);
   if (!response.ok) {
     const detail = payload.detail || payload.message || "Model download failed.";
     throw new Error(typeof detail === "string" ? detail : JSON.stringify(detail));
   }
 
+  // Le téléchargement tourne en arrière-plan : on suit le job jusqu'à la fin
+  while (payload.jobId && payload.status !== "done" && payload.status !== "failed") {
+    onProgress?.(payload);
+    await new Promise((resolve) => setTimeout(resolve, pollIntervalMs));
+    payload = await fetchDownloadJob(payload.jobId);
+  }
+
+  if (payload.status === "failed") {
+    throw new Error(payload.error || "Model download failed.");
+  }
+
   return payload;
 }
 
@@ -110,15 +236,15 @@ export async function fetchLocalModels() {
 
 /**
  * Télécharge le modèle fine-tuné depuis Modal vers le stockage local.
- * Correspond à @app.post("/api/finetune/download")
+ * Correspond à @app.post("/api/finetune/download") (202 + downloadId, puis suivi du téléchargement)
  */
-export async function downloadFinetunedModel({ customName }) {
+export async function downloadFinetunedModel({ customName, jobId, onProgress, pollIntervalMs = 1000 }) {
   const response = await fetch(buildUrl("/api/finetune/download"), {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ customName }), // Attend customName comme défini dans FinetuneDownloadRequest
+    body: JSON.stringify({ customName, jobId }), // Attend customName (et jobId) comme défini dans FinetuneDownloadRequest
   });
 
   const payload = await parseJsonSafe(response);
@@ -127,20 +253,32 @@ export async function downloadFinetunedModel({ customName }) {
     throw new Error(typeof detail === "string" ? detail : JSON.stringify(detail));
   }
 
-  return payload;
+  // Le backend répond tout de suite : on suit le téléchargement comme pour les modèles du catalogue
+  let download = await fetchDownloadJob(payload.downloadId);
+  while (download.status !== "done" && download.status !== "failed") {
+    onProgress?.(download);
+    await new Promise((resolve) => setTimeout(resolve, pollIntervalMs));
+    download = await fetchDownloadJob(payload.downloadId);
+  }
+
+  if (download.status === "failed") {
+    throw new Error(download.error || "Failed to download fine-tuned model.");
+  }
+
+  return { ...download, jobId: payload.jobId, downloadId: payload.downloadId };
 }
 
 /**
  * Déclenche le job de fine-tuning sur Modal.
  * Adapté pour correspondre à @app.post("/api/finetune")
  */
-export async function startFinetuning({ datasetName }) {
+export async function startFinetuning({ datasetName, customName }) {
   // Changement de l'URL vers /api/finetune pour correspondre au backend
   const response = await fetch(buildUrl("/api/finetune"), {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     // Attend datasetName comme défini dans FinetuneRequest
-    body: JSON.stringify({ datasetName }), 
+    body: JSON.stringify({ datasetName, customName }),
   });
 
   const payload = await parseJsonSafe(response);
@@ -148,4 +286,20 @@ export async function startFinetuning({ datasetName }) {
     throw new Error(payload.detail || payload.message || "Fine-tuning failed to start.");
   }
   return payload;
-}
\ No newline at end of file
+}
+
+/**
+ * Suit un job de fine-tuning (statut, étape Modal, téléchargement automatique).
+ * Correspond à @app.get("/api/finetune/{job_id}")
+ */
+export async function fetchFinetuneJob(jobId) {
+  const response = await fetch(buildUrl(`/api/finetune/${encodeURIComponent(jobId)}`), {
+    method: "GET",
+  });
+
+  const payload = await parseJsonSafe(response);
+  if (!response.ok) {
+    throw new Error(payload.detail || payload.message || "Failed to fetch fine-tune job.");
+  }
+  return payload;
+}
@@ -0,0 +1,89 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+
+# The backend uses flat imports (run from backend/), modal_app helpers live at the root.
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+class FileServer:
+    """Serves in-memory files over HTTP with Range support and records what was asked."""
+
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.json_routes: dict[str, object] = {}
+        # Status codes answered (one per request) before a path is served normally.
+        self.errors: dict[str, list[int]] = {}
+        self.requests: list[tuple[str, str | None]] = []
+        self.delay_s = 0.0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                server.requests.append((self.path, self.headers.get("Range")))
+                if length := int(self.headers.get("Content-Length") or 0):
+                    self.rfile.read(length)
+                if server.errors.get(path):
+                    return self._send(server.errors[path].pop(0), b"try again")
+                if path in server.json_routes:
+                    route = server.json_routes[path]
+                    return self._send(200, json.dumps(route(self.path) if callable(route) else route).encode())
+                if path not in server.files:
+                    return self._send(404, b"not found")
+                data = server.files[path]
+                start = 0
+                if self.headers.get("Range"):
+                    start = int(self.headers["Range"].removeprefix("bytes=").split("-")[0])
+                    if start >= len(data):
+                        return self._send(416, b"")
+                time.sleep(server.delay_s)
+                self.send_response(206 if start else 200)
+                self.send_header("Content-Length", str(len(data) - start))
+                if start:
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                self.end_headers()
+                self.wfile.write(data[start:])
+
+            do_POST = do_GET
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    yield server
+    server.close()
+
+
+def wait_for(predicate, timeout_s: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.02)
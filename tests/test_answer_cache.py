@@ -0,0 +1,33 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+
+
+def make_key(cache, tmp_path, chunks):
+    model = tmp_path / "model.gguf"
+    if not model.exists():
+        model.write_bytes(b"GGUF")
+    return cache.key_for(model, chunks)
+
+
+def test_ingest_invalidates_cached_answers(tmp_path):
+    cache = SemanticAnswerCache(enabled=True)
+    chunks = [{"chunk_id": 1, "document_id": 1}]
+    query = np.ones(4, dtype=np.float32)
+    cache.put(make_key(cache, tmp_path, chunks), query, "old answer")
+    assert cache.get(make_key(cache, tmp_path, chunks), query) == "old answer"
+
+    # A changed version of document 1 is ingested under a new id.
+    cache.invalidate_corpus()
+    assert cache.get(make_key(cache, tmp_path, chunks), query) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_deleted_document_invalidates_its_answers(tmp_path):
+    cache = SemanticAnswerCache(enabled=True)
+    query = np.ones(4, dtype=np.float32)
+    cache.put(make_key(cache, tmp_path, [{"chunk_id": 1, "document_id": 1}]), query, "from 1")
+    cache.put(make_key(cache, tmp_path, [{"chunk_id": 2, "document_id": 2}]), query, "from 2")
+    cache.invalidate_documents([1])
+    assert cache.get(make_key(cache, tmp_path, [{"chunk_id": 1, "document_id": 1}]), query) is None
+    assert cache.get(make_key(cache, tmp_path, [{"chunk_id": 2, "document_id": 2}]), query) == "from 2"
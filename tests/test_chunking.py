@@ -0,0 +1,92 @@
+import pytest
+
+from chunking import Chunk, ChunkingConfig, TokenChunker, chunk_pages, split_sentences
+
+
+def count_words(texts: list[str]) -> list[int]:
+    return [len(text.split()) for text in texts]
+
+
+PAGES = [
+    (1, "One two three four. Five six seven eight."),
+    (2, "Nine ten eleven twelve. Thirteen fourteen fifteen sixteen."),
+]
+
+
+def chunks(pages, **config) -> list[Chunk]:
+    return list(chunk_pages(pages, ChunkingConfig(strategy="tokens", **config), count_words))
+
+
+def test_split_sentences_joins_wrapped_lines():
+    text = "A sentence wrapped\nover two lines. Next one!\n\nNew paragraph"
+    assert split_sentences(text) == ["A sentence wrapped over two lines.", "Next one!", "New paragraph"]
+
+
+def test_sentences_are_packed_up_to_the_budget():
+    result = chunks(PAGES, max_tokens=8, overlap_tokens=0)
+    assert [c.text for c in result] == [
+        "One two three four. Five six seven eight.",
+        "Nine ten eleven twelve. Thirteen fourteen fifteen sixteen.",
+    ]
+    assert [(c.page, c.page_end) for c in result] == [(1, 1), (2, 2)]
+
+
+def test_chunks_span_pages_and_record_page_end():
+    result = chunks(PAGES, max_tokens=12, overlap_tokens=0)
+    assert [(c.page, c.page_end) for c in result] == [(1, 2), (2, 2)]
+    assert result[0].text.endswith("Nine ten eleven twelve.")
+    assert result[1].text == "Thirteen fourteen fifteen sixteen."
+
+
+def test_overlap_repeats_trailing_sentences():
+    result = chunks(PAGES, max_tokens=10, overlap_tokens=4)
+    assert [c.text for c in result] == [
+        "One two three four. Five six seven eight.",
+        "Five six seven eight. Nine ten eleven twelve.",
+        "Nine ten eleven twelve. Thirteen fourteen fifteen sixteen.",
+    ]
+    assert [(c.page, c.page_end) for c in result] == [(1, 1), (1, 2), (2, 2)]
+
+
+def test_overlap_is_dropped_when_it_leaves_no_room():
+    pages = [(1, "One two three four five six. Seven eight nine ten eleven twelve.")]
+    result = chunks(pages, max_tokens=10, overlap_tokens=5)
+    # The 6-token sentence is over the 5-token overlap, so nothing is repeated.
+    assert [c.text for c in result] == ["One two three four five six.", "Seven eight nine ten eleven twelve."]
+
+
+def test_long_sentence_is_split_on_words():
+    words = [f"w{i}" for i in range(20)]
+    result = chunks([(3, " ".join(words) + ".")], max_tokens=8, overlap_tokens=0)
+    assert all(len(c.text.split()) <= 8 for c in result)
+    assert " ".join(c.text for c in result).rstrip(".").split() == words
+    assert {(c.page, c.page_end) for c in result} == {(3, 3)}
+
+
+@pytest.mark.parametrize("max_tokens, overlap_tokens, expected", [
+    (2, 0, (8, 0)),          # chunkTokens below the floor
+    (100, 80, (100, 50)),    # chunkOverlapTokens capped at half the budget
+    (100, -5, (100, 0)),     # negative overlap
+    (100, 20, (100, 20)),
+])
+def test_token_and_overlap_bounds(max_tokens, overlap_tokens, expected):
+    chunker = TokenChunker(ChunkingConfig(max_tokens=max_tokens, overlap_tokens=overlap_tokens), count_words)
+    assert (chunker.max_tokens, chunker.overlap_tokens) == expected
+
+
+def test_empty_pages_are_skipped():
+    assert chunks([(1, "   "), (2, "Only text here.")], max_tokens=8) == [Chunk(2, 2, "Only text here.")]
+
+
+def test_char_chunker_stays_on_its_page():
+    config = ChunkingConfig(strategy="chars", chunk_chars=10, overlap_chars=2)
+    result = list(chunk_pages([(4, "abcdefghijklmnop")], config))
+    assert [c.text for c in result] == ["abcdefghij", "ijklmnop"]
+    assert {(c.page, c.page_end) for c in result} == {(4, 4)}
+
+
+def test_unknown_strategy_or_missing_counter():
+    with pytest.raises(ValueError):
+        list(chunk_pages(PAGES, ChunkingConfig(strategy="words"), count_words))
+    with pytest.raises(ValueError):
+        list(chunk_pages(PAGES, ChunkingConfig(strategy="tokens")))
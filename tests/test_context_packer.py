@@ -0,0 +1,97 @@
+from context_packer import MIN_OVERLAP_CHARS, MIN_PARTIAL_TOKENS, merge_adjacent_chunks, pack_context
+
+
+def chunk(chunk_id, content, document_id=1, page=1, page_end=None, score=0.5):
+    return {"chunk_id": chunk_id, "document_id": document_id, "page": page, "page_end": page_end or page,
+            "content": content, "score": score}
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+SHARED = "Shared sentence that overlaps both chunks."
+
+
+def test_overlap_is_stripped_exactly():
+    groups = merge_adjacent_chunks([
+        chunk(1, f"Alpha sentence one.  {SHARED}"),
+        chunk(2, f"{SHARED}\nBeta sentence two."),
+    ])
+    assert len(groups) == 1
+    assert groups[0]["content"] == f"Alpha sentence one. {SHARED} Beta sentence two."
+    assert groups[0]["markers"] == [1, 2]
+
+
+def test_whole_chunk_overlap_adds_nothing():
+    groups = merge_adjacent_chunks([chunk(1, f"Alpha. {SHARED}"), chunk(2, SHARED)])
+    assert groups[0]["content"] == f"Alpha. {SHARED}"
+
+
+def test_short_overlap_is_not_stripped():
+    tail = "x" * (MIN_OVERLAP_CHARS - 1)
+    groups = merge_adjacent_chunks([chunk(1, f"Alpha {tail}"), chunk(2, f"{tail} beta")])
+    assert groups[0]["content"] == f"Alpha {tail} {tail} beta"
+
+
+def test_overlap_of_exactly_the_minimum_is_stripped():
+    tail = "y" * MIN_OVERLAP_CHARS
+    groups = merge_adjacent_chunks([chunk(1, f"Alpha {tail}"), chunk(2, f"{tail} beta")])
+    assert groups[0]["content"] == f"Alpha {tail} beta"
+
+
+def test_chain_of_adjacent_chunks_keeps_best_score_and_last_page():
+    groups = merge_adjacent_chunks([
+        chunk(1, "First part.", page=1, score=0.2),
+        chunk(2, "Second part.", page=1, page_end=2, score=0.9),
+        chunk(3, "Third part.", page=3, score=0.4),
+    ])
+    assert len(groups) == 1
+    assert groups[0]["content"] == "First part. Second part. Third part."
+    assert groups[0]["score"] == 0.9
+
+
+def test_only_adjacent_chunks_of_one_document_merge():
+    groups = merge_adjacent_chunks([
+        chunk(1, "a"),
+        chunk(3, "gap in chunk ids"),
+        chunk(4, "other document", document_id=2),
+        chunk(5, "page gap", document_id=2, page=5),
+    ])
+    assert [g["markers"] for g in groups] == [[1], [2], [3], [4]]
+
+
+def test_budget_keeps_best_groups_in_corpus_order():
+    words = lambda n, w: " ".join([w] * n)
+    lines, stats = pack_context(
+        [
+            chunk(1, words(30, "low"), score=0.1),
+            chunk(10, words(40, "mid"), score=0.5),
+            chunk(20, words(50, "top"), score=0.9),
+        ],
+        count_words,
+        100,
+    )
+    # top (50) and mid (40) fit; 10 tokens are left, under MIN_PARTIAL_TOKENS, so low is dropped.
+    assert [line.split()[0] for line in lines] == ["[S2]", "[S3]"]
+    assert stats == {"contextTokens": 90, "contextBudgetTokens": 100, "contextChunks": 2,
+                     "mergedChunks": 0, "droppedChunks": 1}
+
+
+def test_partial_group_fills_the_remaining_budget():
+    remaining = MIN_PARTIAL_TOKENS + 10
+    lines, stats = pack_context(
+        [chunk(1, " ".join(["top"] * 100), score=0.9), chunk(5, " ".join(["cut"] * 200), score=0.1)],
+        count_words,
+        100 + remaining,
+    )
+    assert len(lines) == 2
+    assert lines[1].startswith("[S2] cut") and lines[1].endswith("...")
+    assert stats["contextTokens"] <= 100 + remaining
+    assert count_words(lines[1]) - 1 <= remaining
+
+
+def test_merged_chunks_are_counted_once():
+    lines, stats = pack_context([chunk(1, f"Alpha. {SHARED}"), chunk(2, f"{SHARED} Beta.")], count_words, 1000)
+    assert lines == [f"[S1, S2] Alpha. {SHARED} Beta."]
+    assert stats["contextChunks"] == 2 and stats["mergedChunks"] == 1 and stats["droppedChunks"] == 0
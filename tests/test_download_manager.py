@@ -0,0 +1,117 @@
+import hashlib
+
+import pytest
+
+from conftest import wait_for
+from download_manager import DownloadFile, DownloadManager
+
+DATA = bytes(range(256)) * 4096  # 1 MiB
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = DownloadManager(root=tmp_path, retries=0)
+    yield manager
+    manager.shutdown()
+
+
+def finished(manager, job):
+    wait_for(lambda: manager.get(job.id).status in ("done", "failed"))
+    return manager.get(job.id)
+
+
+def test_resumes_from_part_file(manager, file_server, tmp_path):
+    file_server.files["/model.gguf"] = DATA
+    download = DownloadFile(f"{file_server.url}/model.gguf", tmp_path / "m" / "model.gguf", len(DATA), hashlib.sha256(DATA).hexdigest())
+    partial = manager._partial_path(download)
+    partial.parent.mkdir(parents=True)
+    partial.write_bytes(DATA[:300_000])
+
+    job = finished(manager, manager.submit_files("k", "m", tmp_path / "m", [download]))
+
+    assert job.status == "done", job.error
+    assert download.target.read_bytes() == DATA
+    assert not partial.exists()
+    assert file_server.requests == [("/model.gguf", "bytes=300000-")]
+    assert job.to_dict()["bytesDone"] == len(DATA)
+
+
+def test_unsatisfiable_resume_restarts_from_zero(manager, file_server, tmp_path):
+    file_server.files["/model.gguf"] = DATA
+    file_server.errors["/model.gguf"] = [416]
+    download = DownloadFile(f"{file_server.url}/model.gguf", tmp_path / "m" / "model.gguf", len(DATA), hashlib.sha256(DATA).hexdigest())
+    partial = manager._partial_path(download)
+    partial.parent.mkdir(parents=True)
+    partial.write_bytes(b"stale bytes from another revision")
+
+    job = finished(manager, manager.submit_files("k", "m", tmp_path / "m", [download]))
+
+    assert job.status == "done", job.error
+    assert download.target.read_bytes() == DATA
+    assert file_server.requests == [("/model.gguf", "bytes=33-"), ("/model.gguf", None)]
+
+
+@pytest.mark.parametrize("size, sha256", [
+    (len(DATA) + 1, None),
+    (len(DATA), "0" * 64),
+])
+def test_mismatch_keeps_existing_target(manager, file_server, tmp_path, size, sha256):
+    file_server.files["/model.gguf"] = DATA
+    target = tmp_path / "m" / "model.gguf"
+    target.parent.mkdir()
+    target.write_bytes(b"previous model")
+    download = DownloadFile(f"{file_server.url}/model.gguf", target, size, sha256)
+
+    job = finished(manager, manager.submit_files("k", "m", tmp_path / "m", [download]))
+
+    assert job.status == "failed"
+    assert "mismatch" in job.error
+    assert target.read_bytes() == b"previous model"
+
+
+def test_concurrent_submits_share_one_job(manager, file_server, tmp_path):
+    file_server.files["/model.gguf"] = DATA
+    file_server.delay_s = 0.3
+    download = DownloadFile(f"{file_server.url}/model.gguf", tmp_path / "m" / "model.gguf", len(DATA))
+
+    first = manager.submit_files("finetune:1", "m", tmp_path / "m", [download])
+    second = manager.submit_files("finetune:1", "m", tmp_path / "m", [download])
+    other = manager.submit_files("finetune:2", "m2", tmp_path / "m2", [DownloadFile(download.url, tmp_path / "m2" / "model.gguf", len(DATA))])
+
+    assert second is first
+    assert other.id != first.id
+    assert finished(manager, first).status == "done"
+    assert finished(manager, other).status == "done"
+    assert sum(1 for path, _ in file_server.requests if path == "/model.gguf") == 2
+
+    # Once finished, the key is free again: a new submit is a new job (skipping the verified file).
+    again = finished(manager, manager.submit_files("finetune:1", "m", tmp_path / "m", [download]))
+    assert again.id != first.id and again.status == "done"
+    assert sum(1 for path, _ in file_server.requests if path == "/model.gguf") == 2
+
+
+@pytest.mark.parametrize("status", [503, 429])
+def test_retries_server_errors(tmp_path, file_server, status):
+    manager = DownloadManager(root=tmp_path, retries=2, backoff_s=0.0)
+    file_server.files["/model.gguf"] = DATA
+    file_server.errors["/model.gguf"] = [status, status]
+    download = DownloadFile(f"{file_server.url}/model.gguf", tmp_path / "m" / "model.gguf", len(DATA))
+
+    job = finished(manager, manager.submit_files("k", "m", tmp_path / "m", [download]))
+    manager.shutdown()
+
+    assert job.status == "done", job.error
+    assert download.target.read_bytes() == DATA
+    assert len(file_server.requests) == 3
+
+
+def test_client_errors_are_not_retried(tmp_path, file_server):
+    manager = DownloadManager(root=tmp_path, retries=2, backoff_s=0.0)
+    download = DownloadFile(f"{file_server.url}/missing.gguf", tmp_path / "m" / "missing.gguf")
+
+    job = finished(manager, manager.submit_files("k", "m", tmp_path / "m", [download]))
+    manager.shutdown()
+
+    assert job.status == "failed"
+    assert "404" in job.error
+    assert len(file_server.requests) == 1
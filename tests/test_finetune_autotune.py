@@ -0,0 +1,120 @@
+from finetune_autotune import (
+    TrainingConfig,
+    TrialResult,
+    autotune,
+    candidate_configs,
+    parse_metric_log,
+    run_trials,
+    select_best,
+)
+
+
+class FakeRunner:
+    """Memory grows with the batch; checkpointing cuts memory and speed, compile adds speed."""
+
+    def __init__(self, memory_per_sample: float = 5.0, base_memory: float = 3.0) -> None:
+        self.memory_per_sample = memory_per_sample
+        self.base_memory = base_memory
+        self.calls: list[TrainingConfig] = []
+
+    def __call__(self, config: TrainingConfig) -> TrialResult:
+        self.calls.append(config)
+        per_sample = self.memory_per_sample * (0.4 if config.activation_checkpointing else 1.0)
+        memory = self.base_memory + per_sample * config.batch_size
+        if memory > 24:
+            return TrialResult(config, error="out of memory")
+        speed = 1000 * config.batch_size ** 0.5 * (1.3 if config.compile else 1.0)
+        speed *= 0.7 if config.activation_checkpointing else 1.0
+        return TrialResult(config, tokens_per_sec=speed, peak_memory_gb=memory)
+
+
+def test_candidates_keep_effective_batch():
+    configs = candidate_configs(8)
+    assert configs
+    assert {c.effective_batch for c in configs} == {8}
+    assert {c.batch_size for c in configs} == {1, 2, 4, 8}
+    assert len(configs) == 4 * 2 * 2
+
+
+def test_candidates_skip_batch_sizes_that_do_not_divide():
+    assert {c.batch_size for c in candidate_configs(6, batch_sizes=(1, 2, 4, 8))} == {1, 2}
+
+
+def test_group_stops_at_first_oom():
+    runner = FakeRunner()
+    results = run_trials(runner, candidate_configs(16, compile_options=(False,), checkpointing_options=(False,)), 100.0)
+    # 1, 2, 4 fit (8, 13, 23 GiB), 8 runs out of memory, 16 is never tried.
+    assert [c.batch_size for c in runner.calls] == [1, 2, 4, 8]
+    assert results[-1].error == "out of memory"
+
+
+def test_group_stops_at_first_batch_over_the_memory_limit():
+    runner = FakeRunner()
+    run_trials(runner, candidate_configs(16, compile_options=(False,), checkpointing_options=(False,)), 10.0)
+    assert [c.batch_size for c in runner.calls] == [1, 2]
+
+
+def test_checkpointing_only_tried_where_needed():
+    runner = FakeRunner()
+    run_trials(runner, candidate_configs(8, compile_options=(False,)), 21.6)
+    plain = [c.batch_size for c in runner.calls if not c.activation_checkpointing]
+    checkpointed = [c.batch_size for c in runner.calls if c.activation_checkpointing]
+    assert plain == [1, 2, 4]           # 4 needs 23 GiB > 21.6
+    assert checkpointed == [4, 8]       # 1 and 2 already fit without it
+
+
+def test_checkpointing_skipped_when_everything_fits():
+    runner = FakeRunner(memory_per_sample=1.0)
+    run_trials(runner, candidate_configs(8), 80.0)
+    assert not any(c.activation_checkpointing for c in runner.calls)
+
+
+def test_runner_exception_counts_as_failure():
+    def runner(config):
+        raise RuntimeError("boom")
+
+    results = run_trials(runner, candidate_configs(4, compile_options=(False,), checkpointing_options=(False,)), 80.0)
+    assert len(results) == 1 and results[0].error == "boom"
+
+
+def test_select_best_picks_fastest_fitting():
+    fast_but_big = TrialResult(TrainingConfig(8, 1), tokens_per_sec=900.0, peak_memory_gb=30.0)
+    fitting = TrialResult(TrainingConfig(4, 2), tokens_per_sec=700.0, peak_memory_gb=18.0)
+    slower = TrialResult(TrainingConfig(2, 4), tokens_per_sec=500.0, peak_memory_gb=10.0)
+    assert select_best([fast_but_big, fitting, slower], 20.0) is fitting
+
+
+def test_select_best_breaks_ties_on_lower_memory():
+    heavy = TrialResult(TrainingConfig(4, 2), tokens_per_sec=700.0, peak_memory_gb=18.0)
+    light = TrialResult(TrainingConfig(4, 2, activation_checkpointing=True), tokens_per_sec=700.0, peak_memory_gb=9.0)
+    assert select_best([heavy, light], 20.0) is light
+    assert select_best([light, heavy], 20.0) is light
+
+
+def test_nothing_fits_returns_none():
+    failed = TrialResult(TrainingConfig(1, 8), error="out of memory")
+    too_big = TrialResult(TrainingConfig(2, 4), tokens_per_sec=100.0, peak_memory_gb=40.0)
+    assert select_best([failed, too_big], 20.0) is None
+
+    best, results = autotune(FakeRunner(base_memory=30.0), 8, 20.0)
+    assert best is None
+    assert results and all(not r.fits(20.0) for r in results)
+
+
+def test_autotune_end_to_end():
+    best, _ = autotune(FakeRunner(), 8, 21.6)
+    assert best == TrainingConfig(8, 1, compile=True, activation_checkpointing=True)
+
+
+def test_parse_metric_log_skips_warmup_and_keeps_peak():
+    log = "\n".join([
+        "Step 1 | loss:1.9 lr:3e-04 tokens_per_second_per_gpu:100.0 peak_memory_reserved:5.5",
+        "Step 2 | loss:1.7 lr:3e-04 tokens_per_second_per_gpu:300.0 peak_memory_reserved:7.25",
+        "some unrelated line",
+        "Step 3 | loss:1.5 lr:3e-04 tokens_per_second_per_gpu:500.0 peak_memory_reserved:6.0",
+    ])
+    assert parse_metric_log(log, warmup_steps=1) == (400.0, 7.25)
+
+
+def test_parse_metric_log_without_steps():
+    assert parse_metric_log("nothing logged", warmup_steps=2) == (None, None)
@@ -0,0 +1,141 @@
+import hashlib
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import finetune_jobs
+from conftest import wait_for
+from db_writer import SQLiteWriter
+from download_manager import DownloadManager
+from finetune_jobs import FinetuneJobTracker
+from init_db import get_connection
+
+ARTIFACT = b"GGUF" + bytes(range(256)) * 64
+
+
+@pytest.fixture
+def stub(file_server, tmp_path, monkeypatch):
+    """Stand-in for the Modal endpoints; set stub.remote to the status the next poll returns."""
+    db_path = str(tmp_path / "rag.db")
+    writer = SQLiteWriter(db_path)
+    monkeypatch.setattr(finetune_jobs, "writer", writer)
+    monkeypatch.setattr(finetune_jobs, "get_connection", lambda: get_connection(db_path))
+
+    manager = DownloadManager(root=tmp_path / "models", retries=0)
+    monkeypatch.setattr(finetune_jobs, "download_manager", manager)
+    monkeypatch.setattr(finetune_jobs, "MODEL_ROOT", tmp_path / "models")
+    monkeypatch.setattr(finetune_jobs, "FINETUNE_START_URL", f"{file_server.url}/start")
+    monkeypatch.setattr(finetune_jobs, "FINETUNE_STATUS_URL", f"{file_server.url}/status")
+    monkeypatch.setattr(finetune_jobs, "FINETUNE_ARTIFACT_URL", f"{file_server.url}/artifact")
+    # Tests drive poll_once themselves.
+    monkeypatch.setattr(FinetuneJobTracker, "start_polling", lambda self: None)
+
+    preloaded = []
+    file_server.preloaded = preloaded
+    monkeypatch.setattr(finetune_jobs, "preload_gguf_model", lambda name: preloaded.append(name) or {})
+
+    file_server.remote = {"status": "running", "stage": "train"}
+    file_server.json_routes["/start"] = lambda path: {
+        "status": "started", "job_id": parse_qs(urlparse(path).query)["job_id"][0], "call_id": "fc-1",
+    }
+    file_server.json_routes["/status"] = lambda path: file_server.remote
+    file_server.files["/artifact"] = ARTIFACT
+    yield file_server
+    manager.shutdown()
+
+
+def done_result(**overrides):
+    return {
+        "status": "done",
+        "stage": "done",
+        "result": {
+            "primary_quant": "Q5_K_M",
+            "gguf_size_bytes": len(ARTIFACT),
+            "gguf_sha256": hashlib.sha256(ARTIFACT).hexdigest(),
+            **overrides,
+        },
+    }
+
+
+def download_finished(tracker, job_id):
+    download_id = tracker.get(job_id)["downloadJobId"]
+    wait_for(lambda: finetune_jobs.download_manager.get(download_id).status in ("done", "failed"))
+
+
+def test_submitted_to_ready(stub, tmp_path):
+    tracker = FinetuneJobTracker()
+    job = tracker.start("cybersec", "my model!")
+    assert job["status"] == "submitted"
+    assert job["customName"] == "mymodel"
+
+    tracker.poll_once()
+    assert tracker.get(job["jobId"])["status"] == "running"
+    assert tracker.get(job["jobId"])["stage"] == "train"
+
+    stub.remote = done_result()
+    tracker.poll_once()
+    assert tracker.get(job["jobId"])["status"] == "downloading"
+
+    download_finished(tracker, job["jobId"])
+    tracker.poll_once()
+    ready = tracker.get(job["jobId"])
+    assert ready["status"] == "ready"
+    assert ready["error"] is None and ready["preloadError"] is None
+    target = tmp_path / "models" / "mymodel-q5_k_m.gguf"
+    assert ready["modelPath"] == str(target)
+    assert target.read_bytes() == ARTIFACT
+    assert stub.preloaded == ["mymodel-q5_k_m.gguf"]
+    assert any(path.startswith("/artifact?") and "quant=Q5_K_M" in path for path, _ in stub.requests)
+
+
+def test_remote_failure_marks_job_failed(stub):
+    tracker = FinetuneJobTracker()
+    job = tracker.start("cybersec", "m")
+    stub.remote = {"status": "failed", "stage": "train", "error": "CUDA out of memory"}
+    tracker.poll_once()
+    failed = tracker.get(job["jobId"])
+    assert failed["status"] == "failed"
+    assert failed["error"] == "CUDA out of memory"
+
+    # Failed jobs are no longer polled.
+    stub.remote = done_result()
+    tracker.poll_once()
+    assert tracker.get(job["jobId"])["status"] == "failed"
+
+
+def test_artifact_checksum_mismatch_fails_download(stub, tmp_path):
+    tracker = FinetuneJobTracker()
+    job = tracker.start("cybersec", "m")
+    stub.remote = done_result(gguf_sha256="0" * 64)
+    tracker.poll_once()
+    download_finished(tracker, job["jobId"])
+    tracker.poll_once()
+    failed = tracker.get(job["jobId"])
+    assert failed["status"] == "failed"
+    assert failed["error"].startswith("Download failed")
+    assert not (tmp_path / "models" / "m-q5_k_m.gguf").exists()
+
+
+def test_preload_error_keeps_job_ready(stub, monkeypatch):
+    def broken_preload(name):
+        raise RuntimeError("not enough memory")
+
+    monkeypatch.setattr(finetune_jobs, "preload_gguf_model", broken_preload)
+    tracker = FinetuneJobTracker()
+    job = tracker.start("cybersec", "m")
+    stub.remote = done_result()
+    tracker.poll_once()
+    download_finished(tracker, job["jobId"])
+    tracker.poll_once()
+    ready = tracker.get(job["jobId"])
+    assert ready["status"] == "ready"
+    assert ready["error"] is None
+    assert ready["preloadError"] == "not enough memory"
+
+
+def test_unreachable_modal_keeps_job_active(stub, monkeypatch):
+    tracker = FinetuneJobTracker()
+    job = tracker.start("cybersec", "m")
+    monkeypatch.setattr(finetune_jobs, "FINETUNE_STATUS_URL", "http://127.0.0.1:9/status")
+    tracker.poll_once()
+    assert tracker.get(job["jobId"])["status"] == "submitted"
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from conftest import wait_for
+from inference_scheduler import InferenceScheduler, QueueFullError, QueueTimeoutError
+
+
+def blocking_job(release: threading.Event):
+    started = threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return "blocker"
+
+    return job, started
+
+
+def test_full_queue_rejects_with_queue_full_error():
+    scheduler = InferenceScheduler("m", max_queue=2, timeout_s=0)
+    release = threading.Event()
+    job, started = blocking_job(release)
+    running = scheduler.submit(job)
+    assert started.wait(5)
+
+    waiting = [scheduler.submit(lambda i=i: i) for i in range(2)]
+    with pytest.raises(QueueFullError, match="full"):
+        scheduler.submit(lambda: "too many")
+    # api.py turns QueueFullError (a RuntimeError) into 503 with Retry-After.
+    assert issubclass(QueueFullError, RuntimeError)
+    assert scheduler.stats()["rejected"] == 1
+    assert scheduler.stats()["queueDepth"] == 2
+
+    release.set()
+    assert running.result(5) == "blocker"
+    assert [f.result(5) for f in waiting] == [0, 1]
+
+
+def test_job_past_the_queue_timeout_fails_without_running():
+    scheduler = InferenceScheduler("m", max_queue=4, timeout_s=0.05)
+    release = threading.Event()
+    job, started = blocking_job(release)
+    scheduler.submit(job)
+    assert started.wait(5)
+
+    calls = []
+    late = scheduler.submit(lambda: calls.append("ran"))
+    threading.Timer(0.2, release.set).start()
+
+    with pytest.raises(QueueTimeoutError, match="waited"):
+        late.result(5)
+    assert calls == []
+    assert scheduler.stats()["timedOut"] == 1
+
+
+def test_jobs_run_in_fifo_order_on_one_worker():
+    scheduler = InferenceScheduler("m", max_queue=16, timeout_s=0)
+    release = threading.Event()
+    job, started = blocking_job(release)
+    scheduler.submit(job)
+    assert started.wait(5)
+
+    order, threads = [], set()
+
+    def record(i):
+        order.append(i)
+        threads.add(threading.current_thread().name)
+        return i
+
+    futures = [scheduler.submit(lambda i=i: record(i)) for i in range(10)]
+    release.set()
+
+    assert [f.result(5) for f in futures] == list(range(10))
+    assert order == list(range(10))
+    assert threads == {"inference-m"}
+    wait_for(lambda: scheduler.stats()["completed"] == 11)
+
+
+def test_job_errors_reach_the_caller_and_the_worker_keeps_going():
+    scheduler = InferenceScheduler("m", max_queue=4, timeout_s=0)
+
+    def boom():
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError, match="bad prompt"):
+        scheduler.run(boom)
+    assert scheduler.run(lambda: "next") == "next"
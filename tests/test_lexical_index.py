@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import lexical_index
+from init_db import fts_enabled, init_db, open_connection
+from vector_codec import encode_vector
+from vector_index import VectorIndex
+
+
+TEXTS = [
+    "The firewall drops inbound packets",
+    "SQL injection with a quoted payload",
+    "Buffer overflow in the parser",
+    "Phishing emails and user awareness",
+    "Rotate the API keys every quarter",
+    "Ransomware encrypts the file shares",
+]
+
+
+def _corpus(tmp_path, texts: list[str] = TEXTS, dim: int = 8) -> tuple[str, np.ndarray]:
+    count = len(texts)
+    db_path = str(tmp_path / "rag.db")
+    init_db(db_path)
+    vectors = np.random.default_rng(1).normal(size=(count, dim)).astype(np.float32)
+    conn = open_connection(db_path)
+    with conn:
+        conn.execute("INSERT INTO documents (id, title) VALUES (1, 'doc')")
+        for chunk_id, vector in enumerate(vectors, start=1):
+            conn.execute("INSERT INTO chunks (id, document_id, content) VALUES (?, 1, ?)", (chunk_id, texts[chunk_id - 1]))
+            if fts_enabled(db_path):
+                conn.execute("INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)", (chunk_id, texts[chunk_id - 1]))
+            conn.execute(
+                "INSERT INTO embeddings (chunk_id, vector, format) VALUES (?, ?, 'float32')",
+                (chunk_id, encode_vector(vector, "float32")),
+            )
+    conn.close()
+    return db_path, vectors
+
+
+def test_prefilter_loads_a_lazy_index_before_the_size_gate(tmp_path, monkeypatch):
+    db_path, vectors = _corpus(tmp_path)
+    index = VectorIndex()
+    monkeypatch.setattr(index, "load", lambda: VectorIndex.load(index, db_path))
+    calls = []
+
+    def lexical(query_text, document_ids=None, limit=50, db_path=None):
+        calls.append(limit)
+        return [(2, 1, 3.0), (5, 1, 2.0)]
+
+    monkeypatch.setattr(lexical_index, "vector_index", index)
+    monkeypatch.setattr(lexical_index, "fts_enabled", lambda: True)
+    monkeypatch.setattr(lexical_index, "lexical_search", lexical)
+    monkeypatch.setattr(lexical_index, "LEXICAL_PREFILTER_MIN_VECTORS", 4)
+    monkeypatch.setattr(lexical_index.ann_index, "retrieve", lambda *args: [])
+
+    results = lexical_index.hybrid_retrieve("text", vectors[0], top_k=2)
+
+    assert len(index) == 6
+    assert calls == [lexical_index.LEXICAL_PREFILTER_CANDIDATES]
+    assert {chunk_id for chunk_id, _, _ in results} == {2, 5}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('say "hello" AND world', '"say" OR "hello" OR "and" OR "world"'),
+    ("NEAR(firewall packets) col:value*", '"near" OR "firewall" OR "packets" OR "col" OR "value"'),
+    ("Firewall firewall FIREWALL", '"firewall"'),
+    ("l'injection SQL", '"l" OR "injection" OR "sql"'),
+    ('" ( ) * : ^ -', None),
+    ("", None),
+])
+def test_fts_query_quotes_terms_and_drops_syntax(text, expected):
+    assert lexical_index.fts_query(text) == expected
+
+
+def test_fts_query_caps_the_number_of_terms():
+    match = lexical_index.fts_query(" ".join(f"t{i}" for i in range(100)))
+    assert match.count(" OR ") == lexical_index.MAX_QUERY_TERMS - 1
+
+
+@pytest.mark.parametrize("query", ['"quoted payload', "injection*) OR NOT (", "col:sql ^payload", "NEAR(sql, injection)"])
+def test_lexical_search_survives_fts5_syntax_in_queries(tmp_path, query):
+    db_path, _ = _corpus(tmp_path)
+    if not fts_enabled(db_path):
+        pytest.skip("SQLite built without FTS5")
+    results = lexical_index.lexical_search(query, db_path=db_path)
+    assert results and results[0][0] == 2
+
+
+def test_rrf_sums_reciprocal_ranks_and_deduplicates():
+    semantic = [(1, 10, 0.9), (2, 10, 0.8), (3, 20, 0.7)]
+    lexical = [(3, 20, 12.0), (1, 10, 9.0), (4, 30, 5.0)]
+    fused = lexical_index.reciprocal_rank_fusion([semantic, lexical], top_k=10, k=60)
+
+    assert [chunk_id for chunk_id, _, _ in fused] == [1, 3, 2, 4]
+    assert [doc_id for _, doc_id, _ in fused] == [10, 20, 10, 30]
+    assert fused[0][2] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[1][2] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[2][2] == pytest.approx(1 / 62)
+
+
+def test_rrf_breaks_ties_by_chunk_id_and_honours_top_k():
+    fused = lexical_index.reciprocal_rank_fusion([[(7, 1, 0.5)], [(3, 1, 0.5)]], top_k=1)
+    assert fused == [(3, 1, pytest.approx(1 / (lexical_index.RRF_K + 1)))]
+    assert lexical_index.reciprocal_rank_fusion([[], []], top_k=5) == []
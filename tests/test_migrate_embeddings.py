@@ -0,0 +1,29 @@
+import numpy as np
+
+from init_db import init_db, open_connection
+from migrate_embeddings import migrate
+from vector_codec import decode_vector, encode_vector
+
+
+def test_migrate_reads_and_writes_the_given_database(tmp_path):
+    db_path = str(tmp_path / "other.db")
+    init_db(db_path)
+    conn = open_connection(db_path)
+    vectors = np.random.default_rng(0).normal(size=(3, 8)).astype(np.float32)
+    with conn:
+        conn.execute("INSERT INTO documents (id, title) VALUES (1, 'doc')")
+        for chunk_id, vector in enumerate(vectors, start=1):
+            conn.execute("INSERT INTO chunks (id, document_id, content) VALUES (?, 1, 'text')", (chunk_id,))
+            conn.execute(
+                "INSERT INTO embeddings (chunk_id, vector, format) VALUES (?, ?, 'float32')",
+                (chunk_id, encode_vector(vector, "float32")),
+            )
+
+    assert migrate("float16", db_path=db_path) == 3
+
+    rows = conn.execute("SELECT chunk_id, vector, format FROM embeddings ORDER BY chunk_id").fetchall()
+    conn.close()
+    assert {fmt for _, _, fmt in rows} == {"float16"}
+    for (chunk_id, blob, fmt), vector in zip(rows, vectors):
+        np.testing.assert_allclose(decode_vector(blob, fmt), vector, rtol=1e-3, atol=1e-3)
+    assert migrate("float16", db_path=db_path) == 0
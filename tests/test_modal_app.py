@@ -0,0 +1,126 @@
+import json
+
+import modal
+import pytest
+
+import modal_app
+
+# .local() runs the endpoints in-process, without the volumes (unused here without job_id).
+pytestmark = pytest.mark.filterwarnings("ignore:.*executing locally:UserWarning")
+
+
+class StubCall:
+    def __init__(self, outcome) -> None:
+        self.outcome = outcome
+        self.timeouts: list[float | None] = []
+
+    def get(self, timeout=None):
+        self.timeouts.append(timeout)
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return self.outcome
+
+
+@pytest.fixture
+def stub_call(monkeypatch):
+    def install(outcome) -> StubCall:
+        call = StubCall(outcome)
+        monkeypatch.setattr(modal.FunctionCall, "from_id", staticmethod(lambda call_id: call))
+        return call
+
+    return install
+
+
+def test_status_running_while_the_call_is_unfinished(stub_call):
+    call = stub_call(modal.exception.TimeoutError("not done"))
+    assert modal_app.finetune_status.local("fc-1") == {"status": "running", "stage": None}
+    assert call.timeouts == [0]
+
+
+def test_status_done_carries_the_result(stub_call):
+    stub_call({"job_id": "abc"})
+    assert modal_app.finetune_status.local("fc-1") == {"status": "done", "stage": "done", "result": {"job_id": "abc"}}
+
+
+def test_status_failed_on_a_raised_error(stub_call):
+    stub_call(RuntimeError("CUDA out of memory"))
+    status = modal_app.finetune_status.local("fc-1")
+    assert status["status"] == "failed"
+    assert status["error"] == "CUDA out of memory"
+
+
+class WordTokenizer:
+    """Same call shape as a Hugging Face tokenizer; one token per word."""
+
+    def __call__(self, texts: list[str], add_special_tokens: bool = True) -> dict:
+        return {"input_ids": [list(range(len(text.split()))) for text in texts]}
+
+
+def read_jsonl(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_prepare_dataset_dedupes_and_filters(tmp_path, monkeypatch):
+    monkeypatch.setattr(modal_app, "MAX_SEQ_LEN", modal_app.TEMPLATE_TOKENS + 6)
+    monkeypatch.setattr(modal_app, "PREP_BATCH_RECORDS", 2)  # duplicates across batches too
+    records = [
+        {"prompt": "What is XSS?", "response": "A script injection."},
+        {"prompt": "  what is   xss? ", "response": "A SCRIPT injection."},   # duplicate after normalizing
+        {"prompt": "", "response": "no prompt"},                              # invalid
+        {"prompt": "Define CSRF", "response": None},                          # invalid
+        "not a record",                                                       # invalid
+        {"prompt": "Explain it all", "response": "one two three four five"},  # 8 words > 6
+        {"prompt": "What is XSS?", "response": "A script injection."},        # duplicate, later batch
+        {"prompt": "Define CSRF", "response": "Forged requests."},
+    ]
+    out = tmp_path / "dataset.jsonl"
+
+    stats = modal_app.prepare_dataset(records, str(out), tokenizer=WordTokenizer())
+
+    assert read_jsonl(out) == [
+        {"prompt": "What is XSS?", "response": "A script injection."},
+        {"prompt": "Define CSRF", "response": "Forged requests."},
+    ]
+    template = modal_app.TEMPLATE_TOKENS
+    assert stats == {
+        "num_records": 2, "invalid": 3, "duplicates": 2, "too_long": 1,
+        "tokens": (6 + template) + (4 + template), "lengths": [6 + template, 4 + template],
+    }
+
+
+def test_prepare_dataset_fails_when_nothing_is_left(tmp_path):
+    with pytest.raises(ValueError):
+        modal_app.prepare_dataset([{"prompt": " ", "response": "x"}], str(tmp_path / "d.jsonl"), tokenizer=WordTokenizer())
+
+
+def write_records(path, count: int) -> None:
+    path.write_text("".join(json.dumps({"prompt": f"q{i}", "response": f"a{i}"}) + "\n" for i in range(count)))
+
+
+def test_split_holdout_keeps_the_last_tenth_apart(tmp_path):
+    dataset, train, held = tmp_path / "d.jsonl", tmp_path / "train.jsonl", tmp_path / "eval.txt"
+    write_records(dataset, 25)
+
+    assert modal_app.split_holdout(str(dataset), 25, str(train), str(held)) == 2
+    assert [row["prompt"] for row in read_jsonl(train)] == [f"q{i}" for i in range(23)]
+    assert held.read_text() == "q23\na23\n\nq24\na24\n\n"
+
+
+def test_split_holdout_is_capped_and_skipped_on_small_sets(tmp_path, monkeypatch):
+    dataset, train, held = tmp_path / "d.jsonl", tmp_path / "train.jsonl", tmp_path / "eval.txt"
+    write_records(dataset, 9)
+    assert modal_app.split_holdout(str(dataset), 9, str(train), str(held)) == 0
+    assert len(read_jsonl(train)) == 9 and held.read_text() == ""
+
+    monkeypatch.setattr(modal_app, "PERPLEXITY_EVAL_RECORDS", 3)
+    write_records(dataset, 100)
+    assert modal_app.split_holdout(str(dataset), 100, str(train), str(held)) == 3
+    assert len(read_jsonl(train)) == 97
+
+
+def test_write_text_sample_takes_the_first_records(tmp_path):
+    dataset, out = tmp_path / "d.jsonl", tmp_path / "calibration.txt"
+    write_records(dataset, 5)
+    assert modal_app.write_text_sample(str(dataset), str(out), 2) == 2
+    assert out.read_text() == "q0\na0\n\nq1\na1\n\n"
+    assert modal_app.write_text_sample(str(dataset), str(out), 50) == 5
@@ -0,0 +1,46 @@
+import struct
+
+import pytest
+
+from model_registry import ModelRegistry
+
+
+def _string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def write_gguf(path, name: str, arch: str) -> None:
+    """Minimal GGUF v3 header: architecture, name and file type, no tensors."""
+    kv = [
+        ("general.architecture", 8, _string(arch)),
+        ("general.name", 8, _string(name)),
+        ("general.file_type", 4, struct.pack("<I", 15)),
+    ]
+    out = b"GGUF" + struct.pack("<IQQ", 3, 0, len(kv))
+    for key, value_type, value in kv:
+        out += _string(key) + struct.pack("<I", value_type) + value
+    path.write_bytes(out + b"\0" * 64)
+
+
+def test_alias_resolves_through_a_unique_architecture(tmp_path):
+    write_gguf(tmp_path / "custom-finetune.gguf", "Custom", "llama")
+    write_gguf(tmp_path / "qwen2.5-3b-instruct-q4_k_m.gguf", "Qwen2.5 3B", "qwen2")
+    registry = ModelRegistry(tmp_path)
+    assert registry.resolve("llama-3-2-3b", "").path.name == "custom-finetune.gguf"
+
+
+def test_alias_segment_wins_over_architecture(tmp_path):
+    write_gguf(tmp_path / "mistral-7b-instruct-q4_k_m.gguf", "Mistral 7B", "llama")
+    write_gguf(tmp_path / "llama-3.2-3b-instruct-q4_k_m.gguf", "Llama 3.2 3B", "llama")
+    registry = ModelRegistry(tmp_path)
+    assert registry.resolve("llama-3-2-3b", "").path.name == "llama-3.2-3b-instruct-q4_k_m.gguf"
+    assert registry.resolve("mistral-7b-instruct", "").path.name == "mistral-7b-instruct-q4_k_m.gguf"
+
+
+def test_shared_architecture_is_ambiguous(tmp_path):
+    write_gguf(tmp_path / "mistral-7b-instruct-q4_k_m.gguf", "Mistral 7B", "llama")
+    write_gguf(tmp_path / "my-finetune.gguf", "Finetune", "llama")
+    registry = ModelRegistry(tmp_path)
+    with pytest.raises(RuntimeError, match="Ambiguous model selection"):
+        registry.resolve("llama-3-2-3b", "")
@@ -0,0 +1,46 @@
+import pytest
+
+from prefix_cache import PrefixStateCache
+
+
+class State:
+    llama_state_size = 10
+
+
+def test_short_shared_prefix_is_a_miss():
+    cache = PrefixStateCache(ram_bytes=1000, min_tokens=4)
+    cache[(1, 2, 3, 4, 5, 6)] = State()
+    with pytest.raises(KeyError):
+        cache[(1, 9, 9, 9, 9)]          # only the BOS is shared
+    assert cache[(1, 2, 3, 4, 7)] is not None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["reusedTokenRate"] == round(4 / 10, 4)
+
+
+def test_prompt_shorter_than_minimum_hits_on_full_match():
+    cache = PrefixStateCache(ram_bytes=1000, min_tokens=32)
+    cache[(1, 2, 3)] = State()
+    assert cache[(1, 2, 3)] is not None
+    assert (1, 2) in cache
+    assert (1, 5) not in cache
+
+
+def test_disk_tier_uses_key_index(tmp_path):
+    diskcache = pytest.importorskip("diskcache")
+    tokens = tuple(range(40))
+    cache = PrefixStateCache(ram_bytes=1000, disk_dir=tmp_path, min_tokens=8)
+    cache[tokens] = {"state": 1}
+
+    reopened = PrefixStateCache(ram_bytes=1000, disk_dir=tmp_path, min_tokens=8)
+    assert reopened._disk_keys == {tokens}
+    assert reopened[tokens + (99,)] == {"state": 1}
+    assert reopened.stats()["diskHits"] == 1
+
+    # An entry diskcache dropped by itself is forgotten, not returned.
+    diskcache.Cache(str(tmp_path)).clear()
+    fresh = PrefixStateCache(ram_bytes=1000, disk_dir=tmp_path, min_tokens=8)
+    fresh._disk_keys.add(tokens)
+    with pytest.raises(KeyError):
+        fresh[tokens]
+    assert fresh._disk_keys == set()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from ann_index import IvfIndex
+from init_db import init_db
+from vector_index import VectorIndex
+
+
+def _loaded_index(tmp_path, fmt: str = "float32") -> VectorIndex:
+    db_path = str(tmp_path / "rag.db")
+    init_db(db_path)
+    index = VectorIndex(index_format=fmt)
+    index.load(db_path)
+    return index
+
+
+def _add_documents(index: VectorIndex, per_doc: int = 4, dim: int = 16) -> np.ndarray:
+    vectors = np.random.default_rng(3).normal(size=(3 * per_doc, dim)).astype(np.float32)
+    for doc in range(3):
+        rows = range(doc * per_doc, (doc + 1) * per_doc)
+        index.add([row + 1 for row in rows], [doc + 1] * per_doc, vectors[list(rows)])
+    return vectors
+
+
+@pytest.mark.parametrize("fmt", ["float32", "int8"])
+def test_remove_documents_compacts_rows(tmp_path, fmt):
+    index = _loaded_index(tmp_path, fmt)
+    vectors = _add_documents(index)
+
+    assert index.remove_documents([2]) == 4
+    assert index.remove_documents([2]) == 0
+    codes, chunk_ids, doc_ids = index.snapshot()
+    assert len(index) == len(codes) == 8
+    assert list(chunk_ids) == [1, 2, 3, 4, 9, 10, 11, 12]
+    assert set(doc_ids) == {1, 3}
+
+    results = index.search(vectors[9], top_k=8, rescore=False)
+    assert len(results) == 8
+    assert results[0][:2] == (10, 3)
+
+
+def test_remove_documents_keeps_ivf_lists_in_step(tmp_path):
+    index = _loaded_index(tmp_path)
+    vectors = _add_documents(index)
+    ivf = IvfIndex(index, path=str(tmp_path / "ivf.npz"), nprobe=4)
+    ivf.build(nlist=4)
+
+    index.remove_documents([1])
+    rows = np.sort(np.concatenate([ivf._compact(i) for i in range(ivf.nlist)]))
+    assert list(rows) == list(range(8))
+
+    results = ivf.search(vectors[5], top_k=8)
+    assert len(results) == 8
+    assert results[0][:2] == (6, 2)
+    assert {doc_id for _, doc_id, _ in results} == {2, 3}